@@ -0,0 +1,209 @@
+"""
+alignment.py - 低頻資料（月營收、季報）依公告日對齊到交易日
+
+核心理念：
+- 以「公告日」決定資料何時可用：月營收於次月 10 日前公告，季報依法定期限公告（Q1 5/15、Q2 8/14、Q3 11/14、Q4 次年 3/31），
+  每個交易日只看得到已公告的期別，避免前視偏差。
+- 以 searchsorted 做 as-of 對齊：每個交易日找最後一個已公告的期別，再取每檔股票「到該期為止最後一筆有值的期別」，
+  不需 union / reindex / ffill 產生中間大表。
+- YoY / MoM / QoQ 以期別編號（年*12+月、年*4+季）找同一檔股票的前期，在低頻表上向量化計算後與數值一起對齊。
+
+範例：
+    revenue_pivot = process_df.get_db_pivot_df('monthly_revenue', '-500:-0', value_name='當月營收')
+    aligned = alignment.align_periods(revenue_pivot, close_pivot.index, freq='M', growth=('yoy', 'mom'))
+    revenue_up = aligned['yoy'] > 0
+"""
+import math
+from typing import Dict, Sequence, Union
+import numpy as np
+import pandas as pd
+from api.utility import get_info_str
+
+DEBUG_MODE = 0
+
+# 月營收公告期限：次月 10 日
+MONTHLY_PUBLISH_DAY = 10
+# 季報公告期限：{季: (年偏移, 月, 日)}
+QUARTERLY_DEADLINES = {1: (0, 5, 15), 2: (0, 8, 14), 3: (0, 11, 14), 4: (1, 3, 31)}
+# 成長率名稱對應的期數
+GROWTH_LAGS = {'M': {'mom': 1, 'yoy': 12}, 'Q': {'qoq': 1, 'yoy': 4}}
+
+
+def period_ids(index: pd.Index, freq: str = 'M') -> np.ndarray:
+    """
+    日期轉期別編號：月為 年*12+月-1，季為 年*4+季-1，相差 k 期的編號相差 k。
+
+    參數：
+        index: 期別日期（同一月/季內任一天皆可）
+        freq (str): 'M' 月、'Q' 季
+    """
+    index = pd.DatetimeIndex(index)
+    if freq == 'M':
+        return np.asarray(index.year * 12 + index.month - 1, dtype=np.int64)
+    if freq == 'Q':
+        return np.asarray(index.year * 4 + index.quarter - 1, dtype=np.int64)
+    raise ValueError(f"freq 只支援 'M' 或 'Q'，收到 {freq!r}")
+
+
+def publish_dates(index: pd.Index, freq: str = 'M', publish_day: int = MONTHLY_PUBLISH_DAY) -> pd.DatetimeIndex:
+    """
+    依公告期限推算各期別的公告日：月為次月 publish_day 日，季依 QUARTERLY_DEADLINES。
+
+    範例：
+        publish_dates(['2024-03-01'], 'M')  # 2024-04-10
+        publish_dates(['2024-12-31'], 'Q')  # 2025-03-31
+    """
+    ids = period_ids(index, freq)
+    if freq == 'M':
+        next_ids = ids + 1
+        year, month, day = next_ids // 12, next_ids % 12 + 1, np.full(len(ids), publish_day)
+    else:
+        deadlines = np.array([QUARTERLY_DEADLINES[q] for q in (1, 2, 3, 4)])[ids % 4]
+        year, month, day = ids // 4 + deadlines[:, 0], deadlines[:, 1], deadlines[:, 2]
+    return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day})))
+
+
+def lookback_days(freq: str = 'M', lag: int = 0, publish_day: int = MONTHLY_PUBLISH_DAY) -> int:
+    """
+    目標日往前需要多少日曆日的低頻資料，才能取得最新已公告期別及其前 lag 期。
+    """
+    if freq == 'M':
+        # 最新已公告期別最早為兩個月前的月初（本月 publish_day 前只公告到前前月）
+        return (lag + 2) * 31 + publish_day
+    # 季報最長間隔：Q3 公告（11/14）到 Q4 公告（次年 3/31），此時最新期別為 7/1 起的 Q3
+    return lag * 92 + 275
+
+
+def asof_positions(event_dates: pd.Index, target_dates: pd.Index, inclusive: bool = False) -> np.ndarray:
+    """
+    每個目標日最後一個已發生事件的位置（event_dates 需已排序），沒有時為 -1。
+
+    參數：
+        inclusive (bool): True 時事件當天即可用；False（預設）時事件日隔天才可用（盤後公告）
+    """
+    side = 'right' if inclusive else 'left'
+    return np.searchsorted(np.asarray(event_dates, dtype='datetime64[ns]'),
+                           np.asarray(target_dates, dtype='datetime64[ns]'), side=side) - 1
+
+
+def _float_values(pivot_df: pd.DataFrame) -> np.ndarray:
+    # 保留 float32 等浮點型別，其餘（整數、Decimal 轉出的 object）轉 float64
+    values = pivot_df.to_numpy()
+    return values if values.dtype.kind == 'f' else values.astype(float)
+
+
+def _take_asof(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    # 先在低頻表上補值（每檔股票到各期為止最後一筆有值），再依目標日的期別位置整列取值
+    out = np.full((len(positions), values.shape[1]), np.nan, dtype=values.dtype)
+    if len(values) == 0:
+        return out
+    rows = np.where(np.isnan(values), -1, np.arange(len(values))[:, None])
+    last_valid = np.maximum.accumulate(rows, axis=0)
+    filled = values[np.maximum(last_valid, 0), np.arange(values.shape[1])]
+    filled[last_valid < 0] = np.nan
+    available = positions >= 0
+    out[available] = filled[positions[available]]
+    return out
+
+
+def _take_at(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    # 不補值：目標日取該期別位置那一列，該期缺值即為 NaN（成長率不沿用前期結果）
+    out = np.full((len(positions), values.shape[1]), np.nan, dtype=values.dtype)
+    available = positions >= 0
+    out[available] = values[positions[available]]
+    return out
+
+
+def asof_align(pivot_df: pd.DataFrame, target_index: pd.Index, event_dates: pd.Index = None, inclusive: bool = False) -> pd.DataFrame:
+    """
+    將低頻 pivot df 以 as-of 方式對齊到目標日期：每個目標日取每檔股票最後一筆已發生且有值的資料。
+
+    參數：
+        pivot_df (pd.DataFrame): index 為期別日期、columns 為股票代碼
+        target_index (pd.Index): 目標日期（如價格 pivot 的交易日）
+        event_dates (pd.Index): 各列資料可用的日期（如公告日），預設為 pivot_df.index
+        inclusive (bool): 事件當天是否可用，預設 False
+    回傳：
+        pd.DataFrame: index 為 target_index，columns 同 pivot_df
+    """
+    event_dates = pd.DatetimeIndex(pivot_df.index if event_dates is None else event_dates)
+    order = np.argsort(event_dates.values, kind='stable')
+    values = _float_values(pivot_df)[order]
+    positions = asof_positions(event_dates[order], target_index, inclusive)
+    return pd.DataFrame(_take_asof(values, positions), index=target_index, columns=pivot_df.columns)
+
+
+def growth_pivot_df(pivot_df: pd.DataFrame, lag: int, freq: str = 'M') -> pd.DataFrame:
+    """
+    同一檔股票與前 lag 期相比的成長率 (本期 - 前期) / |前期|，前期不存在或為 0 時為 NaN。
+    以期別編號找前期，中間缺期時不會錯位（不同於 shift(lag)）。
+
+    範例：
+        yoy = growth_pivot_df(revenue_pivot, 12, 'M')
+    """
+    ids = period_ids(pivot_df.index, freq)
+    values = _float_values(pivot_df)
+    if len(ids) == 0:
+        return pivot_df.astype(float)
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    if (np.diff(sorted_ids) == 0).any():
+        raise ValueError("pivot_df 同一期別有多列，請先去除重複")
+    prev_pos = np.minimum(np.searchsorted(sorted_ids, ids - lag), len(ids) - 1)
+    found = sorted_ids[prev_pos] == ids - lag
+    prev = values[order][prev_pos]
+    prev = np.where(found[:, None] & (prev != 0), prev, np.nan)
+    return pd.DataFrame((values - prev) / np.abs(prev), index=pivot_df.index, columns=pivot_df.columns)
+
+
+def align_periods(pivot_df: pd.DataFrame, trading_index: pd.Index, freq: str = 'M', growth: Sequence[str] = (),
+                  publish: Union[str, pd.Index] = 'rule', publish_day: int = MONTHLY_PUBLISH_DAY, inclusive: bool = False) -> Dict[str, pd.DataFrame]:
+    """
+    將月/季資料依公告日對齊到交易日，並一次算出成長率。
+
+    參數：
+        pivot_df (pd.DataFrame): 低頻 pivot（index 為期別日期，如 monthly_revenue 的月份）
+        trading_index (pd.Index): 交易日（如 close_pivot.index）
+        freq (str): 'M' 月、'Q' 季
+        growth (Sequence[str]): 成長率名稱，月可用 'mom'、'yoy'，季可用 'qoq'、'yoy'
+        publish: 'rule'（預設）依公告期限推算公告日；'index' 表示 pivot_df 的日期已是公告日；或直接傳入各列公告日
+        publish_day (int): 月資料的公告日（次月幾號）
+        inclusive (bool): 公告當天是否可用，預設 False（隔一個交易日才可用）
+    回傳：
+        Dict[str, pd.DataFrame]: {'value': 數值, 'yoy': ..., ...}，index 皆為 trading_index；成長率為比例（0.1 即 10%）
+        數值缺漏時沿用該股最後一筆已公告的值；成長率不補值，最新已公告那一期缺值時為 NaN
+    範例：
+        aligned = align_periods(revenue_pivot, close_pivot.index, 'M', growth=('yoy',))
+        screen_df = (close_pivot > sma60) & (aligned['yoy'] > 0.2)
+    """
+    lags = GROWTH_LAGS.get(freq)
+    if lags is None:
+        raise ValueError(f"freq 只支援 'M' 或 'Q'，收到 {freq!r}")
+    unknown = [name for name in growth if name not in lags]
+    if unknown:
+        raise ValueError(f"freq={freq!r} 不支援成長率 {unknown}，可用 {list(lags)}")
+    pivot_df = pivot_df.copy(deep=False)
+    pivot_df.index = pd.DatetimeIndex(pivot_df.index)
+    if isinstance(publish, str):
+        if publish not in ('rule', 'index'):
+            raise ValueError(f"publish 只支援 'rule'、'index' 或公告日序列，收到 {publish!r}")
+        event_dates = publish_dates(pivot_df.index, freq, publish_day) if publish == 'rule' else pivot_df.index
+    else:
+        event_dates = pd.DatetimeIndex(publish)
+
+    # 公告日排序與目標日位置只算一次，數值與各成長率共用
+    order = np.argsort(event_dates.values, kind='stable')
+    positions = asof_positions(event_dates[order], trading_index, inclusive)
+    # 只有數值往前補值；成長率取最新一期本身，該期缺值（或前期缺值算不出）時為 NaN，不沿用更早一期的成長率
+    tables = {'value': (pivot_df, _take_asof)}
+    tables.update({name: (growth_pivot_df(pivot_df, lags[name], freq), _take_at) for name in growth})
+    print(get_info_str(__name__), f"{len(pivot_df)} 期 x {pivot_df.shape[1]} 檔對齊到 {len(trading_index)} 個交易日，成長率 {list(growth)}") if DEBUG_MODE else None
+    return {name: pd.DataFrame(take(_float_values(table)[order], positions), index=trading_index, columns=pivot_df.columns)
+            for name, (table, take) in tables.items()}
+
+
+def lookback_trading_days(freq: str = 'M', lag: int = 0, publish_day: int = MONTHLY_PUBLISH_DAY) -> int:
+    """
+    lookback_days 換算成交易日數（每週 5 個交易日），供 screen 決定查詢區間。
+    """
+    return math.ceil(lookback_days(freq, lag, publish_day) * 5 / 7)
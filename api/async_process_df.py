@@ -0,0 +1,218 @@
+"""
+async_process_df.py - process_df 的 asyncio 版本
+
+核心理念：
+- 與 process_df 共用條件解析、SQL 產生（query_builder）、型別轉換、日期轉換與欄位改名，只有「送出查詢、取回資料列」改為 await。
+- 不同資料表的查詢可在同一個 event loop 上以 asyncio.gather 同時進行，也可直接嵌入 async web 服務而不佔用執行緒。
+- 後端：
+    - AiomysqlBackend：以 aiomysql 連線池查詢（需另外安裝 aiomysql）。
+    - ThreadBackend：以 asyncio.to_thread 呼叫 db_lib 同步連線池，作為未安裝 aiomysql 或測試時的替身。
+- 欄位對應等 schema 資訊仍由 db_lib.schema_catalog 同步載入（每個程序只載入一次，或設定 SCHEMA_USE_SNAPSHOT=1 由檔案載入）。
+
+範例：
+    close_pivot, branch_df = await asyncio.gather(
+        async_process_df.get_db_pivot_df('price', '-100:-0'),
+        async_process_df.get_branch_data('-10:-0', stock_col='stock_id', constraint_str='stock_id = 2330'),
+    )
+"""
+import asyncio
+from typing import List, Sequence, Tuple
+import pandas as pd
+from api import process_df
+from api.db_lib import DB_CONFIG, DB_POOL_SIZE, get_connection, reverse_column_mapping
+from api.process_df import (
+    parse_date_range, decimal_to_float, to_categorical,
+    _parse_constraint_str, _db_df_query, _pivot_panel_query, _build_panel, _finish_db_df, _warn_nan,
+    _latest_date_query, _cached_roc_flag, _store_roc_flag,
+)
+from api.utility import get_info_str, to_roc
+
+DEBUG_MODE = 0
+
+
+class ThreadBackend:
+    """
+    以執行緒執行 db_lib 同步連線池查詢的後端，不需額外套件。
+    """
+
+    async def fetch(self, sql: str, params: tuple) -> Tuple[List[str], Sequence[tuple]]:
+        return await asyncio.to_thread(self._fetch_sync, sql, params)
+
+    @staticmethod
+    def _fetch_sync(sql: str, params: tuple) -> Tuple[List[str], Sequence[tuple]]:
+        conn = get_connection()
+        if conn is None:
+            # get_connection 連線失敗時只在 DEBUG_MODE 印出原因並回傳 None
+            raise ConnectionError("無法取得資料庫連線，請確認 DB_CONFIG 設定與資料庫是否可連線")
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        finally:
+            conn.close()
+        return columns, rows
+
+    async def close(self) -> None:
+        pass
+
+
+class AiomysqlBackend:
+    """
+    以 aiomysql 連線池查詢的後端（需安裝 aiomysql）。
+    連線池綁定建立時的 event loop，換 loop（如多次 asyncio.run）時會自動重建。
+
+    參數：
+        maxsize (int): 連線池上限，預設 DB_POOL_SIZE
+        **connect_kwargs: 覆寫 DB_CONFIG 的連線設定
+    """
+
+    def __init__(self, maxsize: int = DB_POOL_SIZE, **connect_kwargs):
+        try:
+            import aiomysql
+        except ImportError:
+            raise ImportError("AiomysqlBackend 需要 aiomysql 套件，請執行 pip install aiomysql")
+        self._aiomysql = aiomysql
+        config = {**DB_CONFIG, **connect_kwargs}
+        config['db'] = config.pop('database', None)
+        self.connect_kwargs = config
+        self.maxsize = maxsize
+        self._pool = None
+        self._loop = None
+        self._pool_lock = None
+
+    async def _get_pool(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pool, self._loop, self._pool_lock = None, loop, asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await self._aiomysql.create_pool(minsize=1, maxsize=self.maxsize, **self.connect_kwargs)
+        return self._pool
+
+    async def fetch(self, sql: str, params: tuple) -> Tuple[List[str], Sequence[tuple]]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                rows = await cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        return columns, rows
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    取得預設後端：已安裝 aiomysql 時使用 AiomysqlBackend，否則使用 ThreadBackend。
+    """
+    global _backend
+    if _backend is None:
+        try:
+            _backend = AiomysqlBackend()
+        except ImportError:
+            print(get_info_str(__name__), "未安裝 aiomysql，改用 ThreadBackend") if DEBUG_MODE else None
+            _backend = ThreadBackend()
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """
+    指定預設後端（如測試時固定使用 ThreadBackend()）。
+    """
+    global _backend
+    _backend = backend
+
+
+async def _is_roc_table(backend, table_name: str) -> bool:
+    cached = _cached_roc_flag(table_name)
+    if cached is not None:
+        return cached
+    _, rows = await backend.fetch(*_latest_date_query(table_name))
+    return _store_roc_flag(table_name, rows[0][0])
+
+
+async def get_db_df(table_name: str = 'price', date_range_str: str = '-100:-0', index_name: str = 'date', column_str: str = 'stock_id, 收盤價', constraint_str: str = '', float_dtype: str = None, categorical: bool = False, filters: List[tuple] = None, backend=None) -> pd.DataFrame:
+    """
+    process_df.get_db_df 的 async 版本，參數與回傳相同。
+    backend 未指定時使用 get_backend()；走本地快取的資料表改以執行緒呼叫同步版本。
+    """
+    if process_df._use_local_cache(table_name):
+        return await asyncio.to_thread(process_df.get_db_df, table_name, date_range_str, index_name, column_str, constraint_str,
+                                       float_dtype=float_dtype, categorical=categorical, filters=filters)
+    backend = backend or get_backend()
+    (start_date, end_date) = parse_date_range(date_range_str)
+    constraints = _parse_constraint_str(table_name, constraint_str, filters)
+    select_cols = [reverse_column_mapping(table_name, column_name.strip()) for column_name in column_str.split(",")]
+    if await _is_roc_table(backend, table_name):
+        start_date = to_roc(start_date)
+        end_date = to_roc(end_date)
+    query, params = _db_df_query(table_name, index_name, select_cols, constraints, start_date, end_date)
+    print(get_info_str(__name__), f"SQL: {query} params: {params}") if DEBUG_MODE else None
+    columns, rows = await backend.fetch(query, params)
+    df = pd.DataFrame(list(rows), columns=columns).set_index(index_name)
+    df = decimal_to_float(df, float_dtype or process_df.FLOAT_DTYPE)
+    if categorical:
+        df = to_categorical(df)
+    _warn_nan(df)
+    return _finish_db_df(df, table_name)
+
+
+async def get_db_pivot_panel(table_name: str = 'price', date_range_str: str = '-100:-0', value_names: List[str] = None, column_name: str = 'stock_id', as_frame: bool = False, float_dtype: str = None, filters: List[tuple] = None, backend=None):
+    """
+    process_df.get_db_pivot_panel 的 async 版本，參數與回傳相同。
+    """
+    if value_names is None:
+        value_names = ['收盤價']
+    if process_df._use_local_cache(table_name):
+        return await asyncio.to_thread(process_df.get_db_pivot_panel, table_name, date_range_str, value_names, column_name,
+                                       as_frame=as_frame, float_dtype=float_dtype, filters=filters)
+    backend = backend or get_backend()
+    float_dtype = float_dtype or process_df.FLOAT_DTYPE
+    (start_date, end_date) = parse_date_range(date_range_str)
+    origin_col = reverse_column_mapping(table_name, column_name.strip())
+    origin_vals = {value_name: reverse_column_mapping(table_name, value_name.strip()) for value_name in value_names}
+    select_vals = list(dict.fromkeys(origin_vals.values()))
+    constraints = _parse_constraint_str(table_name, '', filters)
+    if await _is_roc_table(backend, table_name):
+        start_date = to_roc(start_date)
+        end_date = to_roc(end_date)
+    query, params = _pivot_panel_query(table_name, origin_col, select_vals, constraints, start_date, end_date)
+    print(get_info_str(__name__), f"SQL: {query} params: {params}") if DEBUG_MODE else None
+    columns, rows = await backend.fetch(query, params)
+    df = pd.DataFrame(list(rows), columns=columns)
+    return _build_panel(df, table_name, origin_col, origin_vals, float_dtype, as_frame)
+
+
+async def get_db_pivot_df(table_name: str = 'price', date_range_str: str = '-100:-0', column_name: str = 'stock_id', value_name: str = '收盤價', float_dtype: str = None, backend=None) -> pd.DataFrame:
+    """
+    process_df.get_db_pivot_df 的 async 版本，參數與回傳相同。
+    """
+    panel = await get_db_pivot_panel(table_name=table_name, date_range_str=date_range_str, value_names=[value_name],
+                                     column_name=column_name, float_dtype=float_dtype, backend=backend)
+    return panel[value_name]
+
+
+async def get_branch_data(date_range_str: str = '-10:-0', stock_col: str = "股票名稱", view_dealer_col: str = "買進金額, 賣出金額", constraint_str: str = "", float_dtype: str = None, categorical: bool = False, filters: List[tuple] = None, backend=None) -> pd.DataFrame:
+    """
+    process_df.get_branch_data 的 async 版本，參數與回傳相同。
+    """
+    return await get_db_df(table_name='dealer', date_range_str=date_range_str, column_str=f"{stock_col}, 分點名稱, {view_dealer_col}",
+                           constraint_str=constraint_str, float_dtype=float_dtype, categorical=categorical, filters=filters, backend=backend)
+
+
+async def close_backend() -> None:
+    """
+    關閉預設後端的連線池（服務關閉時呼叫）。
+    """
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
@@ -1,13 +1,170 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
 import pandas as pd
 import numpy as np
+from api import profiling
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 事件代碼（debug 輸出用）
+EVENT_BUY = 1
+EVENT_STOP_LOSS = 2
+EVENT_TAKE_PROFIT = 3
+EVENT_TRAILING_STOP = 4
+EVENT_SWAP = 5
+
+
+def _backtest_kernel_loop(price, sig, stop_loss, take_profit, trailing_stop):
+    """
+    逐股、逐日的狀態機（純 numpy 陣列存取），有安裝 numba 時會被 jit 編譯。
+    停損/停利/動態停利參數以 NaN 表示不啟用。
+    回傳：(holding_price, exit_flag, event, final_pos)
+    """
+    n_dates, n_stocks = price.shape
+    holding = np.full((n_dates, n_stocks), np.nan)
+    exit_flag = np.zeros((n_dates, n_stocks), dtype=np.bool_)
+    event = np.zeros((n_dates, n_stocks), dtype=np.int8)
+    final_pos = np.zeros(n_stocks, dtype=np.bool_)
+    for j in range(n_stocks):
+        pos = False
+        entry_price = 0.0
+        max_price = 0.0
+        for t in range(n_dates):
+            p = price[t, j]
+            s = sig[t, j]
+            valid = p == p
+            if s == 1 and not pos and valid:
+                pos = True
+                entry_price = p
+                max_price = p
+                holding[t, j] = entry_price
+                event[t, j] = EVENT_BUY
+            elif s == 1 and pos:
+                if valid:
+                    max_price = max(max_price, p)
+                holding[t, j] = entry_price
+                if valid:
+                    if stop_loss == stop_loss and p <= entry_price * (1 - stop_loss):
+                        pos = False
+                        event[t, j] = EVENT_STOP_LOSS
+                    elif take_profit == take_profit and p >= entry_price * (1 + take_profit):
+                        pos = False
+                        event[t, j] = EVENT_TAKE_PROFIT
+                    elif trailing_stop == trailing_stop and p <= max_price * (1 - trailing_stop):
+                        pos = False
+                        event[t, j] = EVENT_TRAILING_STOP
+                    if not pos:
+                        exit_flag[t, j] = True
+            elif s == 0 and pos:
+                pos = False
+                exit_flag[t, j] = True
+                event[t, j] = EVENT_SWAP
+        if pos and n_dates > 0:
+            exit_flag[n_dates - 1, j] = True
+            final_pos[j] = True
+    return holding, exit_flag, event, final_pos
+
+
+def _backtest_kernel_numpy(price, sig, stop_loss, take_profit, trailing_stop):
+    """
+    與 _backtest_kernel_loop 相同的狀態機，但每個交易日一次處理所有股票（無 numba 時使用）。
+    """
+    n_dates, n_stocks = price.shape
+    holding = np.full((n_dates, n_stocks), np.nan)
+    exit_flag = np.zeros((n_dates, n_stocks), dtype=bool)
+    event = np.zeros((n_dates, n_stocks), dtype=np.int8)
+    pos = np.zeros(n_stocks, dtype=bool)
+    entry_price = np.zeros(n_stocks)
+    max_price = np.zeros(n_stocks)
+    valid_all = ~np.isnan(price)
+    for t in range(n_dates):
+        p = price[t]
+        s = sig[t]
+        valid = valid_all[t]
+        buy = (s == 1) & ~pos & valid
+        hold = (s == 1) & pos
+        swap = (s == 0) & pos
+        entry_price = np.where(buy, p, entry_price)
+        max_price = np.where(buy, p, max_price)
+        hold_valid = hold & valid
+        max_price = np.where(hold_valid, np.maximum(max_price, p), max_price)
+        holding[t] = np.where(buy | hold, entry_price, np.nan)
+        event[t][buy] = EVENT_BUY
+
+        exited = np.zeros(n_stocks, dtype=bool)
+        for param, threshold, code in (
+            (stop_loss, p <= entry_price * (1 - stop_loss), EVENT_STOP_LOSS),
+            (take_profit, p >= entry_price * (1 + take_profit), EVENT_TAKE_PROFIT),
+            (trailing_stop, p <= max_price * (1 - trailing_stop), EVENT_TRAILING_STOP),
+        ):
+            if param == param:
+                hit = hold_valid & ~exited & threshold
+                event[t][hit] = code
+                exited |= hit
+        event[t][swap] = EVENT_SWAP
+        exited |= swap
+        exit_flag[t] = exited
+        pos = (pos | buy) & ~exited
+    if n_dates > 0:
+        exit_flag[-1] |= pos
+    return holding, exit_flag, event, pos
+
+
+if numba is not None:
+    _run_kernel = numba.njit(cache=True)(_backtest_kernel_loop)
+else:
+    _run_kernel = _backtest_kernel_numpy
+
+
+def _to_param(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _print_events(df: pd.DataFrame, holding: np.ndarray, event: np.ndarray, final_pos: np.ndarray) -> None:
+    """
+    依陣列引擎的事件代碼，印出與逐筆迴圈版相同格式的買賣紀錄。
+    """
+    price = df.to_numpy(dtype=float)
+    labels = {
+        EVENT_STOP_LOSS: '停損賣出',
+        EVENT_TAKE_PROFIT: '停利賣出',
+        EVENT_TRAILING_STOP: '動態停利賣出',
+    }
+    for j, stock in enumerate(df.columns):
+        for t in np.flatnonzero(event[:, j]):
+            date = df.index[t]
+            code = event[t, j]
+            p = price[t, j]
+            if code == EVENT_BUY:
+                print(f"[{date}] {stock} 買進於 {p}")
+            elif code == EVENT_SWAP:
+                entry_price = holding[t - 1, j]
+                print(f"[{date}] {stock} 換股賣出 {p}，損益={(p-entry_price)/entry_price if pd.notna(p) else float('nan'):.2%}")
+            else:
+                entry_price = holding[t, j]
+                print(f"[{date}] {stock} {labels[code]} {p}，損益={(p-entry_price)/entry_price:.2%}")
+        if final_pos[j]:
+            last_date = df.index[-1]
+            last_price = price[-1, j]
+            entry_price = holding[-1, j]
+            print(f"[{last_date}] {stock} 期末平倉 {last_price}，損益={(last_price-entry_price)/entry_price if pd.notna(last_price) else float('nan'):.2%}")
+
+
+@profiling.instrument()
 def run_backtest(
     buy_signal: pd.DataFrame,
     close_pivot: pd.DataFrame,
     stop_loss: float = None,
     take_profit: float = None,
     trailing_stop: float = None,
-    debug: bool = False
+    debug: bool = False,
+    engine: str = 'array'
 ):
     """
     彈性回測：根據買進訊號 DataFrame，遇到 0 則賣出換股，可設定停損、停利、動態停利。
@@ -17,8 +174,48 @@ def run_backtest(
     take_profit: 漲幅停利百分比（如0.2=20%），None表示不啟用
     trailing_stop: 動態停利百分比（如0.15=15%），None表示不啟用
     debug: 是否印出每次買賣資訊
+    engine: 'array'（預設，numpy 陣列狀態機，有 numba 時自動 jit）或 'loop'（舊版逐筆 pandas 迴圈，供比對用）
     回傳：績效 DataFrame
     """
+    if engine == 'loop':
+        return _run_backtest_loop(buy_signal, close_pivot, stop_loss, take_profit, trailing_stop, debug)
+    if engine != 'array':
+        raise ValueError(f"engine 只支援 'array' 或 'loop'，收到 {engine}")
+
+    df = close_pivot.copy()
+    position = buy_signal.reindex(index=df.index, columns=df.columns).fillna(0).astype(int)
+    holding, exit_arr, event, final_pos = _run_kernel(
+        df.to_numpy(dtype=float),
+        position.to_numpy(dtype=np.int64),
+        _to_param(stop_loss),
+        _to_param(take_profit),
+        _to_param(trailing_stop),
+    )
+    if debug:
+        _print_events(df, holding, event, final_pos)
+    holding_price = pd.DataFrame(holding, index=df.index, columns=df.columns)
+    exit_flag = pd.DataFrame(exit_arr, index=df.index, columns=df.columns)
+
+    # 計算報酬率
+    returns = (df - holding_price) / holding_price
+    returns[~exit_flag] = np.nan
+
+    # 統計績效
+    perf = returns.max(skipna=True)
+    return perf, returns, exit_flag
+
+
+def _run_backtest_loop(
+    buy_signal: pd.DataFrame,
+    close_pivot: pd.DataFrame,
+    stop_loss: float = None,
+    take_profit: float = None,
+    trailing_stop: float = None,
+    debug: bool = False
+):
+    """
+    舊版逐股、逐日 pandas 迴圈回測（run_backtest(engine='loop')），保留作為陣列引擎的比對基準。
+    """
     df = close_pivot.copy()
     position = buy_signal.fillna(0).astype(int)
     returns = pd.DataFrame(index=df.index, columns=df.columns, dtype=float)
@@ -72,7 +269,7 @@ def run_backtest(
                 holding_price.loc[date, stock] = np.nan
         # 若最後一天還持有，視為平倉
         if pos == 1:
-            exit_flag.iloc[-1][stock] = True
+            exit_flag.loc[df.index[-1], stock] = True
             if debug:
                 last_date = df.index[-1]
                 last_price = df.loc[last_date, stock]
@@ -86,7 +283,226 @@ def run_backtest(
     perf = returns.max(skipna=True)
     return perf, returns, exit_flag
 
-# 範例用法：
-if __name__ == '__main__':
-    # buy_signal, close_pivot 需自行提供
-    pass
+
+def _summarize_combo(price: np.ndarray, holding: np.ndarray, exit_flag: np.ndarray) -> dict:
+    """
+    由引擎輸出陣列計算單一參數組合的績效摘要（報酬定義同 run_backtest）。
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trade_returns = ((price - holding) / holding)[exit_flag]
+    trade_returns = trade_returns[~np.isnan(trade_returns)]
+    n_trades = trade_returns.size
+    if n_trades == 0:
+        return {'n_trades': 0, 'win_rate': np.nan, 'mean_return': np.nan, 'median_return': np.nan,
+                'max_return': np.nan, 'min_return': np.nan, 'mean_perf': np.nan}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_trade = np.where(exit_flag, (price - holding) / holding, np.nan)
+    traded = ~np.all(np.isnan(per_trade), axis=0)
+    perf = np.nanmax(per_trade[:, traded], axis=0)
+    return {
+        'n_trades': int(n_trades),
+        'win_rate': float((trade_returns > 0).mean()),
+        'mean_return': float(trade_returns.mean()),
+        'median_return': float(np.median(trade_returns)),
+        'max_return': float(trade_returns.max()),
+        'min_return': float(trade_returns.min()),
+        'mean_perf': float(perf.mean()),
+    }
+
+
+def _run_combos(price: np.ndarray, sig: np.ndarray, combos: list) -> List[dict]:
+    results = []
+    for stop_loss, take_profit, trailing_stop in combos:
+        holding, exit_flag, _, _ = _run_kernel(price, sig, _to_param(stop_loss), _to_param(take_profit), _to_param(trailing_stop))
+        row = {'stop_loss': stop_loss, 'take_profit': take_profit, 'trailing_stop': trailing_stop}
+        row.update(_summarize_combo(price, holding, exit_flag))
+        results.append(row)
+    return results
+
+
+# worker 端共享記憶體（由 _init_grid_worker 設定）
+_worker_arrays = {}
+
+
+def _init_grid_worker(price_spec: tuple, sig_spec: tuple) -> None:
+    for key, (shm_name, shape, dtype) in (('price', price_spec), ('sig', sig_spec)):
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_arrays[key + '_shm'] = shm  # 保留參照避免被回收
+        _worker_arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _grid_worker(combos: list) -> List[dict]:
+    return _run_combos(_worker_arrays['price'], _worker_arrays['sig'], combos)
+
+
+def _to_shared(array: np.ndarray):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+@profiling.instrument()
+def run_backtest_grid(
+    buy_signal: pd.DataFrame,
+    close_pivot: pd.DataFrame,
+    stop_loss_list: list = None,
+    take_profit_list: list = None,
+    trailing_stop_list: list = None,
+    max_workers: int = None,
+    chunk_size: int = 4
+) -> pd.DataFrame:
+    """
+    停損/停利/動態停利參數網格回測，多進程平行計算。
+    收盤價與訊號只轉換一次，放在共享記憶體給所有 worker 唯讀使用，不會每組參數複製一次。
+
+    參數：
+        buy_signal (pd.DataFrame): 1=持有, 0=空手，index=日期, columns=股票
+        close_pivot (pd.DataFrame): 收盤價 pivot df
+        stop_loss_list / take_profit_list / trailing_stop_list (list): 各參數候選值，None 表示不啟用，預設 [None]
+        max_workers (int): 進程數，預設 CPU 數；1 表示在目前進程直接計算
+        chunk_size (int): 每個 worker 任務包含的參數組合數
+    回傳：
+        pd.DataFrame: 每列一組參數，欄位含 stop_loss, take_profit, trailing_stop, n_trades, win_rate,
+                      mean_return, median_return, max_return, min_return, mean_perf（各股最大單次報酬的平均）
+    範例：
+        result = run_backtest_grid(signal, close_pivot, stop_loss_list=[0.05, 0.1], take_profit_list=[0.1, 0.2, None])
+    注意：
+        Windows 以 spawn 啟動子進程，呼叫端腳本需放在 if __name__ == '__main__': 之下。
+    """
+    combos = list(itertools.product(stop_loss_list or [None], take_profit_list or [None], trailing_stop_list or [None]))
+    price = close_pivot.to_numpy(dtype=float)
+    sig = buy_signal.reindex(index=close_pivot.index, columns=close_pivot.columns).fillna(0).astype(int).to_numpy(dtype=np.int64)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(combos) == 1:
+        return pd.DataFrame(_run_combos(price, sig, combos))
+
+    price_shm, price_spec = _to_shared(price)
+    sig_shm, sig_spec = _to_shared(sig)
+    try:
+        chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_grid_worker, initargs=(price_spec, sig_spec)) as executor:
+            results = [row for chunk_result in executor.map(_grid_worker, chunks) for row in chunk_result]
+    finally:
+        for shm in (price_shm, sig_shm):
+            shm.close()
+            shm.unlink()
+    return pd.DataFrame(results)
+
+
+@profiling.instrument()
+def run_portfolio_backtest(
+    buy_signal: pd.DataFrame,
+    close_pivot: pd.DataFrame,
+    initial_capital: float = 1_000_000,
+    max_holdings: int = 10,
+    weighting: str = 'equal',
+    score_pivot: pd.DataFrame = None,
+    fully_invested: bool = False,
+    fee_rate: float = 0.001425,
+    tax_rate: float = 0.003
+):
+    """
+    投資組合回測：每日依買進訊號決定持股，在資金、持股檔數上限下配置權重，扣除手續費與證交稅，
+    以向量化每日再平衡計算淨值曲線、週轉率與回撤。
+
+    規則：
+        - 第 t 日收盤依訊號調整為目標權重，持有至第 t+1 日收盤（不使用未來資料）。
+        - 當天收盤價為 NaN 的股票不會被選入。
+        - 訊號超過 max_holdings 檔時，依 score_pivot 由大到小挑選；未提供時依 columns 順序挑選。
+        - weighting='equal'：每檔 1/max_holdings（未滿檔部位保留現金），fully_invested=True 時改為 1/持股數。
+        - weighting='score'：依 score_pivot 比例配置（score 需為正值）。
+        - 買進成本 fee_rate，賣出成本 fee_rate + tax_rate，皆以成交金額佔淨值比例計算。
+
+    參數：
+        buy_signal (pd.DataFrame): 1=想持有, 0=空手，index=日期, columns=股票
+        close_pivot (pd.DataFrame): 收盤價 pivot df
+        initial_capital (float): 初始資金
+        max_holdings (int): 同時持股檔數上限
+        weighting (str): 'equal' 或 'score'
+        score_pivot (pd.DataFrame): 選股優先順序／權重依據（如成交量、動能），可為 None
+        fully_invested (bool): True 時資金全數分配給當日選出的股票
+        fee_rate (float): 手續費率，預設 0.1425%
+        tax_rate (float): 賣出證交稅率，預設 0.3%
+    回傳：
+        portfolio_df (pd.DataFrame): index=日期，欄位 equity, daily_return, gross_return, turnover, cost, drawdown, n_holdings
+        weights (pd.DataFrame): 每日收盤後的目標權重
+        summary (pd.Series): total_return, annual_return, annual_volatility, sharpe, max_drawdown, avg_turnover
+                             sharpe 為年化平均日報酬 / 年化波動（無風險利率以 0 計）
+    範例：
+        portfolio_df, weights, summary = run_portfolio_backtest(selected.astype(int), close_pivot, max_holdings=20)
+    """
+    if weighting not in ('equal', 'score'):
+        raise ValueError(f"weighting 只支援 'equal' 或 'score'，收到 {weighting}")
+    if weighting == 'score' and score_pivot is None:
+        raise ValueError("weighting='score' 需提供 score_pivot")
+
+    index, columns = close_pivot.index, close_pivot.columns
+    price = close_pivot.to_numpy(dtype=float)
+    signal = buy_signal.reindex(index=index, columns=columns).fillna(0).to_numpy(dtype=float) > 0
+    signal &= ~np.isnan(price)
+
+    # 選股：超過上限時依 score 排序，否則依欄位順序
+    if score_pivot is not None:
+        score = score_pivot.reindex(index=index, columns=columns).to_numpy(dtype=float)
+        masked = np.where(signal & ~np.isnan(score), score, -np.inf)
+        order = np.argsort(-masked, axis=1, kind='stable')
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(order.shape[1])[None, :].repeat(order.shape[0], axis=0), axis=1)
+        selected = signal & ~np.isnan(score) & (rank < max_holdings)
+    else:
+        score = None
+        selected = signal & (np.cumsum(signal, axis=1) <= max_holdings)
+    n_selected = selected.sum(axis=1)
+
+    # 目標權重
+    if weighting == 'equal':
+        denom = np.maximum(n_selected, 1) if fully_invested else np.full(len(index), max_holdings)
+        weights = selected / denom[:, None]
+    else:
+        raw = np.where(selected, np.clip(score, 0, None), 0.0)
+        total = raw.sum(axis=1)
+        weights = np.divide(raw, total[:, None], out=np.zeros_like(raw), where=total[:, None] > 0)
+        if not fully_invested:
+            weights *= (n_selected / max_holdings)[:, None]
+
+    # 每日報酬（缺價日以前一日價格計，視為報酬 0）
+    filled = pd.DataFrame(price).ffill().to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stock_returns = filled[1:] / filled[:-1] - 1
+    stock_returns = np.vstack([np.zeros((1, len(columns))), np.nan_to_num(stock_returns, nan=0.0, posinf=0.0, neginf=0.0)])
+
+    prev_weights = np.vstack([np.zeros((1, len(columns))), weights[:-1]])
+    gross_return = (prev_weights * stock_returns).sum(axis=1)
+    # 前一日權重隨價格漂移後，與今日目標權重的差額即為今日成交
+    drifted = prev_weights * (1 + stock_returns) / (1 + gross_return)[:, None]
+    buys = np.clip(weights - drifted, 0, None).sum(axis=1)
+    sells = np.clip(drifted - weights, 0, None).sum(axis=1)
+    cost = buys * fee_rate + sells * (fee_rate + tax_rate)
+    daily_return = (1 + gross_return) * (1 - cost) - 1
+
+    equity = initial_capital * np.cumprod(1 + daily_return)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    portfolio_df = pd.DataFrame({
+        'equity': equity,
+        'daily_return': daily_return,
+        'gross_return': gross_return,
+        'turnover': buys + sells,
+        'cost': cost,
+        'drawdown': drawdown,
+        'n_holdings': n_selected,
+    }, index=index)
+    weights_df = pd.DataFrame(weights, index=index, columns=columns)
+
+    n_days = len(index)
+    annual_return = (equity[-1] / initial_capital) ** (252 / n_days) - 1 if n_days > 0 else np.nan
+    annual_volatility = daily_return.std(ddof=1) * np.sqrt(252) if n_days > 1 else np.nan
+    summary = pd.Series({
+        'total_return': equity[-1] / initial_capital - 1 if n_days > 0 else np.nan,
+        'annual_return': annual_return,
+        'annual_volatility': annual_volatility,
+        'sharpe': daily_return.mean() * 252 / annual_volatility if annual_volatility else np.nan,
+        'max_drawdown': drawdown.min() if n_days > 0 else np.nan,
+        'avg_turnover': (buys + sells).mean() if n_days > 0 else np.nan,
+    })
+    return portfolio_df, weights_df, summary
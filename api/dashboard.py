@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 from api.indicator import (
     sma_pivot_df, ema_pivot_df, wma_pivot_df,
-    n_day_high_pivot_df, n_day_low_pivot_df
+    n_day_high_pivot_df, n_day_low_pivot_df,
+    multi_n_day_high_pivot_df, multi_n_day_low_pivot_df
 )
 
 
@@ -39,6 +41,40 @@ def count_n_day_low(pivot_df: pd.DataFrame, n: int) -> pd.Series:
     result.iloc[:n-1] = pd.NA
     return result
 
+def count_n_day_high_multi(pivot_df: pd.DataFrame, n_list: list) -> pd.DataFrame:
+    """
+    一次計算多個天數的創 n 日新高家數（共用 multi_n_day_high_pivot_df 的 sparse table）。
+    參數：
+        pivot_df (pd.DataFrame): 價格等指標的 pivot df
+        n_list (list): 區間天數列表
+    回傳：
+        pd.DataFrame: index 為日期，columns 為 n，值同 count_n_day_high(pivot_df, n)
+    """
+    high_pivots = multi_n_day_high_pivot_df(pivot_df, n_list)
+    result = pd.DataFrame(index=pivot_df.index)
+    for n in n_list:
+        count = (pivot_df == high_pivots[f'HIGH{n}']).sum(axis=1).astype(float)
+        count.iloc[:n-1] = pd.NA
+        result[n] = count
+    return result
+
+def count_n_day_low_multi(pivot_df: pd.DataFrame, n_list: list) -> pd.DataFrame:
+    """
+    一次計算多個天數的創 n 日新低家數（共用 multi_n_day_low_pivot_df 的 sparse table）。
+    參數：
+        pivot_df (pd.DataFrame): 價格等指標的 pivot df
+        n_list (list): 區間天數列表
+    回傳：
+        pd.DataFrame: index 為日期，columns 為 n，值同 count_n_day_low(pivot_df, n)
+    """
+    low_pivots = multi_n_day_low_pivot_df(pivot_df, n_list)
+    result = pd.DataFrame(index=pivot_df.index)
+    for n in n_list:
+        count = (pivot_df == low_pivots[f'LOW{n}']).sum(axis=1).astype(float)
+        count.iloc[:n-1] = pd.NA
+        result[n] = count
+    return result
+
 
 
 #### 上漲、持平、下跌家數
@@ -122,3 +158,76 @@ def count_above_ma(close_pivot_df: pd.DataFrame, volume_pivot_df: pd.DataFrame,
     result = (close_pivot_df > ma_df).sum(axis=1)
     result.iloc[:n-1] = pd.NA
     return result
+
+
+#### 市場寬度（一次計算）
+
+def market_breadth(close_pivot_df: pd.DataFrame, volume_pivot_df: pd.DataFrame = None, windows: list = (5, 20, 60), ma_types: list = ('sma', 'ema', 'wma')) -> pd.DataFrame:
+    """
+    一次計算所有市場寬度序列：總家數、上漲/下跌/持平家數，以及每個天數的創新高/新低家數與站上各種均線家數。
+    前一日收盤、多天數滾動高低點（sparse table）與 WMA 的價量乘積只計算一次並共用，比較直接在 numpy 陣列上進行，結果與個別函式相同。
+
+    參數：
+        close_pivot_df (pd.DataFrame): 收盤價 pivot df
+        volume_pivot_df (pd.DataFrame): 成交量 pivot df（ma_types 含 'wma' 時必填），以 reindex_like 對齊收盤價的日期與股票
+        windows (list): 天數列表，如 [5, 20, 60]
+        ma_types (list): 均線種類，'sma'、'ema'、'wma' 的子集合
+    回傳：
+        pd.DataFrame: index 為日期，欄位為
+            總家數、上漲家數、下跌家數、持平家數（第一天為 NaN），
+            {n}日新高家數、{n}日新低家數、站上{n}日SMA/EMA/WMA家數（前 n-1 天為 NaN）
+    範例：
+        breadth = market_breadth(close_pivot, volume_pivot, windows=[5, 20], ma_types=['sma', 'ema'])
+        breadth['站上20日SMA家數']
+    """
+    ma_types = [ma_type.lower() for ma_type in ma_types]
+    unknown = set(ma_types) - {'sma', 'ema', 'wma'}
+    if unknown:
+        raise ValueError(f"不支援的均線種類：{sorted(unknown)}")
+    if 'wma' in ma_types and volume_pivot_df is None:
+        raise ValueError("計算 WMA 站上家數需要 volume_pivot_df")
+    if volume_pivot_df is not None:
+        # 價量乘積依 union 對齊時列數會與收盤價陣列不同，先對齊（缺少的日期、股票為 NaN）
+        volume_pivot_df = volume_pivot_df.reindex_like(close_pivot_df)
+
+    close = close_pivot_df.to_numpy(dtype=float)
+    prev_close = np.full_like(close, np.nan)
+    prev_close[1:] = close[:-1]
+    columns = {
+        '總家數': (~np.isnan(close) & ~np.isnan(prev_close)).sum(axis=1).astype(float),
+        '上漲家數': (close > prev_close).sum(axis=1).astype(float),
+        '下跌家數': (close < prev_close).sum(axis=1).astype(float),
+        '持平家數': (close == prev_close).sum(axis=1).astype(float),
+    }
+    for values in columns.values():
+        values[:1] = np.nan
+
+    high_pivots = multi_n_day_high_pivot_df(close_pivot_df, windows)
+    low_pivots = multi_n_day_low_pivot_df(close_pivot_df, windows)
+    if 'wma' in ma_types:
+        # 價量乘積只算一次，各天數共用
+        weighted_df = close_pivot_df * volume_pivot_df
+    ma_arrays = {}
+    for n in windows:
+        if 'sma' in ma_types:
+            ma_arrays[('SMA', n)] = close_pivot_df.rolling(window=n, min_periods=1).mean().to_numpy()
+        if 'ema' in ma_types:
+            ma_arrays[('EMA', n)] = close_pivot_df.ewm(span=n, adjust=False).mean().to_numpy()
+        if 'wma' in ma_types:
+            weighted_sum = weighted_df.rolling(window=n, min_periods=1).sum().to_numpy()
+            weight_sum = volume_pivot_df.rolling(window=n, min_periods=1).sum().to_numpy()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ma_arrays[('WMA', n)] = weighted_sum / weight_sum
+
+    for n in windows:
+        counts = {
+            f'{n}日新高家數': (close == high_pivots[f'HIGH{n}'].to_numpy()).sum(axis=1).astype(float),
+            f'{n}日新低家數': (close == low_pivots[f'LOW{n}'].to_numpy()).sum(axis=1).astype(float),
+        }
+        for ma_name in ('SMA', 'EMA', 'WMA'):
+            if (ma_name, n) in ma_arrays:
+                counts[f'站上{n}日{ma_name}家數'] = (close > ma_arrays[(ma_name, n)]).sum(axis=1).astype(float)
+        for values in counts.values():
+            values[:n-1] = np.nan
+        columns.update(counts)
+    return pd.DataFrame(columns, index=close_pivot_df.index)
@@ -1,38 +1,247 @@
 import os
 import json
+import time
+import atexit
+import threading
 from dotenv import load_dotenv
 import pymysql
 import pandas as pd
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 from api.utility import get_info_str, get_warn_str
+from api import profiling
 
 DEBUG_MODE = 0
 
-def get_connection():
-    load_dotenv()
-    DB_HOST = os.getenv('DB_HOST')
-    DB_PORT = int(os.getenv('DB_PORT', 3306))
-    DB_USER = os.getenv('DB_USER')
-    DB_PASSWORD = os.getenv('DB_PASSWORD')
-    DB_NAME = os.getenv('DB_NAME')
+# 連線設定只在 import 時讀取一次 .env
+load_dotenv()
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4',
+    'connect_timeout': 5,
+    # 連線會被重複使用，開啟 autocommit 避免沿用舊交易的快照而讀到過期資料
+    'autocommit': True,
+}
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 30))
+
+
+class PooledConnection:
+    """
+    連線池借出的連線代理物件。
+    用法與 pymysql connection 相同，呼叫 close() 時不會真的斷線，而是歸還給連線池。
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw_conn: pymysql.connections.Connection):
+        self._pool = pool
+        self._raw_conn = raw_conn
+
+    def __getattr__(self, name):
+        if self._raw_conn is None:
+            raise pymysql.err.InterfaceError('連線已歸還連線池，無法再使用')
+        return getattr(self._raw_conn, name)
+
+    def close(self) -> None:
+        if self._raw_conn is not None:
+            raw_conn, self._raw_conn = self._raw_conn, None
+            self._pool.release(raw_conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        # 忘記 close() 就被回收時仍要歸還名額，否則連線池上限會永久少一條；連線狀態不明，直接關閉
+        raw_conn = self.__dict__.get('_raw_conn')
+        if raw_conn is not None:
+            self._raw_conn = None
+            self._pool.discard(raw_conn)
+
+
+class ConnectionPool:
+    """
+    執行緒安全的 pymysql 連線池。
+
+    參數：
+        max_size (int): 同時借出的連線上限
+        idle_timeout (float): 閒置超過此秒數的連線會被關閉重建
+        acquire_timeout (float): 連線全部借出時，等待歸還的秒數上限
+        connect_func (Callable): 建立連線的函式，預設 pymysql.connect（可替換為相容的測試/基準替身）
+        **connect_kwargs: 傳給 connect_func 的參數
+    範例：
+        conn = pool.acquire()
+        try:
+            ...
+        finally:
+            conn.close()  # 歸還連線池
+    """
+
+    def __init__(self, max_size: int = DB_POOL_SIZE, idle_timeout: float = DB_POOL_IDLE_TIMEOUT,
+                 acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT, connect_func: Optional[Callable] = None, **connect_kwargs):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.connect_func = connect_func
+        self.connect_kwargs = connect_kwargs
+        self._idle = []  # [(raw_conn, 歸還時間)]，後進先出
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+        self.created_count = 0
+
+    def _is_alive(self, raw_conn, released_at: float) -> bool:
+        if time.monotonic() - released_at > self.idle_timeout:
+            return False
+        try:
+            raw_conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """
+        借出一條連線，優先重用閒置連線（借出前先 ping 檢查），否則建立新連線。
+        """
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"等待資料庫連線逾時（{self.acquire_timeout} 秒），連線池上限 {self.max_size}")
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    raw_conn, released_at = self._idle.pop()
+                if self._is_alive(raw_conn, released_at):
+                    profiling.count('connections')
+                    return PooledConnection(self, raw_conn)
+                self._close_raw(raw_conn)
+            raw_conn = (self.connect_func or pymysql.connect)(**self.connect_kwargs)
+            with self._lock:
+                self.created_count += 1
+            profiling.count('connections')
+            profiling.count('new_connections')
+            return PooledConnection(self, raw_conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, raw_conn) -> None:
+        """
+        歸還連線；已斷線或仍有未讀完串流結果的連線直接丟棄。
+        """
+        try:
+            result = getattr(raw_conn, '_result', None)
+            if result is not None and getattr(result, 'unbuffered_active', False):
+                # SSCursor 串流中途放棄：剩餘資料仍在 socket 上，讀完代價太高，直接斷線丟棄
+                self._close_raw(raw_conn)
+            elif raw_conn.open:
+                with self._lock:
+                    closed = self._closed
+                    if not closed:
+                        self._idle.append((raw_conn, time.monotonic()))
+                if closed:
+                    # 連線池已被 configure_pool 取代，歸還的連線不再保留
+                    self._close_raw(raw_conn)
+        finally:
+            self._slots.release()
+
+    def discard(self, raw_conn) -> None:
+        """
+        關閉連線並歸還名額，不放回閒置清單。
+        """
+        try:
+            self._close_raw(raw_conn)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close_raw(raw_conn) -> None:
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+    def close_all(self) -> None:
+        """
+        關閉所有閒置連線（借出中的連線歸還後仍可正常放回）。
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw_conn, _ in idle:
+            self._close_raw(raw_conn)
+
+    def close(self) -> None:
+        """
+        停用連線池：關閉閒置連線，之後歸還的連線也直接關閉（configure_pool 取代舊連線池時使用）。
+        """
+        with self._lock:
+            self._closed = True
+        self.close_all()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        回傳連線池狀態：已建立連線數、閒置連線數、上限。
+        """
+        with self._lock:
+            return {'created': self.created_count, 'idle': len(self._idle), 'max_size': self.max_size}
+
+
+_pool = ConnectionPool(**DB_CONFIG)
 
+
+@atexit.register
+def _close_pool_at_exit() -> None:
+    _pool.close_all()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    取得全域連線池，db_lib 與 process_df 皆由此取得連線。
+    """
+    return _pool
+
+
+def configure_pool(max_size: Optional[int] = None, idle_timeout: Optional[float] = None,
+                   acquire_timeout: Optional[float] = None, connect_func: Optional[Callable] = None) -> ConnectionPool:
+    """
+    重新設定全域連線池（關閉舊連線池的閒置連線，借出中的連線歸還時也會關閉）。
+    connect_func 可替換建立連線的函式（如 benchmarks 的 SQLite 替身），未指定時沿用現有設定。
+    範例：
+        db_lib.configure_pool(max_size=16)
+        db_lib.configure_pool(connect_func=pymysql.connect)  # 恢復連線到 MariaDB
+    """
+    global _pool
+    old_pool = _pool
+    _pool = ConnectionPool(
+        max_size=max_size if max_size is not None else old_pool.max_size,
+        idle_timeout=idle_timeout if idle_timeout is not None else old_pool.idle_timeout,
+        acquire_timeout=acquire_timeout if acquire_timeout is not None else old_pool.acquire_timeout,
+        connect_func=connect_func if connect_func is not None else old_pool.connect_func,
+        **old_pool.connect_kwargs,
+    )
+    old_pool.close()
+    return _pool
+
+
+@profiling.instrument()
+def get_connection():
+    """
+    由連線池借出連線，使用完畢請呼叫 conn.close() 歸還。
+    """
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            charset='utf8mb4',
-            connect_timeout=5
-        )
+        connection = _pool.acquire()
         print(get_info_str(__name__), "成功連線到資料庫！") if DEBUG_MODE else None
         return connection
     except Exception as e:
         print(get_info_str(__name__), f"資料庫連線失敗：{e}") if DEBUG_MODE else None
     
 
-def list_tables():
+def _query_tables() -> List[str]:
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -40,10 +249,9 @@ def list_tables():
             tables = [row[0] for row in cursor.fetchall()]
     finally:
         conn.close()
-    print(get_info_str(__name__), '所有資料表：', tables) if DEBUG_MODE else None
     return tables
 
-def list_columns(table_name: str):
+def _query_columns(table_name: str) -> List[str]:
     conn = get_connection()
     try:
         with conn.cursor() as cursor:
@@ -51,6 +259,23 @@ def list_columns(table_name: str):
             columns = [row[0] for row in cursor.fetchall()]
     finally:
         conn.close()
+    return columns
+
+@profiling.instrument()
+def list_tables(refresh: bool = False):
+    """
+    列出所有資料表（由 schema_catalog 快取，refresh=True 強制重新查詢）。
+    """
+    tables = schema_catalog.tables(refresh=refresh)
+    print(get_info_str(__name__), '所有資料表：', tables) if DEBUG_MODE else None
+    return tables
+
+@profiling.instrument()
+def list_columns(table_name: str, refresh: bool = False):
+    """
+    列出資料表欄位（由 schema_catalog 快取，refresh=True 強制重新查詢）。
+    """
+    columns = schema_catalog.columns(table_name, refresh=refresh)
     print(get_info_str(__name__), f'所有 {table_name} 資料表欄位：', columns) if DEBUG_MODE else None
     return columns
 
@@ -60,17 +285,192 @@ RAW_HASH_PATH = os.path.join(JSON_DIR, 'raw_table_column_hash.json')
 COMMON_HASH_PATH = os.path.join(JSON_DIR, 'common_table_column_hash.json')
 FILTERED_HASH_PATH = os.path.join(JSON_DIR, 'filtered_table_column_hash.json')
 TABLE_COLUMN_MAPPING_PATH = 'csv/table_column_mapping.csv'
+RULE_PATH = 'common/table_common_col_rule.txt'
+SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', 3600))
+SCHEMA_USE_SNAPSHOT = os.getenv('SCHEMA_USE_SNAPSHOT', '0') == '1'
+
+
+def parse_col_rules(rule_path: str = RULE_PATH) -> Dict[str, List[str]]:
+    """
+    讀取欄位對應規則檔，回傳 {unified: [alias1, alias2, ...]}。
+    """
+    if not os.path.exists(rule_path):
+        raise FileNotFoundError(f"找不到對應規則檔案: {rule_path}")
+    with open(rule_path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    mapping = {}
+    for rule in lines:
+        if ':' not in rule:
+            continue
+        aliases, unified = rule.split(':', 1)
+        mapping[unified] = aliases.split('+')
+    return mapping
+
+
+class SchemaCatalog:
+    """
+    程序內的資料表結構快取：資料表、欄位、熟悉名規則只載入一次，之後皆為 dict 查詢。
+
+    參數：
+        ttl (float): 資料表/欄位快取秒數，逾時後下次存取自動重新查詢
+        use_snapshot (bool): 快取缺漏時，先嘗試由 json/raw_table_column_hash.json 載入
+    範例：
+        schema_catalog.columns('price')
+        schema_catalog.resolve('dealer', 'stock_id')
+        schema_catalog.invalidate('price')
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL, use_snapshot: bool = SCHEMA_USE_SNAPSHOT):
+        self.ttl = ttl
+        self.use_snapshot = use_snapshot
+        self._lock = threading.RLock()
+        self._tables = None  # (tables, 載入時間)
+        self._columns = {}  # {table: (columns, 載入時間)}
+        self._rules = {}  # {rule_path: (mtime, {unified: [aliases]})}
+        self._alias2unified = {}  # {hash_path: (mtime, {alias: unified})}
+        self._snapshot_tried = False
+
+    def _fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at <= self.ttl
+
+    def _try_snapshot(self) -> None:
+        if self.use_snapshot and not self._snapshot_tried:
+            self._snapshot_tried = True
+            self.load_snapshot()
+
+    def tables(self, refresh: bool = False) -> List[str]:
+        with self._lock:
+            self._try_snapshot()
+            if not refresh and self._tables is not None and self._fresh(self._tables[1]):
+                return list(self._tables[0])
+        tables = _query_tables()
+        with self._lock:
+            self._tables = (tables, time.monotonic())
+        return list(tables)
+
+    def columns(self, table: str, refresh: bool = False) -> List[str]:
+        with self._lock:
+            self._try_snapshot()
+            cached = self._columns.get(table)
+            if not refresh and cached is not None and self._fresh(cached[1]):
+                return list(cached[0])
+        columns = _query_columns(table)
+        with self._lock:
+            self._columns[table] = (columns, time.monotonic())
+        return list(columns)
+
+    def alias_rules(self, rule_path: str = RULE_PATH) -> Dict[str, List[str]]:
+        """
+        回傳 {unified: [aliases]}，規則檔修改（mtime 變動）時自動重新讀取。
+        """
+        mtime = os.path.getmtime(rule_path) if os.path.exists(rule_path) else None
+        with self._lock:
+            cached = self._rules.get(rule_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        rules = parse_col_rules(rule_path)
+        with self._lock:
+            self._rules[rule_path] = (mtime, rules)
+        return rules
+
+    def alias2unified(self, hash_path: str) -> Dict[str, str]:
+        """
+        回傳 common hash 檔的 {alias: unified}，檔案修改（mtime 變動）時自動重新讀取。
+        """
+        if not os.path.exists(hash_path):
+            raise FileNotFoundError(f"找不到 hash 檔案: {hash_path}")
+        mtime = os.path.getmtime(hash_path)
+        with self._lock:
+            cached = self._alias2unified.get(hash_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        with open(hash_path, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+        alias2unified = {}
+        for unified, aliases in mapping.items():
+            for alias in aliases:
+                alias2unified[alias] = unified
+            alias2unified[unified] = unified
+        with self._lock:
+            self._alias2unified[hash_path] = (mtime, alias2unified)
+        return alias2unified
+
+    def resolve(self, table: str, familiar_col: str, rule_path: str = RULE_PATH) -> str:
+        """
+        熟悉名稱 -> 該 table 實際欄位名稱，規則同 reverse_column_mapping。
+        """
+        alias_list = self.alias_rules(rule_path).get(familiar_col, [familiar_col])
+        try:
+            table_columns = set(self.columns(table))
+        except Exception:
+            table_columns = set()
+        for alias in alias_list:
+            if alias in table_columns:
+                if alias != familiar_col:
+                    print(get_info_str(__name__), f"為您將 {familiar_col} 替名為 {alias} 欄位，在 {table} table 做查詢")
+                return alias
+        return alias_list[0]
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        """
+        清除快取；指定 table 時只清除該表欄位，否則全部清除（含規則檔快取）。
+        """
+        with self._lock:
+            if table is None:
+                self._tables = None
+                self._columns.clear()
+                self._rules.clear()
+                self._alias2unified.clear()
+            else:
+                self._columns.pop(table, None)
+
+    def load_snapshot(self, path: str = RAW_HASH_PATH) -> bool:
+        """
+        由 raw_table_column_hash.json 載入資料表與欄位（載入時間視為快取時間）。
+        回傳是否成功載入。
+        """
+        if not os.path.exists(path):
+            print(get_warn_str(__name__), f"找不到 schema snapshot: {path}") if DEBUG_MODE else None
+            return False
+        with open(path, 'r', encoding='utf-8') as f:
+            raw_hash = json.load(f)
+        now = time.monotonic()
+        with self._lock:
+            self._tables = (list(raw_hash.keys()), now)
+            for table, cols in raw_hash.items():
+                self._columns[table] = (list(cols.keys()), now)
+        return True
+
+    def save_snapshot(self, path: str = RAW_HASH_PATH) -> Dict[str, Dict[str, str]]:
+        """
+        將目前所有資料表欄位寫成 raw_table_column_hash.json 格式。
+        """
+        table_column_hash = {table: {col: col for col in self.columns(table)} for table in self.tables()}
+        json_dir = os.path.dirname(path)
+        if json_dir and not os.path.exists(json_dir):
+            os.makedirs(json_dir)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(table_column_hash, f, ensure_ascii=False, indent=2)
+        return table_column_hash
+
+
+schema_catalog = SchemaCatalog()
+
+
+def invalidate_schema_cache(table: Optional[str] = None) -> None:
+    """
+    清除 schema_catalog 快取（資料表結構變動後呼叫），同時清除 query_builder 已驗證的 SQL 文字與日期格式偵測結果。
+    """
+    from api.query_builder import clear_sql_cache
+    from api.process_df import invalidate_date_format_cache
+    schema_catalog.invalidate(table)
+    clear_sql_cache()
+    invalidate_date_format_cache(table)
+
 
 def generate_raw_table_column_hash() -> Dict[str, Dict[str, str]]:
-    tables = list_tables()
-    table_column_hash = {}
-    for table in tables:
-        columns = list_columns(table)
-        table_column_hash[table] = {col: col for col in columns}
-    if not os.path.exists(JSON_DIR):
-        os.makedirs(JSON_DIR)
-    with open(RAW_HASH_PATH, 'w', encoding='utf-8') as f:
-        json.dump(table_column_hash, f, ensure_ascii=False, indent=2)
+    schema_catalog.invalidate()
+    table_column_hash = schema_catalog.save_snapshot(RAW_HASH_PATH)
     print(get_info_str(__name__), f'raw_table_column_hash.json 已產生')
     return table_column_hash
 
@@ -136,17 +536,7 @@ def load_column_hash(hash_path=COMMON_HASH_PATH) -> Dict[str, str]:
     """
     讀取 hash mapping，回傳 dict: {原始欄位: 統一欄位}
     """
-    if not os.path.exists(hash_path):
-        raise FileNotFoundError(f"找不到 hash 檔案: {hash_path}")
-    with open(hash_path, 'r', encoding='utf-8') as f:
-        mapping = json.load(f)
-    # 轉成 {alias: unified} 格式
-    alias2unified = {}
-    for unified, aliases in mapping.items():
-        for alias in aliases:
-            alias2unified[alias] = unified
-        alias2unified[unified] = unified
-    return alias2unified
+    return schema_catalog.alias2unified(hash_path)
 
 
 def rename_df_columns(df: pd.DataFrame, table: str, hash_path=COMMON_HASH_PATH) -> pd.DataFrame:
@@ -159,38 +549,15 @@ def rename_df_columns(df: pd.DataFrame, table: str, hash_path=COMMON_HASH_PATH)
     return df.rename(columns=rename_dict)
 
 
-def reverse_column_mapping(table: str, familiar_col: str, rule_path='common/table_common_col_rule.txt') -> str:
+def reverse_column_mapping(table: str, familiar_col: str, rule_path=RULE_PATH) -> str:
     """
     根據熟悉名稱（unified name），查回原始 table 欄位名稱。
     會根據 table 的實際欄位，優先回傳該 table 擁有的 alias 名稱。
     若都沒有 match，才回傳 alias list 第一個。
+    規則與欄位皆由 schema_catalog 快取，不會每次讀檔或查詢資料庫。
     """
     print (get_info_str(__name__), f"執行 reverse_column_mapping(table={table}, familiar_col={familiar_col})") if DEBUG_MODE else None
-    if not os.path.exists(rule_path):
-        raise FileNotFoundError(f"找不到對應規則檔案: {rule_path}")
-    with open(rule_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-    mapping = {}
-    for rule in lines:
-        if ':' not in rule:
-            continue
-        aliases, unified = rule.split(':', 1)
-        alias_list = aliases.split('+')
-        mapping[unified] = alias_list
-    alias_list = mapping.get(familiar_col, [familiar_col])
-    # 取得該 table 的所有欄位
-    try:
-        table_columns = list_columns(table)
-    except Exception as e:
-        table_columns = []
-    # 優先回傳在 table 中存在的 alias
-    for alias in alias_list:
-        if alias in table_columns:
-            if (alias != familiar_col):
-                print (get_info_str(__name__), f"為您將 {familiar_col} 替名為 {alias} 欄位，在 {table} table 做查詢")
-            return alias
-    # fallback: 回傳 alias list 第一個
-    return alias_list[0]
+    return schema_catalog.resolve(table, familiar_col, rule_path)
 
 def get_table_column_mapping_df():
     # 取得 DB 名稱
@@ -198,16 +565,9 @@ def get_table_column_mapping_df():
     # 讀取所有 table 和欄位
     tables = list_tables()
     # 讀取 familiar_name 規則
-    rule_path = 'common/table_common_col_rule.txt'
     familiar_map = {}
-    if os.path.exists(rule_path):
-        with open(rule_path, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-        for rule in lines:
-            if ':' not in rule:
-                continue
-            aliases, unified = rule.split(':', 1)
-            alias_list = aliases.split('+')
+    if os.path.exists(RULE_PATH):
+        for unified, alias_list in schema_catalog.alias_rules(RULE_PATH).items():
             for alias in alias_list:
                 familiar_map[alias] = unified
             familiar_map[unified] = unified
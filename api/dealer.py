@@ -0,0 +1,319 @@
+"""
+dealer.py - 券商分點買賣超彙總（rollup）
+
+核心理念：
+- 分點資料量大且查詢模式固定（某檔股票近 N 日前幾大分點、全市場哪些分點在累積買超），
+  先把每筆資料編碼成 (日期位置, 股票 x 分點組合編號, 買賣超) 三個 numpy 陣列，查詢時以 np.bincount 分組加總，不再逐次 groupby。
+- 股票代碼、分點名稱以 pd.factorize 編碼，新資料出現的新代碼直接接在後面，已有編號不變。
+- 近 N 日累積買賣超依 N 快取；append 新交易日時只加上新資料、扣掉滑出視窗的資料，不重算整段。
+- 可由 process_df.iter_branch_data 分批建立，save / load 存成 .npz 供下次直接載入再以 update_from_db 補新交易日。
+
+範例：
+    rollup = DealerRollup.from_db('-60:-0')
+    rollup.top_brokers('2330', n=20, k=5)        # 2330 近 20 日買超前 5 大分點
+    rollup.accumulating_brokers(n=20, k=20)      # 全市場近 20 日買超最多的分點
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from api import process_df
+from api.utility import get_info_str
+
+DEBUG_MODE = 0
+
+BROKER_COL = '分點名稱'
+
+
+class DealerRollup:
+    """
+    股票 x 分點的每日買賣超彙總，支援依日期順序增量 append。
+
+    參數：
+        value (str): '金額' 或 '張數'，買賣超 = 買進{value} - 賣出{value}
+        stock_col (str): 股票欄位名稱，同 get_branch_data 的 stock_col
+    """
+
+    def __init__(self, value: str = '金額', stock_col: str = 'stock_id'):
+        self.value = value
+        self.stock_col = stock_col
+        self.net_col = f'買賣超{value}'
+        self.stocks = pd.Index([], dtype=object)
+        self.brokers = pd.Index([], dtype=object)
+        self.dates = pd.DatetimeIndex([], name='date')
+        # 組合編號 -> 股票編號 << 32 | 分點編號
+        self._pair_keys = pd.Index(np.empty(0, dtype=np.int64))
+        self._pending = []
+        self._date_pos = np.empty(0, dtype=np.int32)
+        self._pair_idx = np.empty(0, dtype=np.int64)
+        self._net = np.empty(0, dtype=np.float64)
+        # {n: (已納入的列數, 當時最後一天位置, 各組合累積買賣超, 各組合視窗內筆數)}
+        self._rolling = {}
+        self._by_stock = None
+        self._codes = None
+
+    def __len__(self) -> int:
+        return len(self._net) + sum(len(chunk[2]) for chunk in self._pending)
+
+    def __repr__(self) -> str:
+        span = f"{self.dates[0]:%Y-%m-%d}~{self.dates[-1]:%Y-%m-%d}" if len(self.dates) else '無資料'
+        return f"DealerRollup({span}, {len(self.stocks)} 檔, {len(self.brokers)} 分點, {len(self)} 筆)"
+
+    def _pair_codes(self) -> tuple:
+        # 組合編號對應的 (股票編號, 分點編號)，組合數變動時重算
+        if self._codes is None or len(self._codes[0]) != len(self._pair_keys):
+            keys = self._pair_keys.to_numpy()
+            self._codes = (keys >> 32, keys & 0xFFFFFFFF)
+        return self._codes
+
+    @property
+    def pair_stock(self) -> np.ndarray:
+        return self._pair_codes()[0]
+
+    @property
+    def pair_broker(self) -> np.ndarray:
+        return self._pair_codes()[1]
+
+    #### 建立與增量更新
+
+    @staticmethod
+    def _encode(existing: pd.Index, values) -> tuple:
+        # 以 factorize 編碼，新代碼接在 existing 後面；回傳 (編號, 更新後的 existing)，缺值為 -1
+        codes, uniques = pd.factorize(values)
+        mapping = existing.get_indexer(uniques)
+        new = mapping < 0
+        if new.any():
+            mapping[new] = np.arange(len(existing), len(existing) + new.sum())
+            existing = existing.append(pd.Index(np.asarray(uniques)[new]))
+        return np.where(codes >= 0, mapping[codes], -1), existing
+
+    def append(self, branch_df: pd.DataFrame) -> 'DealerRollup':
+        """
+        加入分點資料（get_branch_data / iter_branch_data 的回傳格式，index 為日期）。
+        日期需不早於已加入的最後一天；與最後一天同日的資料（如分批讀取跨批）會合併。
+
+        參數：
+            branch_df (pd.DataFrame): 需有 stock_col、分點名稱、買進{value}、賣出{value} 欄位
+        回傳：
+            self（可串接）
+        """
+        if branch_df.empty:
+            return self
+        dates = pd.DatetimeIndex(branch_df.index)
+        if len(self.dates) and dates.min() < self.dates[-1]:
+            raise ValueError(f"append 的日期需不早於已彙總的最後一天 {self.dates[-1]:%Y-%m-%d}，收到 {dates.min():%Y-%m-%d}")
+        net = (pd.to_numeric(branch_df[f'買進{self.value}'], errors='coerce').to_numpy(dtype=np.float64)
+               - pd.to_numeric(branch_df[f'賣出{self.value}'], errors='coerce').to_numpy(dtype=np.float64))
+        stock_idx, self.stocks = self._encode(self.stocks, branch_df[self.stock_col])
+        broker_idx, self.brokers = self._encode(self.brokers, branch_df[BROKER_COL])
+        valid = ~np.isnan(net) & (stock_idx >= 0) & (broker_idx >= 0)
+
+        new_dates = dates[valid].unique().sort_values()
+        new_dates = new_dates[~new_dates.isin(self.dates)]
+        if len(new_dates):
+            self.dates = self.dates.append(new_dates).rename('date')
+        keys = (stock_idx[valid].astype(np.int64) << 32) | broker_idx[valid]
+        pair_idx, self._pair_keys = self._encode(self._pair_keys, keys)
+        date_pos = self.dates.get_indexer(dates[valid]).astype(np.int32)
+        order = np.argsort(date_pos, kind='stable')
+        self._pending.append((date_pos[order], pair_idx[order], net[valid][order]))
+        print(get_info_str(__name__), f"加入 {valid.sum()} 筆，共 {len(self.dates)} 個交易日、{len(self._pair_keys)} 個股票x分點組合") if DEBUG_MODE else None
+        return self
+
+    @classmethod
+    def from_df(cls, branch_df: pd.DataFrame, value: str = '金額', stock_col: str = 'stock_id') -> 'DealerRollup':
+        """
+        由已取得的分點 df 建立。
+        """
+        return cls(value, stock_col).append(branch_df)
+
+    @classmethod
+    def from_db(cls, date_range_str: str = '-60:-0', value: str = '金額', stock_col: str = 'stock_id', constraint_str: str = '', filters: list = None, chunk_size: int = None) -> 'DealerRollup':
+        """
+        以 process_df.iter_branch_data 分批讀取 dealer 資料表並建立彙總，不需一次載入全部原始資料。
+
+        範例：
+            rollup = DealerRollup.from_db('-60:-0')
+            rollup = DealerRollup.from_db('-250:-0', filters=[('stock_id', 'in', watchlist)])
+        """
+        rollup = cls(value, stock_col)
+        rollup._load_db(date_range_str, constraint_str, filters, chunk_size)
+        return rollup
+
+    def _load_db(self, date_range_str: str, constraint_str: str = '', filters: list = None, chunk_size: int = None) -> None:
+        for chunk in process_df.iter_branch_data(date_range_str=date_range_str, stock_col=self.stock_col,
+                                                 view_dealer_col=f'買進{self.value}, 賣出{self.value}',
+                                                 constraint_str=constraint_str, chunk_size=chunk_size, filters=filters):
+            self.append(chunk)
+
+    def update_from_db(self, constraint_str: str = '', filters: list = None, chunk_size: int = None) -> 'DealerRollup':
+        """
+        補抓最後一天之後到今天的分點資料；快取的近 N 日累積值只加減新進與滑出的資料。
+        """
+        if not len(self.dates):
+            raise ValueError("尚無資料，請先以 from_db 建立")
+        start = (self.dates[-1] + timedelta(days=1)).strftime('%Y-%m-%d')
+        end = datetime.today().strftime('%Y-%m-%d')
+        if start <= end:
+            self._load_db(f'{start}:{end}', constraint_str, filters, chunk_size)
+        return self
+
+    def _rows(self) -> tuple:
+        # 合併尚未整理的批次，回傳依日期排序的 (日期位置, 組合編號, 買賣超)
+        if self._pending:
+            self._date_pos = np.concatenate([self._date_pos] + [chunk[0] for chunk in self._pending])
+            self._pair_idx = np.concatenate([self._pair_idx] + [chunk[1] for chunk in self._pending])
+            self._net = np.concatenate([self._net] + [chunk[2] for chunk in self._pending])
+            self._pending = []
+        return self._date_pos, self._pair_idx, self._net
+
+    #### 查詢
+
+    def _window_start(self, n: int) -> int:
+        return 0 if n is None else max(len(self.dates) - n, 0)
+
+    def rolling_net(self, n: int = None) -> np.ndarray:
+        """
+        各股票 x 分點組合近 n 個交易日的累積買賣超（n=None 為全部日期），依 n 快取並增量更新。
+
+        回傳：
+            np.ndarray: 長度為組合數，對應 pair_stock / pair_broker
+        """
+        date_pos, pair_idx, net = self._rows()
+        n_pairs, n_rows, last = len(self._pair_keys), len(net), len(self.dates) - 1
+        start = np.searchsorted(date_pos, self._window_start(n))
+        cached = self._rolling.get(n)
+        if cached is None:
+            totals = np.bincount(pair_idx[start:], weights=net[start:], minlength=n_pairs)
+            counts = np.bincount(pair_idx[start:], minlength=n_pairs)
+        else:
+            cached_rows, cached_last, totals, counts = cached
+            totals = np.pad(totals, (0, n_pairs - len(totals)))
+            counts = np.pad(counts, (0, n_pairs - len(counts)))
+            # 新進的列（仍在視窗內者）加上，原本在視窗內但已滑出的列扣掉
+            add_from = max(cached_rows, start)
+            totals += np.bincount(pair_idx[add_from:], weights=net[add_from:], minlength=n_pairs)
+            counts += np.bincount(pair_idx[add_from:], minlength=n_pairs)
+            if n is not None and last > cached_last:
+                old_start = np.searchsorted(date_pos, max(cached_last + 1 - n, 0))
+                drop_to = min(start, cached_rows)
+                if drop_to > old_start:
+                    totals -= np.bincount(pair_idx[old_start:drop_to], weights=net[old_start:drop_to], minlength=n_pairs)
+                    counts -= np.bincount(pair_idx[old_start:drop_to], minlength=n_pairs)
+                    # 加減後殘留的浮點誤差不可讓已滑出視窗的組合變成買超/賣超
+                    totals[counts == 0] = 0.0
+        self._rolling[n] = (n_rows, last, totals, counts)
+        return totals
+
+    def _stock_pairs(self, stock_id) -> np.ndarray:
+        # 各股票的組合編號（依股票分組的排序索引，組合數變動時重建）
+        if self._by_stock is None or len(self._by_stock[0]) != len(self._pair_keys):
+            pair_stock = self.pair_stock
+            order = np.argsort(pair_stock, kind='stable')
+            starts = np.searchsorted(pair_stock[order], np.arange(len(self.stocks) + 1))
+            self._by_stock = (order, starts)
+        order, starts = self._by_stock
+        loc = self.stocks.get_indexer([stock_id])[0]
+        if loc < 0:
+            raise KeyError(f"彙總資料中沒有股票 {stock_id!r}")
+        return order[starts[loc]:starts[loc + 1]]
+
+    def top_brokers(self, stock_id, n: int = None, k: int = 10, largest: bool = True) -> pd.DataFrame:
+        """
+        單一股票近 n 個交易日累積買超（largest=False 為賣超）最大的前 k 個分點。
+
+        參數：
+            stock_id: 股票代碼（與 stock_col 的值相同）
+            n (int): 近幾個交易日，None 為全部日期
+            k (int): 取前幾名
+            largest (bool): True 依買超由大到小，False 依買賣超由小到大（賣超最多）
+        回傳：
+            pd.DataFrame: columns 為 分點名稱、買賣超{value}
+        範例：
+            rollup.top_brokers('2330', n=20, k=3)['分點名稱'].tolist()
+        """
+        pairs = self._stock_pairs(stock_id)
+        totals = self.rolling_net(n)[pairs]
+        order = np.argsort(-totals if largest else totals, kind='stable')[:k]
+        return pd.DataFrame({BROKER_COL: self.brokers.to_numpy()[self.pair_broker[pairs[order]]], self.net_col: totals[order]})
+
+    def top_brokers_all(self, n: int = None, k: int = 3, largest: bool = True) -> pd.DataFrame:
+        """
+        全市場每檔股票近 n 個交易日的前 k 大分點，一次排序完成。
+
+        回傳：
+            pd.DataFrame: columns 為 stock_col、名次、分點名稱、買賣超{value}
+        """
+        totals = self.rolling_net(n)
+        pair_stock = self.pair_stock
+        order = np.lexsort((-totals if largest else totals, pair_stock))
+        sorted_stock = pair_stock[order]
+        rank = np.arange(len(order)) - np.searchsorted(sorted_stock, sorted_stock)
+        keep = order[rank < k]
+        return pd.DataFrame({
+            self.stock_col: self.stocks.to_numpy()[pair_stock[keep]],
+            '名次': rank[rank < k] + 1,
+            BROKER_COL: self.brokers.to_numpy()[self.pair_broker[keep]],
+            self.net_col: totals[keep],
+        })
+
+    def accumulating_brokers(self, n: int = 20, k: int = 20) -> pd.DataFrame:
+        """
+        全市場近 n 個交易日累積買超最多的 k 個分點，並列出買超與賣超的股票檔數。
+
+        回傳：
+            pd.DataFrame: index 為分點名稱，columns 為 買賣超{value}、買超檔數、賣超檔數
+        """
+        totals = self.rolling_net(n)
+        pair_broker = self.pair_broker
+        n_brokers = len(self.brokers)
+        summary = pd.DataFrame({
+            self.net_col: np.bincount(pair_broker, weights=totals, minlength=n_brokers),
+            '買超檔數': np.bincount(pair_broker, weights=totals > 0, minlength=n_brokers).astype(np.int64),
+            '賣超檔數': np.bincount(pair_broker, weights=totals < 0, minlength=n_brokers).astype(np.int64),
+        }, index=pd.Index(self.brokers, name=BROKER_COL))
+        return summary.nlargest(k, self.net_col)
+
+    def daily_net(self, stock_id, brokers: list = None) -> pd.DataFrame:
+        """
+        單一股票各分點的每日買賣超 pivot（index 為日期，columns 為分點名稱），供畫圖使用。
+        """
+        pairs = self._stock_pairs(stock_id)
+        if brokers is not None:
+            wanted = self.brokers.get_indexer(brokers)
+            pairs = pairs[np.isin(self.pair_broker[pairs], wanted[wanted >= 0])]
+        date_pos, pair_idx, net = self._rows()
+        local = np.full(len(self._pair_keys), -1, dtype=np.int64)
+        local[pairs] = np.arange(len(pairs))
+        rows = local[pair_idx] >= 0
+        values = np.zeros((len(self.dates), len(pairs)))
+        np.add.at(values, (date_pos[rows], local[pair_idx[rows]]), net[rows])
+        columns = pd.Index(self.brokers[self.pair_broker[pairs]], name=BROKER_COL)
+        result = pd.DataFrame(values, index=self.dates, columns=columns)
+        return result[brokers] if brokers is not None else result
+
+    #### 存檔
+
+    def save(self, path: str) -> None:
+        """
+        存成 .npz（只含 numpy 陣列），供 load 後以 update_from_db 補新交易日。
+        """
+        date_pos, pair_idx, net = self._rows()
+        np.savez(path, date_pos=date_pos, pair_idx=pair_idx, net=net,
+                 dates=self.dates.values.astype('datetime64[ns]'), pair_keys=self._pair_keys.to_numpy(),
+                 stocks=np.asarray(self.stocks, dtype=str), brokers=np.asarray(self.brokers, dtype=str),
+                 meta=np.array([self.value, self.stock_col]))
+
+    @classmethod
+    def load(cls, path: str) -> 'DealerRollup':
+        """
+        讀取 save 存的 .npz。
+        """
+        with np.load(path) as data:
+            value, stock_col = data['meta'].tolist()
+            rollup = cls(value, stock_col)
+            rollup._date_pos, rollup._pair_idx, rollup._net = data['date_pos'], data['pair_idx'], data['net']
+            rollup.dates = pd.DatetimeIndex(data['dates'], name='date')
+            rollup._pair_keys = pd.Index(data['pair_keys'])
+            rollup.stocks = pd.Index(data['stocks'].tolist())
+            rollup.brokers = pd.Index(data['brokers'].tolist())
+        return rollup
@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
+from api import profiling
 
 
+@profiling.instrument()
 def sma_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     計算 n 日簡單移動平均線（SMA），適用於 pivot 結構（index: 日期, columns: 股票代碼）。
@@ -19,6 +22,7 @@ def sma_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     return sma_pivot_df
 
 
+@profiling.instrument()
 def ema_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     計算 n 日指數移動平均線（EMA），適用於 pivot 結構（index: 日期, columns: 股票代碼）。
@@ -37,6 +41,7 @@ def ema_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     return ema_pivot_df
 
 
+@profiling.instrument()
 def wma_pivot_df(pivot_df: pd.DataFrame, weight_pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     計算 n 日加權移動平均線（WMA），以權重 pivot df 為權重。
@@ -58,6 +63,7 @@ def wma_pivot_df(pivot_df: pd.DataFrame, weight_pivot_df: pd.DataFrame, n: int)
     wma_pivot_df.iloc[:n-1] = pd.NA
     return wma_pivot_df
 
+@profiling.instrument()
 def n_day_high_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     計算 n 日創新高價（rolling max），適用於 pivot 結構。
@@ -76,6 +82,7 @@ def n_day_high_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     return n_day_high_pivot_df
 
 
+@profiling.instrument()
 def n_day_low_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     計算 n 日創新低價（rolling min），適用於 pivot 結構。
@@ -96,6 +103,7 @@ def n_day_low_pivot_df(pivot_df: pd.DataFrame, n: int) -> pd.DataFrame:
 
 
 
+@profiling.instrument()
 def k_pivot_df(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame, high_pivot_df: pd.DataFrame, n: int = 9) -> pd.DataFrame:
     """
     計算 n 日隨機指標 K 值（Stochastic K），適用於 pivot 結構。
@@ -117,6 +125,7 @@ def k_pivot_df(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame, high_pi
     return k_pivot_df
 
 
+@profiling.instrument()
 def d_pivot_df(k_pivot_df: pd.DataFrame, n: int = 3) -> pd.DataFrame:
     """
     計算 D 值（K 值的 n 日移動平均），適用於 pivot 結構。
@@ -133,6 +142,7 @@ def d_pivot_df(k_pivot_df: pd.DataFrame, n: int = 3) -> pd.DataFrame:
     return d_pivot_df
 
 
+@profiling.instrument()
 def macd_pivot_df(pivot_df: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9) -> pd.DataFrame:
     """
     計算 MACD 指標（僅回傳 MACD 值），適用於 pivot 結構。
@@ -154,6 +164,7 @@ def macd_pivot_df(pivot_df: pd.DataFrame, fast: int = 12, slow: int = 26, signal
     return macd_pivot_df
 
 
+@profiling.instrument()
 def williams_pivot_df(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame, high_pivot_df: pd.DataFrame, n: int = 14) -> pd.DataFrame:
     """
     計算 n 日威廉指數（Williams %R），適用於 pivot 結構。
@@ -174,6 +185,7 @@ def williams_pivot_df(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame,
     williams_r_pivot_df.iloc[:n-1] = pd.NA
     return williams_r_pivot_df
 
+@profiling.instrument()
 def add_ma(df: pd.DataFrame, n: int, price_col: str = '收盤價') -> pd.DataFrame:
     """
     計算 n 日移動平均線（MA），並新增欄位 MA{n}
@@ -183,15 +195,251 @@ def add_ma(df: pd.DataFrame, n: int, price_col: str = '收盤價') -> pd.DataFra
     return df
 
 
+@profiling.instrument()
 def add_ma_pivots(df: pd.DataFrame, ma_list: list) -> dict:
     """
     計算 n 日移動平均線（MA），並新增欄位 MA{n}
+    所有天數共用同一個累積和一次算完（見 multi_sma_pivot_df）。
     """
-    ma_pivots = {}
-    for n in ma_list:
-        ma_pivots[f'MA{n}'] = df.rolling(window=n, min_periods=1).mean()
-    return ma_pivots
+    return multi_sma_pivot_df(df, ma_list, mask_head=False)
 
+
+@profiling.instrument()
+def multi_sma_pivot_df(pivot_df: pd.DataFrame, n_list: list, mask_head: bool = True) -> dict:
+    """
+    一次計算多個天數的 SMA：只建立一次累積和陣列，每個天數只是兩個陣列相減。
+    視窗內數值皆相同（平盤）時直接取該值，與 rolling mean 相同，不會因累積和相減的浮點誤差而略低於收盤價。
+
+    參數：
+        pivot_df (pd.DataFrame): 收盤價等指標的 pivot df
+        n_list (list): 均線天數列表，如 [5, 10, 20, 60, 120]
+        mask_head (bool): True 時前 n-1 天為 NaN（同 sma_pivot_df）；False 時同 add_ma_pivots（min_periods=1）
+    回傳：
+        dict: {'MA5': df, 'MA10': df, ...}
+    範例：
+        ma_pivots = multi_sma_pivot_df(收盤價_pivot_df, [5, 10, 20])
+    """
+    values = pivot_df.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    cum_sum = np.cumsum(np.where(valid, values, 0.0), axis=0)
+    cum_cnt = np.cumsum(valid, axis=0, dtype=float)
+    highs = _multi_rolling_extreme(pivot_df, n_list, 'max', mask_head=False)
+    lows = _multi_rolling_extreme(pivot_df, n_list, 'min', mask_head=False)
+    result = {}
+    for n in n_list:
+        # 第 t 列的視窗和 = cum[t] - cum[t-n]，前 n 列視窗從第一天起算
+        window_sum = cum_sum.copy()
+        window_cnt = cum_cnt.copy()
+        window_sum[n:] -= cum_sum[:-n]
+        window_cnt[n:] -= cum_cnt[:-n]
+        window_cnt[window_cnt == 0] = np.nan
+        sma = window_sum / window_cnt
+        high, low = highs[n].to_numpy(), lows[n].to_numpy()
+        sma = np.where(high == low, high, sma)
+        if mask_head:
+            sma[:n-1] = np.nan
+        result[f'MA{n}'] = pd.DataFrame(sma, index=pivot_df.index, columns=pivot_df.columns)
+    return result
+
+
+def _multi_rolling_extreme(pivot_df: pd.DataFrame, n_list: list, mode: str, mask_head: bool) -> dict:
+    """
+    以 sparse table 一次計算多個天數的滾動最大/最小值（忽略 NaN）。
+    依序建立 2^k 長度的區間極值，每個天數 n 以兩個重疊的 2^k 區間取極值；同時只保留一層表。
+    """
+    ufunc = np.fmax if mode == 'max' else np.fmin
+    values = pivot_df.to_numpy(dtype=float)
+    n_rows = len(values)
+    # 前 n-1 天（不足 n 日）即為從第一天起的累積極值
+    expanding = ufunc.accumulate(values, axis=0) if not mask_head else None
+    result = {}
+    level = values  # level[i] = values[i : i + 2^k] 的極值
+    k = 0
+    for n in sorted(set(n_list)):
+        while (1 << (k + 1)) <= n:
+            half = 1 << k
+            level = ufunc(level[:-half], level[half:]) if len(level) > half else level[:0]
+            k += 1
+        out = np.full_like(values, np.nan)
+        if n_rows >= n:
+            span = 1 << k
+            starts = np.arange(0, n_rows - n + 1)
+            out[n-1:] = ufunc(level[starts], level[starts + n - span])
+        if not mask_head:
+            out[:n-1] = expanding[:n-1]
+        result[n] = pd.DataFrame(out, index=pivot_df.index, columns=pivot_df.columns)
+    return result
+
+
+@profiling.instrument()
+def multi_n_day_high_pivot_df(pivot_df: pd.DataFrame, n_list: list, mask_head: bool = True) -> dict:
+    """
+    一次計算多個天數的 n 日最高價（同 n_day_high_pivot_df），共用 sparse table。
+
+    參數：
+        pivot_df (pd.DataFrame): 價格等指標的 pivot df
+        n_list (list): 區間天數列表，如 [5, 20, 60]
+        mask_head (bool): True 時前 n-1 天為 NaN
+    回傳：
+        dict: {'HIGH5': df, 'HIGH20': df, ...}
+    """
+    extremes = _multi_rolling_extreme(pivot_df, n_list, 'max', mask_head)
+    return {f'HIGH{n}': extremes[n] for n in n_list}
+
+
+@profiling.instrument()
+def multi_n_day_low_pivot_df(pivot_df: pd.DataFrame, n_list: list, mask_head: bool = True) -> dict:
+    """
+    一次計算多個天數的 n 日最低價（同 n_day_low_pivot_df），共用 sparse table。
+
+    參數：
+        pivot_df (pd.DataFrame): 價格等指標的 pivot df
+        n_list (list): 區間天數列表，如 [5, 20, 60]
+        mask_head (bool): True 時前 n-1 天為 NaN
+    回傳：
+        dict: {'LOW5': df, 'LOW20': df, ...}
+    """
+    extremes = _multi_rolling_extreme(pivot_df, n_list, 'min', mask_head)
+    return {f'LOW{n}': extremes[n] for n in n_list}
+
+
+#### 指定日期計算：只對目標日取一個 n 日視窗，不計算整段滾動序列（結果同對應的 *_pivot_df 在該日的值）
+
+def _target_positions(index: pd.Index, dates) -> np.ndarray:
+    """
+    目標日期轉為列位置（遞增、不重複）；非交易日取之前最近的交易日。
+    """
+    targets = pd.DatetimeIndex(pd.to_datetime(dates)) if isinstance(index, pd.DatetimeIndex) else pd.Index(dates)
+    positions = index.searchsorted(targets, side='right') - 1
+    if (positions < 0).any():
+        raise ValueError("目標日期早於資料起始日")
+    return np.unique(positions)
+
+
+def _window_stack(values: np.ndarray, positions: np.ndarray, n: int) -> np.ndarray:
+    """
+    取出每個目標列往前 n 列的視窗，shape 為 (目標數, n, 股票數)；資料起點之前的列為 NaN。
+    """
+    offsets = positions[:, None] + np.arange(-n + 1, 1)
+    stack = values[np.clip(offsets, 0, None)]
+    stack[offsets < 0] = np.nan
+    return stack
+
+
+def _window_mean(stack: np.ndarray) -> np.ndarray:
+    # 忽略 NaN 的視窗平均；整個視窗相同時直接取該值（同 pandas rolling mean，平盤不產生浮點誤差）
+    valid = ~np.isnan(stack)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, stack, 0.0).sum(axis=1) / count
+    high, low = np.fmax.reduce(stack, axis=1), np.fmin.reduce(stack, axis=1)
+    mean = np.where(high == low, high, mean)
+    return np.where(count > 0, mean, np.nan)
+
+
+def _window_sum(stack: np.ndarray) -> np.ndarray:
+    # 忽略 NaN 的視窗加總，整個視窗皆為 NaN 時為 NaN（同 rolling(min_periods=1).sum()）
+    valid = ~np.isnan(stack)
+    return np.where(valid.any(axis=1), np.where(valid, stack, 0.0).sum(axis=1), np.nan)
+
+
+def _at_dates_frame(values: np.ndarray, pivot_df: pd.DataFrame, positions: np.ndarray, n: int) -> pd.DataFrame:
+    # 前 n-1 天的目標日為 NaN（同 *_pivot_df 的 iloc[:n-1] = NA）
+    values = np.asarray(values, dtype=float)
+    values[positions < n - 1] = np.nan
+    return pd.DataFrame(values, index=pivot_df.index[positions], columns=pivot_df.columns)
+
+
+@profiling.instrument()
+def sma_at_dates(pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日 SMA（每個目標日一個視窗平均），結果同 sma_pivot_df 在這些日期的值。
+
+    參數：
+        pivot_df (pd.DataFrame): 收盤價等指標的 pivot df（至少涵蓋目標日往前 n-1 個交易日）
+        n (int): 均線天數
+        dates: 目標日期列表，非交易日取之前最近的交易日
+    回傳：
+        pd.DataFrame: index 為目標交易日、columns 為股票代碼
+    範例：
+        sma_at_dates(收盤價_pivot_df, 60, [收盤價_pivot_df.index[-1]])
+    """
+    positions = _target_positions(pivot_df.index, dates)
+    stack = _window_stack(pivot_df.to_numpy(dtype=float), positions, n)
+    return _at_dates_frame(_window_mean(stack), pivot_df, positions, n)
+
+
+@profiling.instrument()
+def wma_at_dates(pivot_df: pd.DataFrame, weight_pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日加權移動平均，結果同 wma_pivot_df 在這些日期的值。
+    """
+    positions = _target_positions(pivot_df.index, dates)
+    values = pivot_df.to_numpy(dtype=float)
+    weights = weight_pivot_df.to_numpy(dtype=float)
+    weighted_sum = _window_sum(_window_stack(values * weights, positions, n))
+    weight_sum = _window_sum(_window_stack(weights, positions, n))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        wma = weighted_sum / weight_sum
+    return _at_dates_frame(wma, pivot_df, positions, n)
+
+
+@profiling.instrument()
+def n_day_high_at_dates(pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日最高，結果同 n_day_high_pivot_df 在這些日期的值。
+    """
+    positions = _target_positions(pivot_df.index, dates)
+    stack = _window_stack(pivot_df.to_numpy(dtype=float), positions, n)
+    return _at_dates_frame(np.fmax.reduce(stack, axis=1), pivot_df, positions, n)
+
+
+@profiling.instrument()
+def n_day_low_at_dates(pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日最低，結果同 n_day_low_pivot_df 在這些日期的值。
+    """
+    positions = _target_positions(pivot_df.index, dates)
+    stack = _window_stack(pivot_df.to_numpy(dtype=float), positions, n)
+    return _at_dates_frame(np.fmin.reduce(stack, axis=1), pivot_df, positions, n)
+
+
+@profiling.instrument()
+def k_at_dates(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame, high_pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日 K 值，結果同 k_pivot_df 在這些日期的值。
+    """
+    positions = _target_positions(close_pivot_df.index, dates)
+    lowest_low = np.fmin.reduce(_window_stack(low_pivot_df.to_numpy(dtype=float), positions, n), axis=1)
+    highest_high = np.fmax.reduce(_window_stack(high_pivot_df.to_numpy(dtype=float), positions, n), axis=1)
+    close = close_pivot_df.to_numpy(dtype=float)[positions]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        k = (close - lowest_low) / (highest_high - lowest_low) * 100
+    return _at_dates_frame(k, close_pivot_df, positions, n)
+
+
+@profiling.instrument()
+def d_at_dates(k_pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 D 值（K 值的 n 日平均），結果同 d_pivot_df 在這些日期的值。
+    """
+    return sma_at_dates(k_pivot_df, n, dates)
+
+
+@profiling.instrument()
+def williams_at_dates(close_pivot_df: pd.DataFrame, low_pivot_df: pd.DataFrame, high_pivot_df: pd.DataFrame, n: int, dates) -> pd.DataFrame:
+    """
+    只計算目標日的 n 日威廉指數，結果同 williams_pivot_df 在這些日期的值。
+    """
+    positions = _target_positions(close_pivot_df.index, dates)
+    lowest_low = np.fmin.reduce(_window_stack(low_pivot_df.to_numpy(dtype=float), positions, n), axis=1)
+    highest_high = np.fmax.reduce(_window_stack(high_pivot_df.to_numpy(dtype=float), positions, n), axis=1)
+    close = close_pivot_df.to_numpy(dtype=float)[positions]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        williams_r = (highest_high - close) / (highest_high - lowest_low) * -100
+    return _at_dates_frame(williams_r, close_pivot_df, positions, n)
+
+@profiling.instrument()
 def add_macd(df: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9, price_col: str = '收盤價') -> pd.DataFrame:
     """
     計算 MACD 指標，並新增欄位 MACD, MACD_signal, MACD_hist
@@ -204,3 +452,258 @@ def add_macd(df: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9,
     df['MACD_hist'] = df['MACD'] - df['MACD_signal']
     return df
 
+
+
+#### 增量（串流）指標：每新增一個交易日只更新狀態，O(股票數)
+
+class _RollingSum:
+    """
+    n 日滾動加總（忽略 NaN），每次更新 O(股票數)；緩衝區每繞一圈重新加總一次，避免浮點誤差累積。
+    """
+
+    def __init__(self, n: int, n_cols: int):
+        self.n = n
+        self.buf = np.full((n, n_cols), np.nan)
+        self.pos = 0
+        self.total = np.zeros(n_cols)
+        self.cnt = np.zeros(n_cols, dtype=np.int64)
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        old = self.buf[self.pos]
+        old_valid = ~np.isnan(old)
+        new_valid = ~np.isnan(x)
+        self.total += np.where(new_valid, x, 0.0) - np.where(old_valid, old, 0.0)
+        self.cnt += new_valid.astype(np.int64) - old_valid.astype(np.int64)
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.n
+        if self.pos == 0:
+            self.total = np.nansum(self.buf, axis=0)
+        return np.where(self.cnt > 0, self.total, np.nan)
+
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.cnt > 0, self.total / self.cnt, np.nan)
+
+
+class _RollingExtreme:
+    """
+    n 日滾動最大/最小值（忽略 NaN）。只有離開視窗的值剛好是目前極值、且新值沒有取代它時，才重新掃描該欄。
+    """
+
+    def __init__(self, n: int, n_cols: int, mode: str = 'max'):
+        self.n = n
+        self.is_max = mode == 'max'
+        self.ufunc = np.fmax if self.is_max else np.fmin
+        self.buf = np.full((n, n_cols), np.nan)
+        self.pos = 0
+        self.cur = np.full(n_cols, np.nan)
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        old = self.buf[self.pos].copy()
+        prev = self.cur
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.n
+        self.cur = self.ufunc(prev, x)
+        replaced = (x >= old) if self.is_max else (x <= old)
+        stale = (old == prev) & ~replaced
+        if stale.any():
+            self.cur[stale] = self.ufunc.reduce(self.buf[:, stale], axis=0)
+        return self.cur.copy()
+
+
+class _EwmState:
+    """
+    與 pandas ewm(span=n, adjust=False).mean() 相同的遞迴（含 NaN 處理）。
+    """
+
+    def __init__(self, span: int, n_cols: int):
+        self.alpha = 2.0 / (span + 1.0)
+        self.weighted = np.full(n_cols, np.nan)
+        self.old_wt = np.ones(n_cols)
+
+    def push(self, x: np.ndarray) -> np.ndarray:
+        is_obs = ~np.isnan(x)
+        started = ~np.isnan(self.weighted)
+        # 已有值：權重衰減，有觀測值時與新值加權平均
+        self.old_wt = np.where(started, self.old_wt * (1 - self.alpha), self.old_wt)
+        update = started & is_obs & (self.weighted != x)
+        with np.errstate(invalid='ignore'):
+            blended = (self.old_wt * self.weighted + self.alpha * x) / (self.old_wt + self.alpha)
+        self.weighted = np.where(update, blended, self.weighted)
+        self.old_wt = np.where(started & is_obs, 1.0, self.old_wt)
+        # 第一個觀測值
+        self.weighted = np.where(~started & is_obs, x, self.weighted)
+        return self.weighted.copy()
+
+
+class IncrementalIndicator:
+    """
+    增量指標基底類別：保存滾動狀態，每個新交易日以 update() 更新，結果與對應的批次 *_pivot_df 函式一致（浮點誤差內）。
+
+    用法：
+        ind = IncrementalSMA.from_history(close_pivot, n=20)   # 以歷史資料暖機
+        sma_today = ind.update(close_today)                     # close_today: pd.Series，index 為股票代碼
+    注意：
+        股票代碼以暖機時的 columns 為準，新上市股票需重新 from_history。
+    """
+    # 暖機只需最後 lookback 列；None 表示需完整歷史（如 EMA）
+    lookback = None
+
+    def __init__(self, columns, mask_n: int):
+        self.columns = pd.Index(columns)
+        self.mask_n = mask_n
+        self.count = 0
+
+    def _push(self, *arrays: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def update(self, *rows: pd.Series) -> pd.Series:
+        """
+        傳入新交易日的一列資料（依指標需要傳入 close / low / high 等 pd.Series），回傳當日指標值。
+        """
+        arrays = [row.reindex(self.columns).to_numpy(dtype=float) for row in rows]
+        value = self._push(*arrays)
+        self.count += 1
+        if self.count < self.mask_n:
+            value = np.full(len(self.columns), np.nan)
+        return pd.Series(value, index=self.columns, name=rows[0].name)
+
+    def warm_up(self, *pivot_dfs: pd.DataFrame) -> 'IncrementalIndicator':
+        """
+        以歷史 pivot df 建立狀態（視窗型指標只讀最後 lookback 列）。
+        """
+        arrays = [p.reindex(columns=self.columns).to_numpy(dtype=float) for p in pivot_dfs]
+        n_rows = len(pivot_dfs[0])
+        start = 0 if self.lookback is None else max(0, n_rows - self.lookback)
+        for i in range(start, n_rows):
+            self._push(*(a[i] for a in arrays))
+        self.count = n_rows
+        return self
+
+    @classmethod
+    def from_history(cls, *pivot_dfs: pd.DataFrame, **params) -> 'IncrementalIndicator':
+        return cls(pivot_dfs[0].columns, **params).warm_up(*pivot_dfs)
+
+
+class IncrementalSMA(IncrementalIndicator):
+    """
+    增量版 sma_pivot_df。D 值亦可用本類別（n=3）餵入 IncrementalK 的輸出。
+    """
+
+    def __init__(self, columns, n: int):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._sum = _RollingSum(n, len(self.columns))
+
+    def _push(self, x):
+        self._sum.push(x)
+        return self._sum.mean()
+
+
+class IncrementalEMA(IncrementalIndicator):
+    """
+    增量版 ema_pivot_df。
+    """
+
+    def __init__(self, columns, n: int):
+        super().__init__(columns, n)
+        self._ewm = _EwmState(n, len(self.columns))
+
+    def _push(self, x):
+        return self._ewm.push(x)
+
+
+class IncrementalWMA(IncrementalIndicator):
+    """
+    增量版 wma_pivot_df，update(price_row, weight_row)。
+    """
+
+    def __init__(self, columns, n: int):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._weighted_sum = _RollingSum(n, len(self.columns))
+        self._weight_sum = _RollingSum(n, len(self.columns))
+
+    def _push(self, x, w):
+        weighted_sum = self._weighted_sum.push(x * w)
+        weight_sum = self._weight_sum.push(w)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return weighted_sum / weight_sum
+
+
+class IncrementalNDayHigh(IncrementalIndicator):
+    """
+    增量版 n_day_high_pivot_df。
+    """
+
+    def __init__(self, columns, n: int):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._max = _RollingExtreme(n, len(self.columns), 'max')
+
+    def _push(self, x):
+        return self._max.push(x)
+
+
+class IncrementalNDayLow(IncrementalIndicator):
+    """
+    增量版 n_day_low_pivot_df。
+    """
+
+    def __init__(self, columns, n: int):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._min = _RollingExtreme(n, len(self.columns), 'min')
+
+    def _push(self, x):
+        return self._min.push(x)
+
+
+class IncrementalK(IncrementalIndicator):
+    """
+    增量版 k_pivot_df，update(close_row, low_row, high_row)。
+    """
+
+    def __init__(self, columns, n: int = 9):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._low = _RollingExtreme(n, len(self.columns), 'min')
+        self._high = _RollingExtreme(n, len(self.columns), 'max')
+
+    def _push(self, close, low, high):
+        lowest_low = self._low.push(low)
+        highest_high = self._high.push(high)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (close - lowest_low) / (highest_high - lowest_low) * 100
+
+
+class IncrementalMACD(IncrementalIndicator):
+    """
+    增量版 macd_pivot_df（僅 MACD 值）。
+    """
+
+    def __init__(self, columns, fast: int = 12, slow: int = 26, signal: int = 9):
+        super().__init__(columns, fast)
+        self._fast = _EwmState(fast, len(self.columns))
+        self._slow = _EwmState(slow, len(self.columns))
+
+    def _push(self, x):
+        return self._fast.push(x) - self._slow.push(x)
+
+
+class IncrementalWilliams(IncrementalIndicator):
+    """
+    增量版 williams_pivot_df，update(close_row, low_row, high_row)。
+    """
+
+    def __init__(self, columns, n: int = 14):
+        super().__init__(columns, n)
+        self.lookback = n
+        self._low = _RollingExtreme(n, len(self.columns), 'min')
+        self._high = _RollingExtreme(n, len(self.columns), 'max')
+
+    def _push(self, close, low, high):
+        lowest_low = self._low.push(low)
+        highest_high = self._high.push(high)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (highest_high - close) / (highest_high - lowest_low) * -100
@@ -0,0 +1,346 @@
+"""
+indicator_store.py - 指標結果的磁碟快取（memoization）
+
+核心理念：
+- 以「指標函式（含原始碼）、參數、輸入 pivot 的欄位」為 key，結果 pivot 存成 feather（Arrow IPC，寬表讀寫比 Parquet 快），跨程序、跨腳本共用。
+- 同時記錄每個輸入日期列的雜湊值；下次呼叫時只比對輸入列，日期區間重疊且資料相同的部分直接沿用，
+  只對新增的日期（加上 n-1 天暖機資料）重新計算，再與沿用的部分接起來。
+- 有限回看天數的指標（SMA/WMA/高低點/KD/威廉）可向前後延伸；EMA/MACD 等遞迴指標只在同起點、請求區間
+  包含於已存區間時沿用，否則整段重算。
+- 總容量超過上限時，依最近使用時間（LRU）刪除最舊的項目。
+- 需安裝 pyarrow 套件。
+
+範例：
+    from api.indicator_store import memoize
+    sma60 = memoize(sma_pivot_df)(close_pivot, 60)
+"""
+import os
+import json
+import time
+import hashlib
+import inspect
+import threading
+from typing import Callable, Dict, Optional
+import numpy as np
+import pandas as pd
+from api import indicator
+from api.utility import get_info_str
+
+DEBUG_MODE = 0
+
+INDICATOR_STORE_DIR = os.getenv('INDICATOR_STORE_DIR', 'indicator_cache')
+# 快取總容量上限（MB），超過時依 LRU 刪除
+INDICATOR_STORE_MAX_MB = float(os.getenv('INDICATOR_STORE_MAX_MB', 2048))
+INDEX_FILE = '_index.json'
+# feather 不存 index，寫檔時把日期 index 轉成此欄位
+_INDEX_COL = '__index__'
+
+# 各指標的回看天數：第 t 天的值只依賴輸入的第 t-L+1 ~ t 天；None 表示依賴全部歷史（遞迴指標）
+LOOKBACK: Dict[Callable, Callable[[dict], Optional[int]]] = {
+    indicator.sma_pivot_df: lambda p: p['n'],
+    indicator.wma_pivot_df: lambda p: p['n'],
+    indicator.n_day_high_pivot_df: lambda p: p['n'],
+    indicator.n_day_low_pivot_df: lambda p: p['n'],
+    indicator.k_pivot_df: lambda p: p['n'],
+    indicator.d_pivot_df: lambda p: p['n'],
+    indicator.williams_pivot_df: lambda p: p['n'],
+    indicator.ema_pivot_df: lambda p: None,
+    indicator.macd_pivot_df: lambda p: None,
+}
+
+
+def _func_fingerprint(func: Callable) -> str:
+    """
+    函式名稱加上原始碼雜湊，指標實作修改後舊快取自動失效。
+    """
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = ''
+    return f"{func.__module__}.{func.__qualname__}:{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _row_hashes(frames: list) -> np.ndarray:
+    """
+    每個輸入 pivot 每一列的雜湊值，shape 為 (列數, 輸入個數)。
+    數值 pivot 直接取位元混合後乘上各欄的奇數亂數再加總（溢位即 mod 2^64），
+    任一格改變必定改變該列雜湊；其他型別改用 pd.util.hash_pandas_object。
+    """
+    hashes = []
+    for frame in frames:
+        values = frame.to_numpy()
+        if values.dtype.kind in 'fiub' and values.dtype.itemsize in (1, 2, 4, 8):
+            bits = np.ascontiguousarray(values).view(f'u{values.dtype.itemsize}').astype(np.uint64)
+            bits ^= bits >> np.uint64(29)
+            multipliers = np.random.default_rng(len(frame.columns)).integers(0, 2**63, size=values.shape[1], dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+            hashes.append((bits * multipliers).sum(axis=1, dtype=np.uint64))
+        else:
+            hashes.append(pd.util.hash_pandas_object(frame, index=False).to_numpy())
+    return np.column_stack(hashes)
+
+
+class IndicatorStore:
+    """
+    指標結果的磁碟快取，支援日期區間延伸與 LRU 容量淘汰。
+
+    參數：
+        store_dir (str): 快取目錄，預設讀取環境變數 INDICATOR_STORE_DIR 或 'indicator_cache'
+        max_mb (float): 總容量上限（MB），預設讀取環境變數 INDICATOR_STORE_MAX_MB 或 2048
+    範例：
+        store = IndicatorStore()
+        sma60 = store.compute(sma_pivot_df, close_pivot, n=60)
+        k9 = store.compute(k_pivot_df, close_pivot, low_pivot, high_pivot, n=9)
+    """
+
+    def __init__(self, store_dir: str = INDICATOR_STORE_DIR, max_mb: float = INDICATOR_STORE_MAX_MB):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("指標快取需要 pyarrow 套件，請執行 pip install pyarrow")
+        self.store_dir = store_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.RLock()
+        self.stats = {'hit': 0, 'partial': 0, 'miss': 0}
+
+    #### 索引檔
+
+    def _index_path(self) -> str:
+        return os.path.join(self.store_dir, INDEX_FILE)
+
+    def _read_index(self) -> dict:
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_index(self, index: dict) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._index_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _paths(self, key: str) -> tuple:
+        return (os.path.join(self.store_dir, f'{key}.feather'), os.path.join(self.store_dir, f'{key}.hash.npy'))
+
+    #### key 與讀寫
+
+    @staticmethod
+    def _split_args(func: Callable, args: tuple, kwargs: dict) -> tuple:
+        """
+        依函式簽章拆出輸入 pivot（DataFrame 參數）與其餘參數（含預設值）。
+        """
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        inputs, params = {}, {}
+        for name, value in bound.arguments.items():
+            if isinstance(value, pd.DataFrame):
+                inputs[name] = value
+            else:
+                params[name] = value
+        if not inputs:
+            raise ValueError(f"{func.__name__} 沒有 DataFrame 輸入，無法快取")
+        return inputs, params
+
+    @staticmethod
+    def _make_key(func: Callable, inputs: dict, params: dict) -> str:
+        first = next(iter(inputs.values()))
+        for name, frame in inputs.items():
+            if not frame.index.equals(first.index) or not frame.columns.equals(first.columns):
+                raise ValueError(f"輸入 {name} 的日期或欄位與其他輸入不一致")
+            if not frame.index.is_monotonic_increasing:
+                raise ValueError(f"輸入 {name} 的日期需遞增排序")
+        spec = {
+            'func': _func_fingerprint(func),
+            'params': {name: repr(value) for name, value in sorted(params.items())},
+            'inputs': {name: [str(c) for c in frame.columns] + [str(d) for d in frame.dtypes.unique()] for name, frame in inputs.items()},
+        }
+        return hashlib.sha1(json.dumps(spec, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _load(self, key: str) -> Optional[tuple]:
+        result_path, hash_path = self._paths(key)
+        if not (os.path.exists(result_path) and os.path.exists(hash_path)):
+            return None
+        result = pd.read_feather(result_path).set_index(_INDEX_COL)
+        return result, np.load(hash_path)
+
+    def _save(self, key: str, func: Callable, result: pd.DataFrame, hashes: np.ndarray) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        result_path, hash_path = self._paths(key)
+        result.reset_index(names=_INDEX_COL).to_feather(result_path + '.tmp')
+        os.replace(result_path + '.tmp', result_path)
+        with open(hash_path + '.tmp', 'wb') as f:
+            np.save(f, hashes)
+        os.replace(hash_path + '.tmp', hash_path)
+        index = self._read_index()
+        index[key] = {
+            'func': func.__name__,
+            'start': str(result.index[0]) if len(result) else None,
+            'end': str(result.index[-1]) if len(result) else None,
+            'bytes': os.path.getsize(result_path) + os.path.getsize(hash_path),
+            'last_access': time.time(),
+        }
+        self._evict(index, keep=key)
+        self._write_index(index)
+
+    def _touch(self, key: str) -> None:
+        index = self._read_index()
+        if key in index:
+            index[key]['last_access'] = time.time()
+            self._write_index(index)
+
+    def _evict(self, index: dict, keep: str) -> None:
+        """
+        總容量超過上限時，依 last_access 由舊到新刪除（剛寫入的 keep 不刪）。
+        """
+        total = sum(entry['bytes'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            for path in self._paths(key):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= index.pop(key)['bytes']
+            print(get_info_str(__name__), f"快取超過上限，刪除 {key}") if DEBUG_MODE else None
+
+    #### 計算
+
+    def compute(self, func: Callable, *args, lookback: Optional[int] = None, **kwargs) -> pd.DataFrame:
+        """
+        以快取執行 func(*args, **kwargs)，回傳值與直接呼叫相同。
+
+        參數：
+            func (Callable): 回傳 pivot df 的指標函式（如 indicator.sma_pivot_df）
+            *args, **kwargs: 傳給 func 的參數，DataFrame 參數視為輸入，其餘視為指標參數
+            lookback (int): 回看天數；未指定時查 LOOKBACK 表，表中沒有的函式視為遞迴指標（只沿用同起點的前段）
+        回傳：
+            pd.DataFrame: 指標 pivot df
+        """
+        inputs, params = self._split_args(func, args, kwargs)
+        if lookback is None and func in LOOKBACK:
+            lookback = LOOKBACK[func](params)
+        key = self._make_key(func, inputs, params)
+        frames = list(inputs.values())
+        dates = frames[0].index
+        hashes = _row_hashes(frames)
+
+        def run(start: int, stop: int) -> pd.DataFrame:
+            sliced = {name: frame.iloc[start:stop] for name, frame in inputs.items()}
+            part = func(**sliced, **params)
+            if not isinstance(part, pd.DataFrame) or not part.columns.equals(frames[0].columns):
+                raise TypeError(f"{func.__name__} 需回傳與輸入欄位相同的 DataFrame 才能快取")
+            part = part.copy()
+            part.columns = [str(c) for c in part.columns]
+            return part
+
+        with self._lock:
+            stored = self._load(key)
+        status, result, matched = 'miss', None, False
+        if stored is not None and len(dates):
+            status, result, matched = self._extend(run, dates, hashes, stored, lookback)
+        if result is None:
+            status, result = 'miss', run(0, len(dates))
+        self.stats[status] += 1
+        with self._lock:
+            if matched:
+                # 輸入全部落在已存區間且資料相同，不覆寫（保留較長的已存區間）
+                self._touch(key)
+            else:
+                self._save(key, func, result, hashes)
+        print(get_info_str(__name__), f"{func.__name__} {params} {status}，快取統計: {self.stats}") if DEBUG_MODE else None
+        result.columns = frames[0].columns
+        return result
+
+    @staticmethod
+    def _extend(run: Callable, dates: pd.Index, hashes: np.ndarray, stored: tuple, lookback: Optional[int]) -> tuple:
+        """
+        沿用已存結果中輸入相同的連續區段，只重算前後缺少的部分。
+        回傳 (狀態, 結果, 輸入是否全部與已存相同)：狀態為 'hit'（全部沿用）、'partial'（部分重算）；
+        無法沿用時回傳 ('miss', None, False)。
+        """
+        stored_result, stored_hashes = stored
+        if stored_hashes.shape[1] != hashes.shape[1]:
+            return 'miss', None, False
+        n_rows = len(dates)
+        pos = stored_result.index.get_indexer(dates)
+        ok = pos >= 0
+        ok[ok] = (stored_hashes[pos[ok]] == hashes[ok]).all(axis=1)
+        if not ok.any():
+            return 'miss', None, False
+        # 第一段連續相符區段：新位置 i0..i1 對應已存位置 j0..j0+(i1-i0)
+        i0 = int(np.argmax(ok))
+        breaks = np.flatnonzero(~ok[i0:] | (np.diff(pos[i0:], prepend=pos[i0] - 1) != 1))
+        i1 = i0 + (int(breaks[0]) if len(breaks) else n_rows - i0) - 1
+        j0 = int(pos[i0])
+        same_start = i0 == 0 and j0 == 0
+        matched = i0 == 0 and i1 == n_rows - 1
+
+        if lookback is None:
+            # 遞迴指標：只有同起點且請求區間完全落在已存區間內才沿用
+            if same_start and i1 == n_rows - 1:
+                result = stored_result.iloc[:n_rows].copy()
+                result.index = dates
+                return 'hit', result, True
+            return 'miss', None, False
+
+        # 區段前 lookback-1 天的值用到區段外的輸入，除非兩邊都從第一天開始
+        r0 = i0 if same_start else i0 + lookback - 1
+        if r0 > i1:
+            return 'miss', None, False
+        parts = []
+        if r0 > 0:
+            parts.append(run(0, r0))
+        parts.append(stored_result.iloc[j0 + (r0 - i0): j0 + (i1 - i0) + 1])
+        if i1 < n_rows - 1:
+            warmup_start = max(0, i1 + 1 - (lookback - 1))
+            parts.append(run(warmup_start, n_rows).iloc[i1 + 1 - warmup_start:])
+        result = pd.concat(parts) if len(parts) > 1 else parts[0].copy()
+        result.index = dates
+        return ('hit' if len(parts) == 1 else 'partial'), result, matched
+
+    def clear(self) -> None:
+        """
+        刪除所有快取檔。
+        """
+        with self._lock:
+            if not os.path.isdir(self.store_dir):
+                return
+            for f in os.listdir(self.store_dir):
+                os.remove(os.path.join(self.store_dir, f))
+
+
+_default_store = None
+
+
+def get_default_store() -> IndicatorStore:
+    """
+    取得預設快取（目錄與容量讀取環境變數）。
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = IndicatorStore()
+    return _default_store
+
+
+def memoize(func: Callable, store: IndicatorStore = None, lookback: Optional[int] = None) -> Callable:
+    """
+    包裝指標函式，呼叫方式與原函式相同，結果經由磁碟快取。
+
+    參數：
+        func (Callable): 回傳 pivot df 的指標函式
+        store (IndicatorStore): 使用的快取，預設 get_default_store()
+        lookback (int): 回看天數，未指定時查 LOOKBACK 表
+    範例：
+        cached_sma = memoize(sma_pivot_df)
+        sma60 = cached_sma(close_pivot, 60)
+    """
+    def wrapper(*args, **kwargs):
+        return (store or get_default_store()).compute(func, *args, lookback=lookback, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
+    return wrapper
@@ -0,0 +1,222 @@
+"""
+local_cache.py - 資料表本地欄式快取（Parquet）
+
+核心理念：
+- 每張資料表依月份分區存成 Parquet 檔（cache/<table>/<YYYY-MM>.parquet），日期一律存西元 YYYY-MM-DD。
+- 每次只向資料庫補抓快取最大日期當天起（或最早日期之前）的資料，不重複下載歷史；最大日期當天重新抓取以補齊同步時尚未載完的資料。
+- process_df.enable_local_cache() 啟用後，get_db_df / get_db_pivot_df 在快取涵蓋查詢區間時直接讀本地檔。
+- 需安裝 pyarrow 套件。
+"""
+import os
+import json
+import time
+import threading
+from datetime import date
+from typing import List, Optional, Tuple
+import pandas as pd
+from api.db_lib import get_connection, schema_catalog
+from api.process_df import _is_roc_table, decimal_to_float
+from api.utility import get_info_str, to_roc, to_ad_vec
+from api.query_builder import SelectQuery
+
+DEBUG_MODE = 0
+
+CACHE_DIR = os.getenv('LOCAL_CACHE_DIR', 'cache')
+# 查詢區間包含今天時，快取同步超過此秒數即視為過期，會再補抓一次
+CACHE_STALE_AFTER = float(os.getenv('LOCAL_CACHE_STALE_AFTER', 3600))
+META_FILE = '_meta.json'
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("本地快取需要 pyarrow 套件，請執行 pip install pyarrow")
+
+
+class LocalTableCache:
+    """
+    依月份分區的 Parquet 資料表快取，支援增量同步。
+
+    參數：
+        cache_dir (str): 快取根目錄，預設讀取環境變數 LOCAL_CACHE_DIR 或 'cache'
+        stale_after (float): 查詢區間包含今天時，距上次同步超過此秒數就補抓
+    範例：
+        cache = LocalTableCache()
+        cache.sync('price', '2024-01-01', '2025-05-01')
+        df = cache.read('price', '2024-06-01', '2024-12-31', columns=['stock_id', 'date', '收盤價'])
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, stale_after: float = CACHE_STALE_AFTER):
+        _require_pyarrow()
+        self.cache_dir = cache_dir
+        self.stale_after = stale_after
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, table: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(table, threading.Lock())
+
+    def table_dir(self, table: str) -> str:
+        return os.path.join(self.cache_dir, table)
+
+    def read_meta(self, table: str) -> Optional[dict]:
+        """
+        讀取快取狀態：{'start', 'end', 'max_date', 'synced_at'}，無快取時回傳 None。
+        """
+        path = os.path.join(self.table_dir(table), META_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, table: str, meta: dict) -> None:
+        os.makedirs(self.table_dir(table), exist_ok=True)
+        path = os.path.join(self.table_dir(table), META_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def covers(self, table: str, start_date: str, end_date: str) -> bool:
+        """
+        快取是否已涵蓋 [start_date, end_date]（西元 YYYY-MM-DD）。
+        """
+        meta = self.read_meta(table)
+        if meta is None:
+            return False
+        if start_date < meta['start'] or end_date > meta['end']:
+            return False
+        if end_date >= date.today().isoformat() and time.time() - meta['synced_at'] > self.stale_after:
+            return False
+        return True
+
+    def _fetch(self, table: str, lower: Tuple[str, str], upper: str) -> pd.DataFrame:
+        """
+        向資料庫抓取 lower ~ upper 的整列資料，lower 為 (運算子, 日期)，日期皆為西元。
+        """
+        op, lower_date = lower
+        conn = get_connection()
+        try:
+            use_roc = _is_roc_table(conn, table)
+            if use_roc:
+                lower_date, upper = to_roc(lower_date), to_roc(upper)
+            query, params = (SelectQuery(table, schema_catalog.columns(table))
+                             .where('date', op, lower_date)
+                             .where('date', '<=', upper)
+                             .order_by('date')
+                             .build())
+            print(get_info_str(__name__), f"SQL: {query} params: {params}") if DEBUG_MODE else None
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        finally:
+            conn.close()
+        # Decimal 先轉為 float64 再存檔，讀取時不必再逐格轉換
+        df = decimal_to_float(pd.DataFrame(rows, columns=columns))
+        if not df.empty:
+            df['date'] = to_ad_vec(df['date'])
+        return df
+
+    def _append_partitions(self, table: str, df: pd.DataFrame, replace_from: Optional[str] = None) -> int:
+        """
+        將 df 寫入月份分區；指定 replace_from 時先刪除分區中日期 >= replace_from 的舊資料（由 df 重新寫入）。
+        回傳被取代的舊資料筆數。
+        """
+        if df.empty:
+            return 0
+        os.makedirs(self.table_dir(table), exist_ok=True)
+        replaced = 0
+        for month, part in df.groupby(df['date'].str.slice(0, 7), sort=True):
+            path = os.path.join(self.table_dir(table), f'{month}.parquet')
+            if os.path.exists(path):
+                old = pd.read_parquet(path)
+                if replace_from is not None:
+                    keep = old['date'] < replace_from
+                    replaced += int((~keep).sum())
+                    old = old[keep]
+                part = pd.concat([old, part], ignore_index=True)
+                part = part.sort_values('date', kind='mergesort').reset_index(drop=True)
+            tmp_path = path + '.tmp'
+            part.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        return replaced
+
+    def sync(self, table: str, start_date: str, end_date: Optional[str] = None) -> int:
+        """
+        確保快取涵蓋 [start_date, end_date]，只補抓缺少的日期，回傳本次新增筆數。
+        end_date 預設今天。
+        """
+        end_date = end_date or date.today().isoformat()
+        with self._lock(table):
+            meta = self.read_meta(table)
+            fetched = 0
+            if meta is None:
+                df = self._fetch(table, ('>=', start_date), end_date)
+                self._append_partitions(table, df)
+                meta = {'start': start_date, 'end': end_date,
+                        'max_date': df['date'].max() if not df.empty else None}
+                fetched += len(df)
+            else:
+                if start_date < meta['start']:
+                    # 往前補歷史：[start_date, meta['start'])
+                    df = self._fetch(table, ('>=', start_date), meta['start'])
+                    df = df[df['date'] < meta['start']] if not df.empty else df
+                    self._append_partitions(table, df)
+                    meta['start'] = start_date
+                    fetched += len(df)
+                    if meta['max_date'] is None and not df.empty:
+                        meta['max_date'] = df['date'].max()
+                stale = time.time() - meta['synced_at'] > self.stale_after
+                if end_date > meta['end'] or (end_date >= date.today().isoformat() and stale):
+                    # 往後增量：快取最大日期那天可能只寫入一部分（同步時資料庫尚未載完），連同當天重新抓取並取代
+                    lower = ('>=', meta['max_date']) if meta['max_date'] else ('>=', meta['start'])
+                    df = self._fetch(table, lower, end_date)
+                    replaced = self._append_partitions(table, df, replace_from=meta['max_date'])
+                    meta['end'] = max(meta['end'], end_date)
+                    if not df.empty:
+                        meta['max_date'] = max(filter(None, [meta['max_date'], df['date'].max()]))
+                    fetched += len(df) - replaced
+            meta['synced_at'] = time.time()
+            self._write_meta(table, meta)
+        print(get_info_str(__name__), f"{table} 快取同步完成，新增 {fetched} 筆") if DEBUG_MODE else None
+        return fetched
+
+    def read(self, table: str, start_date: str, end_date: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        讀取快取中 [start_date, end_date] 的資料（長格式，date 欄位為西元 YYYY-MM-DD 字串）。
+        """
+        table_dir = self.table_dir(table)
+        months = sorted(f[:-len('.parquet')] for f in os.listdir(table_dir) if f.endswith('.parquet')) if os.path.exists(table_dir) else []
+        months = [m for m in months if start_date[:7] <= m <= end_date[:7]]
+        read_cols = None if columns is None else list(dict.fromkeys(list(columns) + ['date']))
+        parts = [pd.read_parquet(os.path.join(table_dir, f'{m}.parquet'), columns=read_cols) for m in months]
+        if not parts:
+            return pd.DataFrame(columns=read_cols if read_cols is not None else ['date'])
+        df = pd.concat(parts, ignore_index=True)
+        df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+        return df[columns].reset_index(drop=True) if columns is not None else df.reset_index(drop=True)
+
+    def load(self, table: str, start_date: str, end_date: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        先同步（必要時）再讀取，process_df 走快取時呼叫此函式。
+        """
+        if not self.covers(table, start_date, end_date):
+            self.sync(table, start_date, max(end_date, date.today().isoformat()))
+        return self.read(table, start_date, end_date, columns)
+
+    def clear(self, table: Optional[str] = None) -> None:
+        """
+        刪除快取檔；未指定 table 時清除所有資料表。
+        """
+        tables = [table] if table is not None else (os.listdir(self.cache_dir) if os.path.exists(self.cache_dir) else [])
+        for t in tables:
+            table_dir = self.table_dir(t)
+            if not os.path.isdir(table_dir):
+                continue
+            with self._lock(t):
+                for f in os.listdir(table_dir):
+                    os.remove(os.path.join(table_dir, f))
+                os.rmdir(table_dir)
@@ -1,7 +1,19 @@
+import os
+import re
+import threading
+import pymysql
 import pandas as pd
-from api.db_lib import get_connection, rename_df_columns, reverse_column_mapping
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from api.db_lib import get_connection, get_pool, rename_df_columns, reverse_column_mapping
 from datetime import datetime, timedelta
-from api.utility import get_info_str, get_warn_str, to_roc, to_ad, check_date_format
+from api.utility import get_info_str, get_warn_str, to_roc, to_ad_index, check_date_format
+from api.query_builder import AggregateQuery, SelectQuery
+from api.alignment import asof_align
+from api import profiling
+
+DEBUG_MODE = 0
 
 
 def parse_date_range(date_str: str):
@@ -34,11 +46,306 @@ def parse_date_range(date_str: str):
         return start, end
 
 
-def get_db_df(table_name: str = 'price', date_range_str: str = '-100:-0', index_name: str = 'date', column_str: str = 'stock_id, 收盤價', constraint_str: str = '') -> pd.DataFrame:
+_local_cache = None
+_local_cache_tables = set()
+
+
+def enable_local_cache(cache_dir: str = None, tables: List[str] = ('price', 'dealer', 'monthly_revenue')):
+    """
+    啟用本地 Parquet 快取（需安裝 pyarrow），之後 get_db_df / get_db_pivot_df 查詢這些資料表時，
+    只向資料庫補抓快取沒有的日期，其餘直接讀本地檔。
+
+    參數：
+        cache_dir (str): 快取目錄，預設為環境變數 LOCAL_CACHE_DIR 或 'cache'
+        tables (List[str]): 要走快取的資料表
+    回傳：
+        LocalTableCache: 快取物件，可呼叫 sync / clear 等
+    範例：
+        process_df.enable_local_cache(tables=['price'])
+    """
+    global _local_cache, _local_cache_tables
+    from api.local_cache import LocalTableCache, CACHE_DIR
+    _local_cache = LocalTableCache(cache_dir or CACHE_DIR)
+    _local_cache_tables = set(tables)
+    return _local_cache
+
+
+def disable_local_cache() -> None:
+    """
+    停用本地快取，之後所有查詢直接走資料庫（快取檔案保留）。
+    """
+    global _local_cache, _local_cache_tables
+    _local_cache = None
+    _local_cache_tables = set()
+
+
+def _use_local_cache(table_name: str) -> bool:
+    return _local_cache is not None and table_name in _local_cache_tables
+
+
+# 數值欄位的浮點精度；設為 float32 可讓 pivot 記憶體減半（約 7 位有效數字，足夠價格與指標運算）
+FLOAT_DTYPE = os.getenv('PIVOT_FLOAT_DTYPE', 'float64')
+
+
+@profiling.instrument()
+def decimal_to_float(df: pd.DataFrame, float_dtype: str = 'float64') -> pd.DataFrame:
+    """
+    將 pymysql 回傳的 Decimal（object 欄位）轉為浮點數，並把既有浮點欄位轉為 float_dtype。
+    整數欄位（如成交股數）維持原型別，字串欄位不變。
+
+    參數：
+        df (pd.DataFrame): 剛查詢回來的長格式資料
+        float_dtype (str): 'float64' 或 'float32'
+    回傳：
+        pd.DataFrame: 轉換後的 df（原地修改並回傳）
+    """
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object:
+            not_null = series.notna().to_numpy()
+            if not_null.any() and isinstance(series.iloc[not_null.argmax()], Decimal):
+                df[col] = series.astype(float_dtype)
+        elif pd.api.types.is_float_dtype(series.dtype) and series.dtype != float_dtype:
+            df[col] = series.astype(float_dtype)
+    return df
+
+
+def to_categorical(df: pd.DataFrame, exclude: List[str] = ()) -> pd.DataFrame:
+    """
+    將字串欄位（如 stock_id、分點名稱）轉為 category，重複值只存一份。
+    """
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col not in exclude and (dtype == object or pd.api.types.is_string_dtype(dtype)) and not isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def memory_footprint(obj) -> pd.Series:
+    """
+    回傳 DataFrame 或 {name: DataFrame} 的記憶體用量（MB，含 index）。
+
+    範例：
+        print(process_df.memory_footprint(panel))
+    """
+    frames = obj if isinstance(obj, dict) else {'df': obj}
+    return pd.Series({name: df.memory_usage(index=True, deep=True).sum() / 2**20 for name, df in frames.items()}, name='MB')
+
+
+_WORD_OP_PATTERN = re.compile(r'^(?P<col>\S+)\s+(?P<op>not\s+in|in|between|not\s+like|like)\s+(?P<val>.+)$', re.IGNORECASE)
+_SYMBOL_OP_PATTERN = re.compile(r'^(?P<col>[^<>=!]+?)\s*(?P<op>>=|<=|!=|<>|=|<|>)\s*(?P<val>.*)$')
+
+
+def _strip_quotes(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+        return value[1:-1]
+    return value
+
+
+def _parse_one_constraint(constraint: str) -> tuple:
+    """
+    解析單一條件字串，回傳 (欄位熟悉名, 運算子, 值)；IN 的值為列表，BETWEEN 的值為 (下界, 上界)。
+    """
+    match = _WORD_OP_PATTERN.match(constraint.strip())
+    if match:
+        op = ' '.join(match.group('op').upper().split())
+        val = match.group('val').strip()
+        if op in ('IN', 'NOT IN'):
+            val = [_strip_quotes(v) for v in val.strip('()').split(',') if v.strip()]
+        elif op == 'BETWEEN':
+            bounds = re.split(r'\s+and\s+|~', val, flags=re.IGNORECASE)
+            if len(bounds) != 2:
+                raise ValueError(f"constraint : {constraint} 格式錯誤，BETWEEN 需為 'a AND b' 或 'a~b'")
+            val = (_strip_quotes(bounds[0]), _strip_quotes(bounds[1]))
+        else:
+            val = _strip_quotes(val)
+        return match.group('col').strip(), op, val
+    match = _SYMBOL_OP_PATTERN.match(constraint.strip())
+    if match:
+        op = '!=' if match.group('op') == '<>' else match.group('op')
+        return match.group('col').strip(), op, _strip_quotes(match.group('val'))
+    raise ValueError(f"constraint : {constraint} 格式錯誤，需包含運算子（=, !=, <, <=, >, >=, in, between, like）")
+
+
+def _parse_constraint_str(table_name: str, constraint_str: str, filters: List[tuple] = None) -> List[tuple]:
+    """
+    解析 constraint_str（以冒號串接多個條件）與結構化 filters，回傳 [(原始欄位, 運算子, 值), ...]。
+
+    constraint_str 支援：
+        'stock_id = 2330'、'收盤價 >= 100'、'stock_id != 2330'
+        'stock_id in 2330,2317,2454'（或 'stock_id in (2330, 2317)'）
+        '收盤價 between 100 and 200'（或 '收盤價 between 100~200'）
+        '股票名稱 like 台%'
+    filters 為 [(欄位, 運算子, 值), ...]，如 [('stock_id', 'in', watchlist), ('買進金額', '>', 0)]。
+    """
+    constraint_list = []
+    if constraint_str != "":
+        print (get_info_str(__name__), f"分析 constraint_str: {constraint_str}")
+        constraint_list = [_parse_one_constraint(constraint) for constraint in constraint_str.split(":")]
+    for familiar_col, op, val in (filters or []):
+        op = ' '.join(op.upper().split())
+        if op in ('IN', 'NOT IN'):
+            val = [str(v) for v in val]
+        elif op == 'BETWEEN':
+            val = tuple(val)
+        constraint_list.append((familiar_col, '!=' if op == '<>' else op, val))
+    return [(reverse_column_mapping(table_name, familiar_col), op, val) for familiar_col, op, val in constraint_list]
+
+
+def _constraint_mask(series: pd.Series, op: str, val) -> pd.Series:
+    """
+    在本地資料上計算單一條件的布林遮罩；數值欄位以數值比較，其餘以字串比較（與 SQL 結果一致）。
+    """
+    numeric = pd.api.types.is_numeric_dtype(series.dtype)
+
+    def cast(v):
+        if numeric:
+            try:
+                return float(v)
+            except (TypeError, ValueError):
+                pass
+        return str(v)
+
+    values = series if numeric else series.astype(str)
+    if op == 'IN':
+        return values.isin([cast(v) for v in val])
+    if op == 'NOT IN':
+        return ~values.isin([cast(v) for v in val])
+    if op == 'BETWEEN':
+        return (values >= cast(val[0])) & (values <= cast(val[1]))
+    if op in ('LIKE', 'NOT LIKE'):
+        pattern = '^' + re.escape(str(val)).replace('%', '.*').replace('_', '.') + '$'
+        mask = series.astype(str).str.match(pattern)
+        return ~mask if op == 'NOT LIKE' else mask
+    compare = {'=': '__eq__', '!=': '__ne__', '<': '__lt__', '<=': '__le__', '>': '__gt__', '>=': '__ge__'}[op]
+    return getattr(values, compare)(cast(val))
+
+
+def _filter_constraints(df: pd.DataFrame, constraints: List[tuple]) -> pd.DataFrame:
+    """
+    在本地資料上套用 _parse_constraint_str 的條件（與 SQL 語意相同）。
+    """
+    for constraint_col, op, constraint_val in constraints:
+        df = df[_constraint_mask(df[constraint_col], op, constraint_val).to_numpy()]
+    return df
+
+
+_roc_table_cache = {}
+_roc_table_lock = threading.Lock()
+
+
+def _is_roc_table(conn, table_name: str) -> bool:
+    """
+    以資料表最新一筆日期判斷是否為民國年格式（YYY-MM-DD）。
+    結果依資料表快取，之後的查詢不再重複偵測；資料表格式變更時呼叫 invalidate_date_format_cache。
+    """
+    cached = _cached_roc_flag(table_name)
+    if cached is not None:
+        return cached
+    sql, params = _latest_date_query(table_name)
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return _store_roc_flag(table_name, rows[0][0])
+
+
+def _latest_date_query(table_name: str) -> Tuple[str, tuple]:
+    return SelectQuery(table_name, ['date']).order_by('date', desc=True).limit(1).build()
+
+
+def _cached_roc_flag(table_name: str):
+    with _roc_table_lock:
+        return _roc_table_cache.get(table_name)
+
+
+def _store_roc_flag(table_name: str, latest_date) -> bool:
+    use_roc = check_date_format(latest_date) == 'YYY-MM-DD'
+    with _roc_table_lock:
+        _roc_table_cache[table_name] = use_roc
+    return use_roc
+
+
+def invalidate_date_format_cache(table_name: str = None) -> None:
+    """
+    清除資料表日期格式（民國/西元）的偵測快取；未指定 table_name 時清除全部。
+    """
+    with _roc_table_lock:
+        if table_name is None:
+            _roc_table_cache.clear()
+        else:
+            _roc_table_cache.pop(table_name, None)
+
+
+# 串流查詢每批筆數預設值
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 100_000))
+
+
+def _stream_query(conn, query: str, params: tuple, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    以 SSCursor（伺服器端游標）執行查詢，每次 fetchmany(chunk_size) 組成一個 DataFrame 交出，
+    不會把整個結果集先載入成 tuple 列表。
+    中途停止迭代時不讀完剩餘資料，連線歸還時由連線池丟棄。
+    """
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    cursor.execute(query, params)
+    columns = [desc[0] for desc in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = pd.DataFrame(rows, columns=columns)
+        profiling.record_fetch(chunk)
+        yield chunk
+    cursor.close()
+
+
+def _db_df_query(table_name: str, index_name: str, select_cols: List[str], constraints: List[tuple], start_date: str, end_date: str) -> Tuple[str, tuple]:
+    query = SelectQuery(table_name, list(dict.fromkeys(select_cols + [index_name])))
+    query.where(index_name, 'BETWEEN', (start_date, end_date))
+    for constraint_col, op, constraint_val in constraints:
+        query.where(constraint_col, op, constraint_val)
+    return query.order_by(index_name).build()
+
+
+def _load_cached_df(table_name: str, index_name: str, select_cols: List[str], constraints: List[tuple], start_date: str, end_date: str) -> pd.DataFrame:
+    # 本地快取的日期已是西元格式
+    df = _local_cache.load(table_name, start_date, end_date, columns=list(dict.fromkeys(select_cols + [index_name] + [col for col, _, _ in constraints])))
+    df = _filter_constraints(df, constraints)
+    df = df[list(dict.fromkeys(select_cols + [index_name]))]
+    return df.sort_values(index_name, kind='mergesort').set_index(index_name)
+
+
+def _warn_nan(df: pd.DataFrame, label: str = 'pivot_df') -> None:
+    # 檢查資料完整性
+    if df.isnull().values.any():
+        nan_info = df.isnull()
+        nan_dates = df.index[nan_info.any(axis=1)].tolist()
+        nan_stocks = df.columns[nan_info.any(axis=0)].tolist()
+        print(get_warn_str(__name__), f"{label} 含有 NaN 值！\n缺漏日期: {nan_dates}\n缺漏股票: {nan_stocks}")
+
+
+def _finish_db_df(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    # 統一欄位名稱
+    df = rename_df_columns(df, table_name)
+    # 民國/西元日期一律向量化轉為 DatetimeIndex（民國 99 -> 100 年字串排序會錯，轉換後重新排序）
+    df.index = to_ad_index(df.index)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='mergesort')
+    return df
+
+
+@profiling.instrument()
+def get_db_df(table_name: str = 'price', date_range_str: str = '-100:-0', index_name: str = 'date', column_str: str = 'stock_id, 收盤價', constraint_str: str = '', float_dtype: str = None, categorical: bool = False, chunk_size: int = None, filters: List[tuple] = None) -> pd.DataFrame:
     """
     - date_range_str: date_str 格式，預設 '-100:-0' (end_date: today, start_date: today-100)
     - index_name: 欄位名稱，預設 'date'
     - column_str: 欄位名稱，預設 'stock_id, 收盤價'
+    - float_dtype: 數值欄位精度，預設 FLOAT_DTYPE（Decimal 一律在查詢後轉為浮點數）
+    - categorical: True 時字串欄位（stock_id、分點名稱等）轉為 category 以節省記憶體
+    - chunk_size: 指定時改用伺服器端游標分批讀取再合併（見 iter_db_df），大量資料不會同時持有 tuple 列表與 DataFrame
+    - constraint_str: 條件字串，以冒號串接多個條件，支援 =, !=, <, <=, >, >=, in, between, like（見 _parse_constraint_str）
+    - filters: 結構化條件 [(欄位, 運算子, 值), ...]，如 [('stock_id', 'in', ['2330', '2317'])]，與 constraint_str 一併下推到 SQL
 
     取得 table_name 資料表資料，並回傳 pivot_df。
     - table_name: 資料表名稱，預設 'price'
@@ -47,86 +354,101 @@ def get_db_df(table_name: str = 'price', date_range_str: str = '-100:-0', index_
     
     * example: df = process_df.get_db_df(table_name='price', days_before=100, end_date='2025-05-01', index_name='date', column_str='stock_id, 收盤價')
     """
+    if chunk_size is not None:
+        chunks = list(iter_db_df(table_name=table_name, date_range_str=date_range_str, index_name=index_name, column_str=column_str,
+                                 constraint_str=constraint_str, chunk_size=chunk_size, float_dtype=float_dtype, filters=filters))
+        if chunks:
+            df = pd.concat(chunks)
+            # 每批各自排序；民國年資料表的 SQL 排序為字串比較（'100-01-04' 在 '99-12-31' 之前），合併後需重新排序
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index(kind='mergesort')
+        else:
+            select_cols = [reverse_column_mapping(table_name, column_name.strip()) for column_name in column_str.split(",")]
+            df = _finish_db_df(pd.DataFrame(columns=list(dict.fromkeys(select_cols + [index_name]))).set_index(index_name), table_name)
+        if categorical:
+            df = to_categorical(df)
+        _warn_nan(df)
+        return df
 
     (start_date, end_date) = parse_date_range(date_range_str)
-    conn = get_connection()
-    cursor = conn.cursor()
+    constraints = _parse_constraint_str(table_name, constraint_str, filters)
+    select_cols = [reverse_column_mapping(table_name, column_name.strip()) for column_name in column_str.split(",")]
 
-    # 判斷是否需要民國年格式
-    cursor.execute(f'SELECT DISTINCT date FROM {table_name} ORDER BY date DESC LIMIT 1')
-    rows = cursor.fetchall()
-    columns = [desc[0] for desc in cursor.description]
-    latest_date = pd.DataFrame(rows, columns=columns).iloc[0, 0]
-    date_fmt = check_date_format(latest_date)
+    if _use_local_cache(table_name):
+        df = _load_cached_df(table_name, index_name, select_cols, constraints, start_date, end_date)
+    else:
+        conn = get_connection()
+        try:
+            use_roc = _is_roc_table(conn, table_name)
+            if use_roc:
+                start_date = to_roc(start_date)
+                end_date = to_roc(end_date)
+            query, params = _db_df_query(table_name, index_name, select_cols, constraints, start_date, end_date)
+            print (get_info_str(__name__), f"SQL: {query} params: {params}")
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+            df = pd.DataFrame(rows, columns=columns).set_index(index_name)
+            profiling.record_fetch(df)
+        finally:
+            conn.close()
 
-    use_roc = date_fmt == 'YYY-MM-DD'
+    df = decimal_to_float(df, float_dtype or FLOAT_DTYPE)
+    if categorical:
+        df = to_categorical(df)
 
-    if use_roc:
-        start_date = to_roc(start_date)
-        end_date = to_roc(end_date)
+    _warn_nan(df)
+    return _finish_db_df(df, table_name)
 
-    constraint_query = ""
-    if constraint_str != "":
-        print (get_info_str(__name__), f"分析 constraint_str: {constraint_str}")
-        if ':' in constraint_str :
-            constraint_list = constraint_str.split(":")
-            for constraint in constraint_list:
-                if '=' not in constraint:
-                    raise ValueError(f"constraint_str : {constraint_str} 格式錯誤，需包含等號")
-                constraint_col = reverse_column_mapping(table_name, constraint.split("=")[0].strip())
-                constraint_val = constraint.split("=")[1].strip()
-                constraint_query += f" AND {constraint_col} = '{constraint_val}'"
-        elif '=' in constraint_str:
-            constraint_col = reverse_column_mapping(table_name, constraint_str.split("=")[0].strip())
-            constraint_val = constraint_str.split("=")[1].strip()
-            constraint_query += f" AND {constraint_col} = '{constraint_val}'"
-        else:
-            raise ValueError(f"constraint_str : {constraint_str} 格式錯誤，請包含等號或 冒號加等號")
+
+@profiling.instrument()
+def iter_db_df(table_name: str = 'price', date_range_str: str = '-100:-0', index_name: str = 'date', column_str: str = 'stock_id, 收盤價', constraint_str: str = '', chunk_size: int = None, float_dtype: str = None, categorical: bool = False, filters: List[tuple] = None) -> Iterator[pd.DataFrame]:
+    """
+    get_db_df 的串流版本：以 pymysql SSCursor 逐批讀取，每批 chunk_size 筆組成 DataFrame 後立即交出，
+    可處理大於記憶體的資料（如多年份分點資料），並在查詢尚未讀完前就開始計算。
+
+    參數：
+        table_name, date_range_str, index_name, column_str, constraint_str, filters: 同 get_db_df
+        chunk_size (int): 每批筆數，預設 STREAM_CHUNK_SIZE
+        float_dtype (str): 數值欄位精度，預設 FLOAT_DTYPE
+        categorical (bool): True 時每批的字串欄位轉為 category
+    回傳：
+        Iterator[pd.DataFrame]: 分批 df，欄位與 get_db_df 相同；每批內依日期排序，
+                                但民國年資料表跨批次依 SQL 字串排序（跨世紀時 100 年在 99 年之前），需要整體排序時請用 get_db_df(chunk_size=...)
+    範例：
+        for chunk in process_df.iter_db_df('dealer', '-365:-0', column_str='stock_id, 分點名稱, 買進金額, 賣出金額'):
+            net = chunk['買進金額'] - chunk['賣出金額']
+    注意：
+        迭代期間會佔用一條連線；中途 break 時該連線會被關閉而非歸還連線池。
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    float_dtype = float_dtype or FLOAT_DTYPE
+    (start_date, end_date) = parse_date_range(date_range_str)
+    constraints = _parse_constraint_str(table_name, constraint_str, filters)
+    select_cols = [reverse_column_mapping(table_name, column_name.strip()) for column_name in column_str.split(",")]
+
+    if _use_local_cache(table_name):
+        df = _load_cached_df(table_name, index_name, select_cols, constraints, start_date, end_date)
+        for offset in range(0, len(df), chunk_size):
+            chunk = decimal_to_float(df.iloc[offset:offset + chunk_size].copy(), float_dtype)
+            yield _finish_db_df(to_categorical(chunk) if categorical else chunk, table_name)
+        return
+
+    conn = get_connection()
     try:
-        
-        
-        col_query = ""
-        if ',' in column_str :
-            column_list = column_str.split(",")
-            for column_name in column_list:
-                if col_query != "":
-                    col_query += ", "
-                column_name = column_name.strip()
-                origin_col = reverse_column_mapping(table_name, column_name.strip())
-                col_query += f" {origin_col} "
-        else:
-            col_query = reverse_column_mapping(table_name, column_str.strip())
-        query = f'''
-            SELECT {col_query}, {index_name}
-            FROM {table_name}
-            WHERE {index_name} BETWEEN '{start_date}' AND '{end_date}'
-            {constraint_query}
-            ORDER BY {index_name}
-        '''
-        print (get_info_str(__name__), f"SQL: {query}")
-        with conn.cursor() as cursor:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns).set_index(index_name)
-        
+        use_roc = _is_roc_table(conn, table_name)
+        if use_roc:
+            start_date = to_roc(start_date)
+            end_date = to_roc(end_date)
+        query, params = _db_df_query(table_name, index_name, select_cols, constraints, start_date, end_date)
+        print (get_info_str(__name__), f"SQL (stream, chunk_size={chunk_size}): {query} params: {params}")
+        for chunk in _stream_query(conn, query, params, chunk_size):
+            chunk = decimal_to_float(chunk.set_index(index_name), float_dtype)
+            yield _finish_db_df(to_categorical(chunk) if categorical else chunk, table_name)
     finally:
         conn.close()
 
-    # 檢查資料完整性
-    if df.isnull().values.any():
-        nan_info = df.isnull()
-        nan_dates = df.index[nan_info.any(axis=1)].tolist()
-        nan_stocks = df.columns[nan_info.any(axis=0)].tolist()
-        print(get_warn_str(__name__), f"pivot_df 含有 NaN 值！\n缺漏日期: {nan_dates}\n缺漏股票: {nan_stocks}")
-    
-    # 統一欄位名稱
-    df = rename_df_columns(df, table_name)
-    # 依格式轉換查詢完的 index
-    if use_roc:
-        df.index = [to_ad(idx) for idx in df.index]
-    return df
-
 
 def get_feature_df(df: pd.DataFrame, feature_name: str, key_value: str):
     """
@@ -138,11 +460,13 @@ def get_feature_df(df: pd.DataFrame, feature_name: str, key_value: str):
     return feature_df
 
 
-def get_db_pivot_df(table_name: str = 'price', date_range_str: str = '-100:-0', column_name: str = 'stock_id', value_name: str = '收盤價') -> pd.DataFrame:
+@profiling.instrument()
+def get_db_pivot_df(table_name: str = 'price', date_range_str: str = '-100:-0', column_name: str = 'stock_id', value_name: str = '收盤價', float_dtype: str = None) -> pd.DataFrame:
     """
     - date_range_str: date_str 格式，預設 '-100:-0' (end_date: today, start_date: today-100)
     - column_name: 欄位名稱，預設 'stock_id'
     - value_name: 欄位名稱，預設 '收盤價'
+    - float_dtype: 數值精度，預設 FLOAT_DTYPE，'float32' 可讓記憶體減半
 
     api 會自動處理 table_name 資料表資料，並回傳 pivot_df。
     - table_name: 資料表名稱，預設 'price'
@@ -152,66 +476,267 @@ def get_db_pivot_df(table_name: str = 'price', date_range_str: str = '-100:-0',
     
     * example: close_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str='-100:-0', column_name='stock_id', value_name='收盤價')
     """ 
+    return get_db_pivot_panel(table_name=table_name, date_range_str=date_range_str, value_names=[value_name], column_name=column_name, float_dtype=float_dtype)[value_name]
+
+
+@profiling.instrument()
+def get_db_pivot_panel(table_name: str = 'price', date_range_str: str = '-100:-0', value_names: List[str] = None, column_name: str = 'stock_id', as_frame: bool = False, float_dtype: str = None, chunk_size: int = None, filters: List[tuple] = None):
+    """
+    一次 SELECT 取回多個欄位，回傳共用同一組 date/stock_id 軸的多個 pivot_df。
+    同一張表要取多個欄位（如開高低收量）時，請用本函式取代多次 get_db_pivot_df。
+
+    參數：
+        table_name (str): 資料表名稱，預設 'price'
+        date_range_str (str): date_str 格式，預設 '-100:-0'
+        value_names (List[str]): 欄位名稱列表（可用熟悉名，如 'close', '成交股數'），預設 ['收盤價']
+        column_name (str): pivot 的 columns 欄位，預設 'stock_id'
+        as_frame (bool): True 時回傳 MultiIndex columns（value_name, stock_id）的單一 DataFrame
+        float_dtype (str): 數值精度，預設 FLOAT_DTYPE；Decimal 在查詢後即轉為浮點數，'float32' 可讓記憶體減半
+        chunk_size (int): 指定時以伺服器端游標分批讀取，每批先轉型再合併 pivot，降低查詢時的記憶體峰值
+        filters (List[tuple]): 結構化條件（同 get_db_df），如 [('stock_id', 'in', watchlist)] 只取觀察清單
+    回傳：
+        Dict[str, pd.DataFrame]: {value_name: pivot_df}，key 與傳入的 value_names 相同
+    範例：
+        panel = process_df.get_db_pivot_panel('price', '-100:-0', ['close', 'open', 'high', 'low', '成交股數'])
+        close_pivot = panel['close']
+    """
+    if value_names is None:
+        value_names = ['收盤價']
+    float_dtype = float_dtype or FLOAT_DTYPE
     (start_date, end_date) = parse_date_range(date_range_str)
-    conn = get_connection()
-    cursor = conn.cursor()
+    origin_col = reverse_column_mapping(table_name, column_name.strip())
+    origin_vals = {value_name: reverse_column_mapping(table_name, value_name.strip()) for value_name in value_names}
+    select_vals = list(dict.fromkeys(origin_vals.values()))
+    constraints = _parse_constraint_str(table_name, '', filters)
 
-    # 判斷是否需要民國年格式
-    cursor.execute(f'SELECT DISTINCT date FROM {table_name} ORDER BY date DESC LIMIT 1')
-    rows = cursor.fetchall()
-    columns = [desc[0] for desc in cursor.description]
-    latest_date = pd.DataFrame(rows, columns=columns).iloc[0, 0]
-    date_fmt = check_date_format(latest_date)
+    if _use_local_cache(table_name):
+        # 本地快取的日期已是西元格式
+        df = _local_cache.load(table_name, start_date, end_date, columns=list(dict.fromkeys([origin_col, 'date', 'stock_id'] + select_vals + [col for col, _, _ in constraints])))
+        df = _filter_constraints(df[df['stock_id'].astype(str).str.len() == 4], constraints)[[origin_col, 'date'] + select_vals]
+    else:
+        conn = get_connection()
+        try:
+            if _is_roc_table(conn, table_name):
+                start_date = to_roc(start_date)
+                end_date = to_roc(end_date)
+            query, params = _pivot_panel_query(table_name, origin_col, select_vals, constraints, start_date, end_date)
+            print (get_info_str(__name__), f"SQL: {query} params: {params}")
+            if chunk_size is not None:
+                chunks = [decimal_to_float(chunk, float_dtype) for chunk in _stream_query(conn, query, params, chunk_size)]
+                df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=[origin_col, 'date'] + select_vals)
+            else:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                df = pd.DataFrame(rows, columns=columns)
+                profiling.record_fetch(df)
+        finally:
+            conn.close()
 
-    use_roc = date_fmt == 'YYY-MM-DD'
+    return _build_panel(df, table_name, origin_col, origin_vals, float_dtype, as_frame)
 
-    if use_roc:
-        start_date = to_roc(start_date)
-        end_date = to_roc(end_date)
-    
 
-    origin_col = reverse_column_mapping(table_name, column_name.strip())
-    origin_val = reverse_column_mapping(table_name, value_name.strip())
+def _pivot_panel_query(table_name: str, origin_col: str, select_vals: List[str], constraints: List[tuple], start_date: str, end_date: str) -> Tuple[str, tuple]:
     #[TODO] stock_id like '____' 
-    try:
-        query = f'''
-            SELECT stock_id, date, {origin_val}
-            FROM {table_name}
-            WHERE date BETWEEN '{start_date}' AND '{end_date}'
-            AND stock_id like '____'
-            ORDER BY {origin_col}, date
-        '''
-        print (get_info_str(__name__), f"SQL: {query}")
-        with conn.cursor() as cursor:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
-        pivot_df = df.pivot(index='date', columns=origin_col, values=origin_val)
-        # 查詢完將民國年轉回西元年
-        if use_roc:
-            pivot_df.index = [to_ad(idx) for idx in pivot_df.index]
-    finally:
-        conn.close()
-    # 檢查資料完整性
-    if pivot_df.isnull().values.any():
-        nan_info = pivot_df.isnull()
-        nan_dates = pivot_df.index[nan_info.any(axis=1)].tolist()
-        nan_stocks = pivot_df.columns[nan_info.any(axis=0)].tolist()
-        print(get_warn_str(__name__), f"pivot_df 含有 NaN 值！\n缺漏日期: {nan_dates}\n缺漏股票: {nan_stocks}")
-    
-    # 統一欄位名稱
-    pivot_df = rename_df_columns(pivot_df, table_name)
-    return pivot_df
+    query = (SelectQuery(table_name, list(dict.fromkeys([origin_col, 'date'] + select_vals)))
+             .where('date', 'BETWEEN', (start_date, end_date))
+             .where('stock_id', 'LIKE', '____'))
+    for constraint_col, op, constraint_val in constraints:
+        query.where(constraint_col, op, constraint_val)
+    return query.order_by(origin_col, 'date').build()
+
+
+@profiling.instrument()
+def _build_panel(df: pd.DataFrame, table_name: str, origin_col: str, origin_vals: dict, float_dtype: str, as_frame: bool):
+    """
+    將長格式查詢結果 pivot 成 {value_name: pivot_df}（get_db_pivot_panel 與 async 版本共用）。
+    """
+    df = decimal_to_float(df, float_dtype)
+    select_vals = list(dict.fromkeys(origin_vals.values()))
+    wide_df = df.pivot(index='date', columns=origin_col, values=select_vals)
+    # 查詢完將民國/西元日期向量化轉為 DatetimeIndex
+    wide_df.index = to_ad_index(wide_df.index)
+    if not wide_df.index.is_monotonic_increasing:
+        wide_df = wide_df.sort_index()
+
+    panel = {}
+    for value_name, origin_val in origin_vals.items():
+        pivot_df = wide_df[origin_val]
+        pivot_df.columns.name = origin_col
+        # 整數欄位 pivot 後補 NaN 會變成 float64，統一轉為指定精度
+        if all(pd.api.types.is_numeric_dtype(dtype) for dtype in pivot_df.dtypes):
+            pivot_df = pivot_df.astype(float_dtype)
+        # 檢查資料完整性
+        _warn_nan(pivot_df, f"{value_name} pivot_df")
+        # 統一欄位名稱
+        panel[value_name] = rename_df_columns(pivot_df, table_name)
+    print(get_info_str(__name__), f"pivot 記憶體用量（MB, {float_dtype}）: {memory_footprint(panel).round(2).to_dict()}") if DEBUG_MODE else None
+    if as_frame:
+        return pd.concat(panel, axis=1, names=['value_name', origin_col])
+    return panel
+
+
+### 彙總查詢（GROUP BY 下推到資料庫）
+# 彙總函式名稱 -> SQL 函式
+AGG_FUNC_NAMES = {'sum': 'SUM', 'count': 'COUNT', 'avg': 'AVG', 'min': 'MIN', 'max': 'MAX', 'count_distinct': 'COUNT DISTINCT'}
+_LOCAL_AGG = {'SUM': 'sum', 'COUNT': 'count', 'AVG': 'mean', 'MIN': 'min', 'MAX': 'max', 'COUNT DISTINCT': 'nunique'}
+_BUCKET_COL = '_bucket'
+
+
+def _resolve_aggregates(table_name: str, aggregates: Dict[str, tuple]) -> Dict[str, tuple]:
+    # {輸出欄位: (函式, 熟悉欄位)} -> {輸出欄位: (SQL 函式, 原始欄位)}
+    resolved = {}
+    for alias, (func, column) in aggregates.items():
+        if func.lower() not in AGG_FUNC_NAMES:
+            raise ValueError(f"不支援的彙總函式：{func}，可用 {list(AGG_FUNC_NAMES)}")
+        if isinstance(column, (tuple, list)):
+            op, left, right = column
+            column = (op, reverse_column_mapping(table_name, left), reverse_column_mapping(table_name, right))
+        elif column != '*':
+            column = reverse_column_mapping(table_name, column)
+        resolved[alias] = (AGG_FUNC_NAMES[func.lower()], column)
+    return resolved
+
+
+def _agg_query(table_name: str, index_name: str, group_cols: List[str], date_bucket: str, aggregates: Dict[str, tuple], constraints: List[tuple],
+               start_date: str, end_date: str, having: List[tuple], order_by: str, ascending: bool, top_k: int, top_per: List[str]) -> Tuple[str, tuple]:
+    group_by = list(group_cols) + ([(index_name, date_bucket)] if date_bucket else [])
+    group_aliases = list(group_cols) + ([index_name] if date_bucket else [])
+    query = AggregateQuery(table_name, group_by, aggregates)
+    query.where(index_name, 'BETWEEN', (start_date, end_date))
+    for constraint_col, op, constraint_val in constraints:
+        query.where(constraint_col, op, constraint_val)
+    for alias, op, value in having:
+        query.having(alias, op, value)
+    if top_per:
+        query.top_per(top_per, top_k, order_by, desc=not ascending).order_by(*top_per).order_by('_rank')
+    else:
+        # 同值時依分組欄位排序，結果順序固定
+        query.order_by(order_by, desc=not ascending).order_by(*group_aliases)
+        if top_k:
+            query.limit(top_k)
+    return query.build()
+
+
+def _aggregate_local(df: pd.DataFrame, index_name: str, group_cols: List[str], date_bucket: str, aggregates: Dict[str, tuple],
+                     having: List[tuple], order_by: str, ascending: bool, top_k: int, top_per: List[str]) -> pd.DataFrame:
+    """
+    在本地快取資料上以 pandas 執行與 AggregateQuery 相同語意的彙總。
+    """
+    df = df.reset_index()
+    keys = list(group_cols)
+    if date_bucket:
+        # 日期分組另放一欄，彙總（如 count_distinct 日期）仍使用原始日期，同 SQL 的 GROUP BY 運算式
+        dates = pd.to_datetime(df[index_name])
+        df[_BUCKET_COL] = dates.dt.to_period('M').dt.start_time if date_bucket == 'month' else dates
+        keys.append(_BUCKET_COL)
+    grouped = df.groupby(keys, sort=False, observed=True)
+    result = {}
+    for alias, (func, column) in aggregates.items():
+        if column == '*':
+            result[alias] = grouped.size()
+            continue
+        if isinstance(column, (tuple, list)):
+            op, left, right = column
+            values = df[left] - df[right] if op == '-' else df[left] + df[right]
+            series = values.groupby([df[key] for key in keys], sort=False, observed=True)
+        else:
+            series = grouped[column]
+        result[alias] = series.sum(min_count=1) if func == 'SUM' else series.agg(_LOCAL_AGG[func])
+    out = pd.DataFrame(result).reset_index().rename(columns={_BUCKET_COL: index_name})
+    keys = [index_name if key == _BUCKET_COL else key for key in keys]
+    out = _filter_constraints(out, having)
+    out = out.sort_values([order_by] + keys, ascending=[ascending] + [True] * len(keys), kind='mergesort')
+    if top_per:
+        out['_rank'] = out.groupby(top_per, sort=False, observed=True).cumcount() + 1
+        out = out[out['_rank'] <= top_k].sort_values(top_per + ['_rank'], kind='mergesort')
+    elif top_k:
+        out = out.head(top_k)
+    return out.reset_index(drop=True)
+
+
+@profiling.instrument()
+def get_db_agg_df(table_name: str = 'dealer', date_range_str: str = '-10:-0', group_by: List[str] = ('stock_id',), aggregates: Dict[str, tuple] = None,
+                  date_bucket: str = None, index_name: str = 'date', constraint_str: str = '', filters: List[tuple] = None, having: List[tuple] = None,
+                  order_by: str = None, ascending: bool = False, top_k: int = None, top_per: List[str] = None, float_dtype: str = None) -> pd.DataFrame:
+    """
+    以 GROUP BY 在資料庫端彙總，只傳回彙總後的列（不取回原始明細）。
+
+    參數：
+        table_name (str): 資料表名稱
+        date_range_str (str): 日期區間（同 parse_date_range）
+        group_by (List[str]): 分組欄位（熟悉名稱），如 ['stock_id', '分點名稱']
+        aggregates (Dict[str, tuple]): {輸出欄位: (函式, 欄位)}，函式為 sum / count / avg / min / max / count_distinct；
+                                       欄位為熟悉名稱、'*'（count）或 ('-', 欄位a, 欄位b)
+        date_bucket (str): None 不依日期分組；'day' 每日；'month' 每月（結果的日期為該月 1 日）
+        constraint_str / filters: 同 get_db_df，在彙總前篩選（WHERE）
+        having (List[tuple]): 彙總後篩選 [(輸出欄位, 運算子, 值)]，如 [('買賣超金額', '>', 1e8)]
+        order_by (str): 排序的輸出欄位，預設第一個彙總欄位；ascending 預設 False（由大到小）
+        top_k (int): 只取前 top_k 列；指定 top_per 時改為每個分組各取前 top_k 列，並多一欄「名次」
+        top_per (List[str]): 分組取前幾名的欄位（需在 group_by 中），如 ['stock_id']
+    回傳：
+        pd.DataFrame: 分組欄位 + 彙總欄位（依熟悉名稱），日期分組時日期欄為 datetime
+    範例：
+        df = process_df.get_db_agg_df('dealer', '-20:-0', group_by=['分點名稱'],
+                                      aggregates={'買賣超金額': ('sum', ('-', '買進金額', '賣出金額'))}, top_k=20)
+    """
+    if not aggregates:
+        raise ValueError("aggregates 不可為空")
+    if top_per and not top_k:
+        raise ValueError("指定 top_per 時需同時指定 top_k")
+    (start_date, end_date) = parse_date_range(date_range_str)
+    constraints = _parse_constraint_str(table_name, constraint_str, filters)
+    group_cols = [reverse_column_mapping(table_name, column.strip()) for column in group_by]
+    top_per = [reverse_column_mapping(table_name, column.strip()) for column in (top_per or [])]
+    resolved = _resolve_aggregates(table_name, aggregates)
+    having = [(alias, ' '.join(op.upper().split()), value) for alias, op, value in (having or [])]
+    order_by = order_by or next(iter(aggregates))
+
+    if _use_local_cache(table_name):
+        columns = set(group_cols) | {part for _, column in resolved.values() if column != '*'
+                                     for part in (column[1:] if isinstance(column, tuple) else (column,))}
+        raw = _load_cached_df(table_name, index_name, [column for column in columns if column != index_name], constraints, start_date, end_date)
+        df = _aggregate_local(raw, index_name, group_cols, date_bucket, resolved, having, order_by, ascending, top_k, top_per)
+    else:
+        conn = get_connection()
+        try:
+            use_roc = _is_roc_table(conn, table_name)
+            if use_roc:
+                start_date = to_roc(start_date)
+                end_date = to_roc(end_date)
+            query, params = _agg_query(table_name, index_name, group_cols, date_bucket, resolved, constraints,
+                                       start_date, end_date, having, order_by, ascending, top_k, top_per)
+            print(get_info_str(__name__), f"SQL: {query} params: {params}")
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+        finally:
+            conn.close()
+        df = pd.DataFrame(list(rows), columns=columns)
+        profiling.record_fetch(df)
+        if date_bucket:
+            # 月分組為 'YYYY-MM'（民國 'YYY-MM'），補上 1 日後與每日分組一樣轉為西元 datetime
+            dates = df[index_name].astype(str) + ('-01' if date_bucket == 'month' else '')
+            df[index_name] = to_ad_index(pd.Index(dates))
+
+    df = decimal_to_float(df, float_dtype or FLOAT_DTYPE)
+    df = df.rename(columns={'_rank': '名次'})
+    return rename_df_columns(df, table_name)
 
 
 ### dealer
-def get_branch_data(date_range_str: str = '-10:-0', stock_col: str = "股票名稱", view_dealer_col: str = "買進金額, 賣出金額", constraint_str: str = "") -> pd.DataFrame:
+@profiling.instrument()
+def get_branch_data(date_range_str: str = '-10:-0', stock_col: str = "股票名稱", view_dealer_col: str = "買進金額, 賣出金額", constraint_str: str = "", float_dtype: str = None, categorical: bool = False, chunk_size: int = None, filters: List[tuple] = None) -> pd.DataFrame:
     """ 讀取券商交易數據 
     
     - date_range_str: date_str 格式，預設 '-10:-0' (end_date: today, start_date: today-10)
     - stock_col: 欄位名稱，預設 '股票名稱'
     - view_dealer_col: 欄位名稱，預設 '買進金額, 賣出金額'
+    - float_dtype / categorical: 同 get_db_df；分點名稱重複度高，categorical=True 可大幅節省記憶體
+    - chunk_size: 同 get_db_df，多年份資料建議指定或改用 iter_branch_data
+    - constraint_str / filters: 同 get_db_df，可一次取回整個觀察清單，如 constraint_str="stock_id in 2330,2317,2454"
 
     欄位可參考 : print('dealer 資料表欄位：', db_lib.list_columns('dealer'))
     
@@ -223,15 +748,62 @@ def get_branch_data(date_range_str: str = '-10:-0', stock_col: str = "股票名
     * example: branch_df = process_df.get_branch_data(date_range_str='-10:-0', stock_col='股票代號', view_dealer_col='買進金額, 賣出金額', constraint_str="股票代號 = 2330")
     """
     
-    branch_df = get_db_df(table_name='dealer', date_range_str=date_range_str, column_str=f"{stock_col}, 分點名稱, {view_dealer_col}", constraint_str=constraint_str)
+    branch_df = get_db_df(table_name='dealer', date_range_str=date_range_str, column_str=f"{stock_col}, 分點名稱, {view_dealer_col}", constraint_str=constraint_str, float_dtype=float_dtype, categorical=categorical, chunk_size=chunk_size, filters=filters)
     
     return branch_df
 
+@profiling.instrument()
+def iter_branch_data(date_range_str: str = '-10:-0', stock_col: str = "股票名稱", view_dealer_col: str = "買進金額, 賣出金額", constraint_str: str = "", chunk_size: int = None, float_dtype: str = None, categorical: bool = False, filters: List[tuple] = None) -> Iterator[pd.DataFrame]:
+    """ 分批讀取券商交易數據（get_branch_data 的串流版本，見 iter_db_df）
+
+    * example:
+        for chunk in process_df.iter_branch_data(date_range_str='-365:-0', stock_col='stock_id', chunk_size=200_000):
+            ...
+    """
+    yield from iter_db_df(table_name='dealer', date_range_str=date_range_str, column_str=f"{stock_col}, 分點名稱, {view_dealer_col}",
+                          constraint_str=constraint_str, chunk_size=chunk_size, float_dtype=float_dtype, categorical=categorical, filters=filters)
+
+@profiling.instrument()
+def get_branch_agg_data(date_range_str: str = '-10:-0', group_by: List[str] = ('stock_id', '分點名稱'), aggs: List[str] = ('net',), value: str = '金額',
+                        date_bucket: str = None, constraint_str: str = '', filters: List[tuple] = None, having: List[tuple] = None,
+                        order_by: str = None, ascending: bool = False, top_k: int = None, top_per: List[str] = None, float_dtype: str = None) -> pd.DataFrame:
+    """ 券商分點彙總（GROUP BY 在資料庫端完成，見 get_db_agg_df）
+
+    - group_by: 分組欄位，如 ['stock_id', '分點名稱']（個股 x 分點）、['分點名稱']（全市場分點）、['stock_id']
+    - aggs: 'buy'（買進{value}合計）、'sell'（賣出{value}合計）、'net'（買賣超{value}）、'count'（筆數）、'days'（有交易的天數）
+    - value: '金額' 或 '張數'
+    - date_bucket: None / 'day' / 'month'，依日期分組
+    - having: [(輸出欄位, 運算子, 值)]，如 [('買賣超金額', '>', 1e8)]
+    - order_by / ascending / top_k / top_per: 排序與前幾名，如 top_per=['stock_id'], top_k=3 為每檔股票前 3 大分點
+
+    * example:
+        # 全市場近 20 日買超前 20 大分點
+        df = process_df.get_branch_agg_data('-20:-0', group_by=['分點名稱'], aggs=('net', 'days'), top_k=20)
+        # 每檔股票近 10 日買超前 3 大分點
+        df = process_df.get_branch_agg_data('-10:-0', top_per=['stock_id'], top_k=3)
+    """
+    columns = {
+        'buy': ('sum', f'買進{value}', f'買進{value}'),
+        'sell': ('sum', f'賣出{value}', f'賣出{value}'),
+        'net': ('sum', ('-', f'買進{value}', f'賣出{value}'), f'買賣超{value}'),
+        'count': ('count', '*', '筆數'),
+        'days': ('count_distinct', 'date', '天數'),
+    }
+    unknown = [name for name in aggs if name not in columns]
+    if unknown:
+        raise ValueError(f"不支援的 aggs：{unknown}，可用 {list(columns)}")
+    aggregates = {columns[name][2]: columns[name][:2] for name in aggs}
+    return get_db_agg_df(table_name='dealer', date_range_str=date_range_str, group_by=group_by, aggregates=aggregates, date_bucket=date_bucket,
+                         constraint_str=constraint_str, filters=filters, having=having, order_by=order_by, ascending=ascending,
+                         top_k=top_k, top_per=top_per, float_dtype=float_dtype)
+
 ### price
-def get_stock_data(date_range_str: str = '-10:-0', column_str: str = """stock_id, 開盤價, 收盤價, 最高價, 最低價, 成交股數""") -> pd.DataFrame:
+@profiling.instrument()
+def get_stock_data(date_range_str: str = '-10:-0', column_str: str = """stock_id, 開盤價, 收盤價, 最高價, 最低價, 成交股數""", float_dtype: str = None) -> pd.DataFrame:
     """ 讀取個股行情數據 
     - date_range_str: date_str 格式，預設 '-100:-0' (end_date: today, start_date: today-100)
     - column_str: 欄位名稱，預設 'stock_id, 開盤價, 收盤價, 最高價, 最低價, 成交股數'
+    - float_dtype: 數值精度，預設 FLOAT_DTYPE
     
 
     欄位可參考 : print('price 資料表欄位：', db_lib.list_columns('price'))
@@ -243,11 +815,12 @@ def get_stock_data(date_range_str: str = '-10:-0', column_str: str = """stock_id
     
     * example: stock_df = process_df.get_stock_data(date_range_str='-10:-0', column_str='stock_id, 開盤價, 收盤價, 最高價, 最低價, 成交股數')
     """
-    stock_df = get_db_df(table_name='price', date_range_str=date_range_str, index_name='date', column_str=column_str)
+    stock_df = get_db_df(table_name='price', date_range_str=date_range_str, index_name='date', column_str=column_str, float_dtype=float_dtype)
     return stock_df
 
 
 ### monthly_revenue
+@profiling.instrument()
 def get_monthly_revenue_data(date_range_str: str = '-10:-0', column_name: str = 'stock_id', value_name: str = '當月營收') -> pd.DataFrame:
     monthly_revenue_pivot_df = get_db_pivot_df(table_name='monthly_revenue', date_range_str=date_range_str, column_name=column_name, value_name=value_name)
 
@@ -257,7 +830,64 @@ def get_monthly_revenue_data(date_range_str: str = '-10:-0', column_name: str =
     all_10th = pd.date_range(start=monthly_revenue_pivot_df.index.min(), end=monthly_revenue_pivot_df.index.max(), freq='MS') + pd.Timedelta(days=9)
     # 只保留在 DataFrame index 範圍內的 10 號
     all_10th = all_10th[(all_10th >= monthly_revenue_pivot_df.index.min()) & (all_10th <= monthly_revenue_pivot_df.index.max())]
-    # 用 forward fill 方式將每個月的資料補到 10 號
-    monthly_revenue_pivot_df_ffill = monthly_revenue_pivot_df.reindex(monthly_revenue_pivot_df.index.union(all_10th)).sort_index().ffill()
-    monthly_revenue_pivot_df_10th = monthly_revenue_pivot_df_ffill.loc[all_10th]
-    return monthly_revenue_pivot_df_10th
\ No newline at end of file
+    # 每個 10 號取各股票當天以前最後一筆有值的資料（as-of 對齊，等同 forward fill 後取 10 號）
+    return asof_align(monthly_revenue_pivot_df, all_10th, inclusive=True)
+
+
+### 多資料表平行載入
+def _resolve_loader(loader: Union[str, Callable]) -> Callable:
+    if callable(loader):
+        return loader
+    func = globals().get(loader)
+    if not loader.startswith(('get_', 'fetch_')) or not callable(func):
+        raise ValueError(f"未知的 loader：{loader}")
+    return func
+
+
+@profiling.instrument()
+def fetch_many(specs: Union[List[dict], Dict[str, dict]], max_workers: int = None) -> Dict[str, object]:
+    """
+    以執行緒池同時執行多個 loader，每個執行緒各自向連線池借連線，總耗時接近最慢的單一查詢而非全部加總。
+
+    參數：
+        specs: 查詢規格列表，每個 dict 需有 'name'，'loader' 預設 'get_db_pivot_df'（可為函式名稱或函式），
+               其餘 key 作為 loader 參數；亦可傳 {name: {...}} 的 dict。
+        max_workers (int): 執行緒數，預設 min(查詢數, 目前連線池上限 get_pool().max_size)
+    回傳：
+        Dict[str, object]: {name: loader 回傳值}，順序同 specs
+    範例：
+        data = process_df.fetch_many([
+            {'name': 'price', 'loader': 'get_db_pivot_panel', 'date_range_str': '-100:-0', 'value_names': ['收盤價', '成交股數']},
+            {'name': 'revenue', 'table_name': 'monthly_revenue', 'date_range_str': '-400:-0', 'value_name': '當月營收'},
+            {'name': 'branch', 'loader': 'get_branch_data', 'date_range_str': '-10:-0', 'constraint_str': 'stock_id = 2330'},
+        ])
+        close_pivot = data['price']['收盤價']
+    注意：
+        任一查詢失敗時，等其餘查詢結束後拋出第一個錯誤（訊息含查詢名稱）。
+    """
+    if isinstance(specs, dict):
+        specs = [{'name': name, **spec} for name, spec in specs.items()]
+    jobs = []
+    for spec in specs:
+        spec = dict(spec)
+        name = spec.pop('name')
+        loader = _resolve_loader(spec.pop('loader', 'get_db_pivot_df'))
+        jobs.append((name, loader, spec))
+    if len({name for name, _, _ in jobs}) != len(jobs):
+        raise ValueError("fetch_many 的 name 不可重複")
+    if not jobs:
+        return {}
+
+    max_workers = max_workers or min(len(jobs), get_pool().max_size)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch_many') as executor:
+        futures = [(name, executor.submit(loader, **kwargs)) for name, loader, kwargs in jobs]
+        results, errors = {}, []
+        for name, future in futures:
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors.append((name, e))
+    if errors:
+        name, error = errors[0]
+        raise RuntimeError(f"fetch_many 查詢 {name} 失敗：{error}") from error
+    return results
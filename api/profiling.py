@@ -0,0 +1,378 @@
+"""
+profiling.py - api 函式的耗時、資料量、連線數與記憶體統計
+
+核心理念：
+- db_lib、process_df、indicator、backtest、screen 的入口函式以 @instrument 標記；停用時（預設）包裝函式只多一次旗標判斷，
+  開啟後每次呼叫記錄：耗時、扣除子呼叫後的自身耗時、取回列數、結果集大小（bytes）、借出/新建連線數、峰值記憶體（選用）。
+- 巢狀呼叫以每個執行緒各自的呼叫堆疊追蹤：列數、連線數等計數同時累加到堆疊上所有呼叫（含子呼叫的總量），
+  所以 screen.evaluate 的一列就能看出整次選股取回多少資料、用了幾條連線。
+- 產生器（iter_db_df 等）只計算在產生器內執行的時間，不含呼叫端處理每批資料的時間。
+- 彙總結果以 stats() 取得 DataFrame，save_report() 輸出 JSON（彙總 + 每次呼叫）或 CSV（彙總）。
+
+範例：
+    from api import profiling
+    with profiling.profile() as prof:
+        screen.select(criteria)
+    print(prof.stats().head(10))
+    prof.save_report('profile.json')
+
+    # 或設定環境變數 API_PROFILE=1（API_PROFILE_MEMORY=1 同時追蹤記憶體）在整個程式執行期間記錄
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, List
+import pandas as pd
+
+# 固定輸出的計數欄位（其他以 count() 記錄的名稱附加在後）
+COUNTER_NAMES = ('rows', 'bytes', 'connections', 'new_connections')
+# 保留的單次呼叫紀錄上限（彙總統計不受影響）
+MAX_CALL_RECORDS = int(os.getenv('API_PROFILE_MAX_CALLS', 10_000))
+MB = 1024 * 1024
+
+_enabled = os.getenv('API_PROFILE', '0') == '1'
+_track_memory = os.getenv('API_PROFILE_MEMORY', '0') == '1'
+_lock = threading.Lock()
+_local = threading.local()
+_stats: Dict[str, dict] = {}
+_calls = deque(maxlen=MAX_CALL_RECORDS)
+
+
+class _Frame:
+    """
+    一次進行中的呼叫。
+    """
+    __slots__ = ('name', 'start', 'elapsed', 'child_time', 'counters', 'mem_base', 'mem_peak')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+        self.elapsed = 0.0
+        self.child_time = 0.0
+        self.counters = {}
+        self.mem_base = None
+        self.mem_peak = 0
+
+
+def _stack() -> list:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def enable(memory: bool = False) -> None:
+    """
+    開始記錄；memory=True 時以 tracemalloc 追蹤每次呼叫的峰值記憶體（會明顯拖慢執行，只在需要時開啟）。
+    """
+    global _enabled, _track_memory
+    _track_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable() -> None:
+    """
+    停止記錄（已記錄的統計保留，呼叫 reset() 清除）。
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    清除所有統計與單次呼叫紀錄。
+    """
+    with _lock:
+        _stats.clear()
+        _calls.clear()
+
+
+def count(name: str, n: int = 1) -> None:
+    """
+    累加計數到目前執行緒堆疊上的所有呼叫（停用或不在任何被標記的呼叫內時不做事）。
+
+    範例：
+        profiling.count('connections')
+    """
+    if not _enabled:
+        return
+    for frame in _stack():
+        frame.counters[name] = frame.counters.get(name, 0) + n
+
+
+def record_fetch(df: pd.DataFrame) -> None:
+    """
+    記錄一次資料庫查詢結果：列數與結果集大小（DataFrame 記憶體用量，含字串內容，作為傳輸量的估計）。
+    停用時不計算大小。
+    """
+    if not _enabled or not _stack():
+        return
+    count('rows', len(df))
+    count('bytes', int(df.memory_usage(index=False, deep=True).sum()))
+
+
+def _begin(frame: _Frame) -> None:
+    stack = _stack()
+    if _track_memory and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        # reset_peak 會清掉外層呼叫目前為止的峰值，先記到外層
+        if stack:
+            stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+        tracemalloc.reset_peak()
+        # 產生器每次恢復都會重新進入，基準只取第一次
+        if frame.mem_base is None:
+            frame.mem_base = current
+        frame.mem_peak = max(frame.mem_peak, current)
+    stack.append(frame)
+    frame.start = perf_counter()
+
+
+def _end(frame: _Frame) -> None:
+    elapsed = perf_counter() - frame.start
+    frame.elapsed += elapsed
+    stack = _stack()
+    stack.pop()
+    if frame.mem_base is not None and tracemalloc.is_tracing():
+        frame.mem_peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1].mem_peak = max(stack[-1].mem_peak, frame.mem_peak)
+    if stack:
+        # 產生器可能多次進出，外層只加上這一段的時間
+        stack[-1].child_time += elapsed
+
+
+def _finish(frame: _Frame, error: BaseException = None) -> None:
+    peak_mb = (frame.mem_peak - frame.mem_base) / MB if frame.mem_base is not None else None
+    record = {
+        'name': frame.name,
+        'thread': threading.current_thread().name,
+        'wall_s': frame.elapsed,
+        'self_s': frame.elapsed - frame.child_time,
+        **{name: frame.counters.get(name, 0) for name in COUNTER_NAMES},
+        **{name: value for name, value in frame.counters.items() if name not in COUNTER_NAMES},
+        'peak_mb': peak_mb,
+        'error': type(error).__name__ if error is not None else '',
+    }
+    with _lock:
+        _calls.append(record)
+        stat = _stats.get(frame.name)
+        if stat is None:
+            stat = _stats[frame.name] = {'calls': 0, 'errors': 0, 'total_s': 0.0, 'self_s': 0.0, 'max_s': 0.0,
+                                         'counters': {}, 'peak_mb': None}
+        stat['calls'] += 1
+        stat['errors'] += error is not None
+        stat['total_s'] += frame.elapsed
+        stat['self_s'] += frame.elapsed - frame.child_time
+        stat['max_s'] = max(stat['max_s'], frame.elapsed)
+        for name, value in frame.counters.items():
+            stat['counters'][name] = stat['counters'].get(name, 0) + value
+        if peak_mb is not None:
+            stat['peak_mb'] = peak_mb if stat['peak_mb'] is None else max(stat['peak_mb'], peak_mb)
+
+
+def _call(name: str, func: Callable, args, kwargs):
+    frame = _Frame(name)
+    _begin(frame)
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        _end(frame)
+        _finish(frame, e)
+        raise
+    _end(frame)
+    _finish(frame)
+    return result
+
+
+def _iterate(name: str, gen):
+    # 每次恢復產生器時才把呼叫放回堆疊，只計算產生器內部的時間與計數
+    frame = _Frame(name)
+    error = None
+    value = None
+    try:
+        while True:
+            _begin(frame)
+            try:
+                item = gen.send(value)
+            except StopIteration as stop:
+                return stop.value
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _end(frame)
+            value = yield item
+    finally:
+        gen.close()
+        _finish(frame, error)
+
+
+def instrument(name: str = None):
+    """
+    標記要記錄的函式（含產生器函式）。停用時直接呼叫原函式。
+
+    參數：
+        name (str): 統計名稱，預設為「模組.函式名稱」（如 process_df.get_db_df）
+    範例：
+        @profiling.instrument()
+        def get_db_df(...):
+            ...
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from func(*args, **kwargs))
+                return (yield from _iterate(label, func(*args, **kwargs)))
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            return _call(label, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def section(name: str):
+    """
+    記錄任意程式區塊（與 instrument 共用統計與巢狀關係）。停用時不做事。
+
+    範例：
+        with profiling.section('策略.訊號計算'):
+            signal = ...
+    """
+    if not _enabled:
+        yield
+        return
+    frame = _Frame(name)
+    _begin(frame)
+    try:
+        yield
+    except BaseException as e:
+        _end(frame)
+        _finish(frame, e)
+        raise
+    _end(frame)
+    _finish(frame)
+
+
+def calls() -> List[dict]:
+    """
+    單次呼叫紀錄（最多 MAX_CALL_RECORDS 筆，依結束順序）。
+    """
+    with _lock:
+        return list(_calls)
+
+
+def stats(sort_by: str = 'total_s') -> pd.DataFrame:
+    """
+    依名稱彙總的統計：calls、errors、total_s（含子呼叫）、self_s（扣除被記錄的子呼叫）、mean_ms、max_ms、
+    rows、bytes、connections、new_connections（及其他 count() 名稱）、peak_mb（單次呼叫最大值，未追蹤記憶體時為 NaN）。
+
+    範例：
+        profiling.stats().head(10)
+    """
+    with _lock:
+        items = [(name, dict(stat, counters=dict(stat['counters']))) for name, stat in _stats.items()]
+    extra = sorted({counter for _, stat in items for counter in stat['counters']} - set(COUNTER_NAMES))
+    rows = []
+    for name, stat in items:
+        rows.append({
+            'name': name,
+            'calls': stat['calls'],
+            'errors': stat['errors'],
+            'total_s': stat['total_s'],
+            'self_s': stat['self_s'],
+            'mean_ms': stat['total_s'] / stat['calls'] * 1000,
+            'max_ms': stat['max_s'] * 1000,
+            **{counter: stat['counters'].get(counter, 0) for counter in COUNTER_NAMES + tuple(extra)},
+            'peak_mb': stat['peak_mb'],
+        })
+    columns = ['name', 'calls', 'errors', 'total_s', 'self_s', 'mean_ms', 'max_ms', *COUNTER_NAMES, *extra, 'peak_mb']
+    result = pd.DataFrame(rows, columns=columns).set_index('name')
+    result['peak_mb'] = result['peak_mb'].astype(float)
+    return result.sort_values(sort_by, ascending=False) if sort_by else result
+
+
+def _write_report(path: str, stats_df: pd.DataFrame, call_records: List[dict], include_calls: bool) -> None:
+    if path.endswith('.csv'):
+        stats_df.to_csv(path, encoding='utf-8-sig')
+        return
+    report = {'stats': json.loads(stats_df.reset_index().to_json(orient='records', force_ascii=False))}
+    if include_calls:
+        report['calls'] = call_records
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def save_report(path: str, include_calls: bool = True) -> None:
+    """
+    輸出報告：.csv 為彙總統計；其餘為 JSON {'stats': [...], 'calls': [...]}（include_calls=False 時不含單次紀錄）。
+    """
+    _write_report(path, stats(), calls(), include_calls)
+
+
+class Profile:
+    """
+    profile() 區塊結束時的統計快照。
+    """
+
+    def __init__(self):
+        self.stats_df = None
+        self.call_records = []
+
+    def stats(self, sort_by: str = 'total_s') -> pd.DataFrame:
+        return self.stats_df.sort_values(sort_by, ascending=False) if sort_by else self.stats_df
+
+    def calls(self) -> List[dict]:
+        return self.call_records
+
+    def save_report(self, path: str, include_calls: bool = True) -> None:
+        """
+        同模組層級 save_report，輸出此區塊的統計。
+        """
+        _write_report(path, self.stats(), self.call_records, include_calls)
+
+
+@contextmanager
+def profile(memory: bool = False):
+    """
+    在 with 區塊內開啟記錄（開始前清除舊統計），結束後恢復原本的開關，並把統計快照放進回傳的 Profile。
+
+    範例：
+        with profiling.profile(memory=True) as prof:
+            result = screen.evaluate(exprs, '-30:-0')
+        prof.stats()[['calls', 'total_s', 'self_s', 'rows', 'connections', 'peak_mb']]
+    """
+    global _track_memory
+    was_enabled, was_tracking, was_tracing = _enabled, _track_memory, tracemalloc.is_tracing()
+    result = Profile()
+    reset()
+    enable(memory)
+    try:
+        yield result
+    finally:
+        result.stats_df = stats(sort_by=None)
+        result.call_records = calls()
+        if not was_enabled:
+            disable()
+        _track_memory = was_tracking
+        if memory and not was_tracing:
+            tracemalloc.stop()
@@ -0,0 +1,289 @@
+"""
+query_builder.py - 參數化 SQL 產生器
+
+核心理念：
+- 值一律以 %s 佔位、由 driver 綁定，不再以 f-string 拼接日期與條件值（避免 SQL injection）。
+- 資料表與欄位名稱以 schema_catalog 驗證後加上反引號，不在結構內的名稱直接拒絕。
+- 相同形狀的查詢（同表、同欄位、同條件結構）產生完全相同的 SQL 文字，只有參數不同，
+  伺服器端的 statement / plan 快取得以重複利用；產生後的文字也會在本模組快取，不重複組字串。
+- AggregateQuery 產生 GROUP BY / HAVING 查詢，彙總在資料庫端完成，只傳回彙總後的列；
+  每組前 k 名以 ROW_NUMBER() 視窗函式在子查詢中篩選（需 MariaDB 10.2+ / MySQL 8+）。
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from api.db_lib import schema_catalog
+from api.utility import get_info_str
+
+DEBUG_MODE = 0
+
+# 支援的條件運算子
+COMPARE_OPS = ('=', '!=', '<>', '<', '<=', '>', '>=', 'LIKE', 'NOT LIKE')
+RANGE_OPS = ('BETWEEN',)
+LIST_OPS = ('IN', 'NOT IN')
+# 支援的彙總函式
+AGG_FUNCS = ('SUM', 'COUNT', 'AVG', 'MIN', 'MAX', 'COUNT DISTINCT')
+# 日期分組：day 原值，month 取 'YYYY-MM'（民國 'YYY-MM' 亦適用）
+DATE_BUCKETS = {'day': '{col}', 'month': "SUBSTRING_INDEX({col}, '-', 2)"}
+
+_sql_cache: Dict[tuple, str] = {}
+_sql_cache_lock = threading.Lock()
+
+
+def quote_ident(name: str) -> str:
+    """
+    以反引號包住識別字（不做結構驗證），名稱內含反引號時直接拒絕。
+    """
+    if not name or '`' in name:
+        raise ValueError(f"不合法的識別字：{name!r}")
+    return f'`{name}`'
+
+
+def validate_table(table: str) -> str:
+    """
+    確認資料表存在於 schema_catalog，回傳加上反引號的名稱。
+    """
+    if table not in schema_catalog.tables():
+        raise ValueError(f"資料表 {table!r} 不存在")
+    return quote_ident(table)
+
+
+def validate_column(table: str, column: str) -> str:
+    """
+    確認欄位存在於該資料表（schema_catalog），回傳加上反引號的名稱。
+    """
+    if column not in schema_catalog.columns(table):
+        raise ValueError(f"資料表 {table} 沒有欄位 {column!r}")
+    return quote_ident(column)
+
+
+class SelectQuery:
+    """
+    參數化 SELECT 產生器，所有值都以 %s 綁定。
+
+    參數：
+        table (str): 資料表原始名稱
+        columns (Sequence[str]): 要查詢的原始欄位名稱
+        distinct (bool): 是否 SELECT DISTINCT
+        validate (bool): 是否以 schema_catalog 驗證表名與欄位（預設 True）
+    範例：
+        sql, params = (SelectQuery('price', ['stock_id', 'date', '收盤價'])
+                       .where('date', 'BETWEEN', ('2025-01-01', '2025-05-01'))
+                       .where('stock_id', 'LIKE', '____')
+                       .order_by('stock_id', 'date')
+                       .build())
+        cursor.execute(sql, params)
+    """
+
+    def __init__(self, table: str, columns: Sequence[str], distinct: bool = False, validate: bool = True):
+        self.table = table
+        self.columns = list(columns)
+        self.distinct = distinct
+        self.validate = validate
+        self._conditions: List[Tuple[str, str, int]] = []  # (欄位, 運算子, 佔位數)
+        self._params: List[Any] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    def where(self, column: str, op: str, value: Any) -> 'SelectQuery':
+        """
+        新增 AND 條件。
+        - 比較運算子（=, !=, <, <=, >, >=, LIKE）：value 為單一值
+        - BETWEEN：value 為 (下界, 上界)
+        - IN / NOT IN：value 為值列表（不可為空）
+        """
+        op = op.strip().upper()
+        if op in COMPARE_OPS:
+            self._conditions.append((column, op, 1))
+            self._params.append(value)
+        elif op in RANGE_OPS:
+            lower, upper = value
+            self._conditions.append((column, op, 2))
+            self._params.extend([lower, upper])
+        elif op in LIST_OPS:
+            values = list(value)
+            if not values:
+                raise ValueError(f"{column} {op} 的值列表不可為空")
+            self._conditions.append((column, op, len(values)))
+            self._params.extend(values)
+        else:
+            raise ValueError(f"不支援的運算子：{op}")
+        return self
+
+    def order_by(self, *columns: str, desc: bool = False) -> 'SelectQuery':
+        self._order.extend((column, desc) for column in columns)
+        return self
+
+    def limit(self, n: int) -> 'SelectQuery':
+        self._limit = int(n)
+        return self
+
+    def _shape(self) -> tuple:
+        return (self.table, tuple(self.columns), self.distinct, self.validate,
+                tuple(self._conditions), tuple(self._order), self._limit is not None)
+
+    def _identifiers(self) -> tuple:
+        # 回傳 (欄位名稱轉換函式, 加上反引號的表名)
+        if self.validate:
+            return (lambda column: validate_column(self.table, column)), validate_table(self.table)
+        return quote_ident, quote_ident(self.table)
+
+    def _where_sql(self, ident) -> str:
+        clauses = []
+        for column, op, n_params in self._conditions:
+            if op in RANGE_OPS:
+                clauses.append(f"{ident(column)} BETWEEN %s AND %s")
+            elif op in LIST_OPS:
+                clauses.append(f"{ident(column)} {op} ({', '.join(['%s'] * n_params)})")
+            else:
+                clauses.append(f"{ident(column)} {op} %s")
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def _render(self) -> str:
+        ident, table = self._identifiers()
+        sql = f"SELECT {'DISTINCT ' if self.distinct else ''}{', '.join(ident(c) for c in self.columns)} FROM {table}"
+        sql += self._where_sql(ident)
+        if self._order:
+            sql += " ORDER BY " + ", ".join(f"{ident(column)}{' DESC' if desc else ''}" for column, desc in self._order)
+        if self._limit is not None:
+            sql += " LIMIT %s"
+        return sql
+
+    def build(self) -> Tuple[str, tuple]:
+        """
+        回傳 (sql, params)，可直接傳給 cursor.execute(sql, params)。
+        相同形狀的查詢共用同一段 SQL 文字（已驗證過的結構不再重新驗證）。
+        """
+        shape = self._shape()
+        with _sql_cache_lock:
+            sql = _sql_cache.get(shape)
+        if sql is None:
+            sql = self._render()
+            with _sql_cache_lock:
+                _sql_cache[shape] = sql
+        params = tuple(self._params) + self._tail_params()
+        print(get_info_str(__name__), f"SQL: {sql} params: {params}") if DEBUG_MODE else None
+        return sql, params
+
+    def _tail_params(self) -> tuple:
+        # WHERE 之後的參數（子類別可在 LIMIT 前加入 HAVING 等參數）
+        return (self._limit,) if self._limit is not None else ()
+
+
+class AggregateQuery(SelectQuery):
+    """
+    參數化 GROUP BY 查詢，彙總在資料庫端完成。
+
+    參數：
+        table (str): 資料表原始名稱
+        group_by (Sequence): 分組欄位；日期欄位可寫成 (欄位, 'day' 或 'month')
+        aggregates (Dict[str, tuple]): {別名: (函式, 欄位)}，函式見 AGG_FUNCS；
+                                       欄位為原始欄位名稱、'*'（COUNT）或 ('-', 欄位a, 欄位b) 表示 a - b
+        validate (bool): 是否以 schema_catalog 驗證表名與欄位
+    範例：
+        sql, params = (AggregateQuery('dealer', ['股票代號', '分點名稱'], {'net': ('SUM', ('-', '買進金額', '賣出金額'))})
+                       .where('date', 'BETWEEN', ('2025-04-01', '2025-04-30'))
+                       .having('net', '>', 0)
+                       .top_per(['股票代號'], 3, 'net')
+                       .build())
+    """
+
+    def __init__(self, table: str, group_by: Sequence, aggregates: Dict[str, tuple], validate: bool = True):
+        if not aggregates:
+            raise ValueError("aggregates 不可為空")
+        groups = []
+        for group in group_by:
+            column, bucket = (group, 'day') if isinstance(group, str) else group
+            if bucket not in DATE_BUCKETS:
+                raise ValueError(f"不支援的日期分組：{bucket}，可用 {list(DATE_BUCKETS)}")
+            groups.append((column, bucket))
+        for alias, (func, column) in aggregates.items():
+            if func.upper() not in AGG_FUNCS:
+                raise ValueError(f"不支援的彙總函式：{func}，可用 {list(AGG_FUNCS)}")
+        super().__init__(table, [column for column, _ in groups], validate=validate)
+        self.groups = groups
+        self.aggregates = {alias: (func.upper(), column) for alias, (func, column) in aggregates.items()}
+        self._having: List[Tuple[str, str]] = []
+        self._having_params: List[Any] = []
+        self._top: Optional[Tuple[tuple, str, bool]] = None
+        self._top_k: Optional[int] = None
+
+    def having(self, alias: str, op: str, value: Any) -> 'AggregateQuery':
+        """
+        新增 HAVING 條件（以彙總別名比較，運算子同 where 的比較運算子）。
+        """
+        op = op.strip().upper()
+        if alias not in self.aggregates:
+            raise ValueError(f"HAVING 欄位 {alias!r} 不是彙總別名，可用 {list(self.aggregates)}")
+        if op not in COMPARE_OPS:
+            raise ValueError(f"HAVING 不支援的運算子：{op}")
+        self._having.append((alias, op))
+        self._having_params.append(value)
+        return self
+
+    def top_per(self, partition: Sequence[str], k: int, order_alias: str, desc: bool = True) -> 'AggregateQuery':
+        """
+        每個 partition 分組只取 order_alias 排名前 k 的列（ROW_NUMBER 視窗函式），結果多一欄 _rank。
+        """
+        if order_alias not in self.aggregates:
+            raise ValueError(f"排序欄位 {order_alias!r} 不是彙總別名")
+        group_columns = [column for column, _ in self.groups]
+        missing = [column for column in partition if column not in group_columns]
+        if missing:
+            raise ValueError(f"partition 欄位 {missing} 需在 group_by 中")
+        self._top = (tuple(partition), order_alias, desc)
+        self._top_k = int(k)
+        return self
+
+    def _shape(self) -> tuple:
+        return (super()._shape(), 'AGG', tuple(self.groups), tuple(self.aggregates.items()), tuple(self._having), self._top)
+
+    def _render(self) -> str:
+        ident, table = self._identifiers()
+
+        def agg_expr(func: str, column) -> str:
+            if column == '*':
+                if func != 'COUNT':
+                    raise ValueError(f"{func} 不可使用 *")
+                return 'COUNT(*)'
+            if isinstance(column, (tuple, list)):
+                op, left, right = column
+                if op not in ('-', '+'):
+                    raise ValueError(f"彙總欄位只支援兩欄相加減，收到 {op!r}")
+                inner = f"{ident(left)} {op} {ident(right)}"
+            else:
+                inner = ident(column)
+            return f"COUNT(DISTINCT {inner})" if func == 'COUNT DISTINCT' else f"{func}({inner})"
+
+        group_exprs = {column: DATE_BUCKETS[bucket].format(col=ident(column)) for column, bucket in self.groups}
+        agg_exprs = {alias: agg_expr(func, column) for alias, (func, column) in self.aggregates.items()}
+        select = [f"{expr} AS {quote_ident(column)}" for column, expr in group_exprs.items()]
+        select += [f"{expr} AS {quote_ident(alias)}" for alias, expr in agg_exprs.items()]
+        if self._top is not None:
+            partition, order_alias, desc = self._top
+            # 同值時依其餘分組欄位排序，名次固定
+            ties = [expr for column, expr in group_exprs.items() if column not in partition]
+            order = ', '.join([f"{agg_exprs[order_alias]}{' DESC' if desc else ''}"] + ties)
+            select.append(f"ROW_NUMBER() OVER (PARTITION BY {', '.join(group_exprs[column] for column in partition)} ORDER BY {order}) AS `_rank`")
+        sql = f"SELECT {', '.join(select)} FROM {table}" + self._where_sql(ident)
+        sql += " GROUP BY " + ", ".join(group_exprs.values())
+        if self._having:
+            sql += " HAVING " + " AND ".join(f"{quote_ident(alias)} {op} %s" for alias, op in self._having)
+        if self._top is not None:
+            sql = f"SELECT * FROM ({sql}) AS `ranked` WHERE `_rank` <= %s"
+        if self._order:
+            sql += " ORDER BY " + ", ".join(f"{quote_ident(column)}{' DESC' if desc else ''}" for column, desc in self._order)
+        if self._limit is not None:
+            sql += " LIMIT %s"
+        return sql
+
+    def _tail_params(self) -> tuple:
+        top = (self._top_k,) if self._top is not None else ()
+        return tuple(self._having_params) + top + super()._tail_params()
+
+
+def clear_sql_cache() -> None:
+    """
+    清除已產生的 SQL 文字快取（資料表結構變更後，搭配 db_lib.invalidate_schema_cache 使用）。
+    """
+    with _sql_cache_lock:
+        _sql_cache.clear()
@@ -0,0 +1,773 @@
+"""
+screen.py - 延遲求值的選股條件運算式（expression DAG）
+
+核心理念：
+- 以 Close()、SMA(60)、Median(Volume(), 100) 等節點組合條件，運算子（> < & | ~ + - * /）只建立運算圖，不立即計算。
+- 求值前以節點結構（種類、參數、子節點）去除重複子運算式：同一個 SMA(60) 或 Close() > SMA(60) 只算一次，
+  多個條件（選股條件、除錯家數、最後一天名單）放在同一次 evaluate 中共用中間結果。
+- 自動彙整需要的欄位與最長回看天數，每張資料表只以 get_db_pivot_panel 查詢一次（多張表以 fetch_many 平行查詢），
+  查詢區間 = 目標區間往前推回看天數。
+- last_only=True 或指定 dates 時改為「指定日模式」：由目標日往回推每個節點真正需要的日期，
+  均線等視窗指標只在需要的日期各取一個視窗計算（indicator.*_at_dates），不計算整段滾動序列。
+- 指標計算沿用 api.indicator，均線排列等濾網沿用 api.filter；月營收、季報經 api.alignment 依公告日對齊到交易日（Fundamental / Revenue）。
+
+範例：
+    from api.screen import Close, Volume, SMA, Median, evaluate, select
+    above60 = Close() > SMA(60)
+    criteria = (Volume() > 0.5 * Median(Volume(), 100)) & above60 & (Close() > SMA(120))
+    result = evaluate({'criteria': criteria, 'above60': above60}, '-30:-0')
+    result['above60'].sum(axis=1)          # 每天家數
+    select(criteria)                        # 最後一天符合的股票
+"""
+import math
+import operator
+import warnings
+from datetime import datetime, timedelta
+from typing import Dict, List, Union
+import numpy as np
+import pandas as pd
+from api import alignment, indicator, filter as pivot_filter, process_df, profiling
+from api.utility import get_info_str
+
+DEBUG_MODE = 0
+
+# 未指定 date_range_str 且未傳入 data 時的目標區間
+DEFAULT_TARGET_RANGE = '-30:-0'
+# 交易日換算日曆日後再多抓的天數（連假、停市）
+CALENDAR_PAD_DAYS = 30
+# EMA / MACD 為遞迴指標，以 n 的倍數作為暖機天數（4n 後起始值權重約 e^-8）
+EMA_WARMUP_FACTOR = 4
+
+
+class Expr:
+    """
+    運算式節點基底類別。子類別需定義 children、params、lookback 與 compute。
+    """
+    children: tuple = ()
+
+    def params(self) -> tuple:
+        return ()
+
+    @property
+    def key(self) -> tuple:
+        # 結構 key：相同種類、參數與子節點的運算式視為同一節點
+        return (type(self).__name__, self.params(), tuple(child.key for child in self.children))
+
+    @property
+    def lookback(self) -> int:
+        """
+        計算第一個目標日需要往前多少個交易日的資料。
+        """
+        return max((child.lookback for child in self.children), default=0)
+
+    def compute(self, *values):
+        raise NotImplementedError
+
+    def indicator_call(self, *values):
+        """
+        指標節點回傳 (api.indicator 函式, 參數)，供 evaluate 經 indicator_store 快取計算；其他節點回傳 None。
+        """
+        return None
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        """
+        指定日模式：本節點需要 rows（對應交易日的布林陣列）時，各子節點需要的列。預設為逐日運算，子節點需要相同的列。
+        """
+        return [rows] * len(self.children)
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, *values):
+        """
+        指定日模式：只計算 rows 對應的日期。預設把子節點結果對齊到這些日期後呼叫 compute。
+        """
+        dates = index[rows]
+        return self.compute(*(_take(value, dates) for value in values))
+
+    def __repr__(self) -> str:
+        args = [repr(child) for child in self.children] + [repr(p) for p in self.params()]
+        return f"{type(self).__name__}({', '.join(args)})"
+
+    def __bool__(self):
+        raise TypeError("運算式不能直接當作布林值，請以 & | ~ 組合條件並用 evaluate 求值")
+
+    # 比較
+    def __gt__(self, other): return BinaryOp('>', self, other)
+    def __ge__(self, other): return BinaryOp('>=', self, other)
+    def __lt__(self, other): return BinaryOp('<', self, other)
+    def __le__(self, other): return BinaryOp('<=', self, other)
+    def __eq__(self, other): return BinaryOp('==', self, other)
+    def __ne__(self, other): return BinaryOp('!=', self, other)
+    __hash__ = None
+
+    # 邏輯
+    def __and__(self, other): return BinaryOp('&', self, other)
+    def __rand__(self, other): return BinaryOp('&', other, self)
+    def __or__(self, other): return BinaryOp('|', self, other)
+    def __ror__(self, other): return BinaryOp('|', other, self)
+    def __invert__(self): return Not(self)
+
+    # 算術
+    def __add__(self, other): return BinaryOp('+', self, other)
+    def __radd__(self, other): return BinaryOp('+', other, self)
+    def __sub__(self, other): return BinaryOp('-', self, other)
+    def __rsub__(self, other): return BinaryOp('-', other, self)
+    def __mul__(self, other): return BinaryOp('*', self, other)
+    def __rmul__(self, other): return BinaryOp('*', other, self)
+    def __truediv__(self, other): return BinaryOp('/', self, other)
+    def __rtruediv__(self, other): return BinaryOp('/', other, self)
+    def __neg__(self): return BinaryOp('*', Const(-1), self)
+
+    def shift(self, periods: int = 1) -> 'Expr':
+        """
+        往後平移 periods 天（前 periods 天的值），如 Close().shift(1) 為前一日收盤。
+        """
+        return Shift(self, periods)
+
+
+def _wrap(value) -> Expr:
+    return value if isinstance(value, Expr) else Const(value)
+
+
+def _take(value, dates: pd.Index):
+    # 子節點結果只取指定日期（子節點的日期必定包含這些日期）；常數與以股票代碼為 index 的 Series（如各股中位數）直接回傳
+    if isinstance(value, pd.DataFrame) or (isinstance(value, pd.Series) and isinstance(value.index, pd.DatetimeIndex)):
+        return value if value.index.equals(dates) else value.loc[dates]
+    return value
+
+
+def _hull(value: pd.DataFrame, index: pd.Index) -> pd.DataFrame:
+    # 子節點結果補成連續交易日（中間未計算的日期為 NaN，不在任何視窗內）
+    if len(value) == 0:
+        return value
+    positions = index.get_indexer(value.index)
+    span = index[positions.min(): positions.max() + 1]
+    return value if value.index.equals(span) else value.reindex(span)
+
+
+def _dilate(rows: np.ndarray, n: int) -> np.ndarray:
+    # 每個需要的日期往前 n-1 個交易日都需要
+    cum = np.concatenate([[0], np.cumsum(rows)])
+    upper = np.minimum(np.arange(len(rows)) + n, len(rows))
+    return (cum[upper] - cum[:-1]) > 0
+
+
+def _warmup_rows(rows: np.ndarray, warmup: int) -> np.ndarray:
+    # 遞迴指標需要從第一個目標日往前 warmup 天起的連續區間
+    positions = np.flatnonzero(rows)
+    child = np.zeros_like(rows)
+    if len(positions):
+        child[max(0, positions[0] - warmup): positions[-1] + 1] = True
+    return child
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def params(self) -> tuple:
+        try:
+            hash(self.value)
+        except TypeError:
+            # Series 等不可雜湊的常數以物件身分區分
+            return ('id', id(self.value))
+        return (self.value,)
+
+    def compute(self):
+        return self.value
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+class Field(Expr):
+    """
+    資料表欄位 pivot（index: 日期, columns: 股票代碼），名稱使用熟悉名稱（同 get_db_pivot_panel 的 value_names）。
+
+    參數：
+        value_name (str): 欄位名稱，如 '收盤價'、'本益比'
+        table (str): 資料表，預設 'price'
+        column_name (str): pivot 欄位，預設 'stock_id'
+    """
+
+    def __init__(self, value_name: str, table: str = 'price', column_name: str = 'stock_id'):
+        self.value_name = value_name
+        self.table = table
+        self.column_name = column_name
+
+    def params(self) -> tuple:
+        return (self.value_name, self.table, self.column_name)
+
+    def __repr__(self) -> str:
+        return f"Field({self.value_name!r}, {self.table!r})"
+
+
+def Close() -> Field:
+    return Field('收盤價')
+
+
+def Open() -> Field:
+    return Field('開盤價')
+
+
+def High() -> Field:
+    return Field('最高價')
+
+
+def Low() -> Field:
+    return Field('最低價')
+
+
+def Volume() -> Field:
+    return Field('成交股數')
+
+
+_BINARY_OPS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '!=': operator.ne,
+    '&': operator.and_, '|': operator.or_,
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+}
+
+
+class BinaryOp(Expr):
+    def __init__(self, op: str, left, right):
+        self.op = op
+        self.children = (_wrap(left), _wrap(right))
+
+    def params(self) -> tuple:
+        return (self.op,)
+
+    def compute(self, left, right):
+        return _BINARY_OPS[self.op](left, right)
+
+    def __repr__(self) -> str:
+        return f"({self.children[0]!r} {self.op} {self.children[1]!r})"
+
+
+class Not(Expr):
+    def __init__(self, src):
+        self.children = (_wrap(src),)
+
+    def compute(self, value):
+        return ~value
+
+    def __repr__(self) -> str:
+        return f"~{self.children[0]!r}"
+
+
+class Shift(Expr):
+    def __init__(self, src: Expr, periods: int = 1):
+        self.children = (src,)
+        self.periods = periods
+
+    def params(self) -> tuple:
+        return (self.periods,)
+
+    @property
+    def lookback(self) -> int:
+        return self.children[0].lookback + self.periods
+
+    def compute(self, value):
+        return value.shift(self.periods)
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        positions = np.flatnonzero(rows) - self.periods
+        child = np.zeros_like(rows)
+        child[positions[(positions >= 0) & (positions < len(rows))]] = True
+        return [child]
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, value):
+        positions = np.concatenate([np.flatnonzero(rows), index.get_indexer(value.index)])
+        span = index[positions.min(): positions.max() + 1]
+        return value.reindex(span).shift(self.periods).loc[index[rows]]
+
+
+class Median(Expr):
+    """
+    n 日滾動中位數（如 Median(Volume(), 100) 為每檔股票近 100 日成交量中位數）。
+    """
+
+    def __init__(self, src: Expr, n: int):
+        self.children = (src,)
+        self.n = n
+
+    def params(self) -> tuple:
+        return (self.n,)
+
+    @property
+    def lookback(self) -> int:
+        return self.children[0].lookback + self.n - 1
+
+    def compute(self, value):
+        return value.rolling(window=self.n, min_periods=1).median()
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        return [_dilate(rows, self.n)]
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, value):
+        hull = _hull(value, index)
+        positions = indicator._target_positions(hull.index, index[rows])
+        stack = indicator._window_stack(hull.to_numpy(dtype=float), positions, self.n)
+        with warnings.catch_warnings():
+            # 整個視窗皆為 NaN 時 nanmedian 會警告，結果為 NaN（同 rolling median）
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(stack, axis=1)
+        return pd.DataFrame(median, index=hull.index[positions], columns=hull.columns)
+
+
+#### 指標節點（計算沿用 api.indicator）
+
+class _WindowIndicator(Expr):
+    """
+    以 n 日為視窗的指標：回看天數 = 子節點回看 + n - 1。
+    func 為整段序列計算，at_dates_func 為指定日計算（api.indicator 的 *_at_dates）。
+    """
+    func = None
+    at_dates_func = None
+
+    def __init__(self, n: int, *sources):
+        self.n = n
+        self.children = tuple(_wrap(src) for src in sources)
+
+    def params(self) -> tuple:
+        return (self.n,)
+
+    @property
+    def lookback(self) -> int:
+        return super().lookback + self.n - 1
+
+    def indicator_call(self, *values):
+        return type(self).func, (*values, self.n)
+
+    def compute(self, *values):
+        return type(self).func(*values, self.n)
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        return [_dilate(rows, self.n)] * len(self.children)
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, *values):
+        return type(self).at_dates_func(*(_hull(value, index) for value in values), self.n, index[rows])
+
+
+class SMA(_WindowIndicator):
+    """n 日簡單移動平均（indicator.sma_pivot_df），預設對 Close()。"""
+    func = staticmethod(indicator.sma_pivot_df)
+    at_dates_func = staticmethod(indicator.sma_at_dates)
+
+    def __init__(self, n: int, src: Expr = None):
+        super().__init__(n, src if src is not None else Close())
+
+
+class WMA(_WindowIndicator):
+    """n 日加權移動平均（indicator.wma_pivot_df），預設以 Volume() 為權重。"""
+    func = staticmethod(indicator.wma_pivot_df)
+    at_dates_func = staticmethod(indicator.wma_at_dates)
+
+    def __init__(self, n: int, src: Expr = None, weight: Expr = None):
+        super().__init__(n, src if src is not None else Close(), weight if weight is not None else Volume())
+
+
+class NDayHigh(_WindowIndicator):
+    """n 日最高（indicator.n_day_high_pivot_df）。"""
+    func = staticmethod(indicator.n_day_high_pivot_df)
+    at_dates_func = staticmethod(indicator.n_day_high_at_dates)
+
+    def __init__(self, n: int, src: Expr = None):
+        super().__init__(n, src if src is not None else Close())
+
+
+class NDayLow(_WindowIndicator):
+    """n 日最低（indicator.n_day_low_pivot_df）。"""
+    func = staticmethod(indicator.n_day_low_pivot_df)
+    at_dates_func = staticmethod(indicator.n_day_low_at_dates)
+
+    def __init__(self, n: int, src: Expr = None):
+        super().__init__(n, src if src is not None else Close())
+
+
+class K(_WindowIndicator):
+    """KD 指標 K 值（indicator.k_pivot_df），以收盤/最低/最高價計算。"""
+    func = staticmethod(indicator.k_pivot_df)
+    at_dates_func = staticmethod(indicator.k_at_dates)
+
+    def __init__(self, n: int = 9):
+        super().__init__(n, Close(), Low(), High())
+
+
+class D(_WindowIndicator):
+    """KD 指標 D 值（indicator.d_pivot_df），預設對 K(9)。"""
+    func = staticmethod(indicator.d_pivot_df)
+    at_dates_func = staticmethod(indicator.d_at_dates)
+
+    def __init__(self, n: int = 3, k: Expr = None):
+        super().__init__(n, k if k is not None else K(9))
+
+
+class Williams(_WindowIndicator):
+    """威廉指標（indicator.williams_pivot_df）。"""
+    func = staticmethod(indicator.williams_pivot_df)
+    at_dates_func = staticmethod(indicator.williams_at_dates)
+
+    def __init__(self, n: int = 14):
+        super().__init__(n, Close(), Low(), High())
+
+
+class EMA(Expr):
+    """
+    n 日指數移動平均（indicator.ema_pivot_df）。遞迴指標以 warmup 天暖機（預設 EMA_WARMUP_FACTOR * n）。
+    """
+
+    def __init__(self, n: int, src: Expr = None, warmup: int = None):
+        self.n = n
+        self.warmup = warmup if warmup is not None else EMA_WARMUP_FACTOR * n
+        self.children = (src if src is not None else Close(),)
+
+    def params(self) -> tuple:
+        return (self.n, self.warmup)
+
+    @property
+    def lookback(self) -> int:
+        return self.children[0].lookback + max(self.warmup, self.n - 1)
+
+    def indicator_call(self, value):
+        return indicator.ema_pivot_df, (value, self.n)
+
+    def compute(self, value):
+        return indicator.ema_pivot_df(value, self.n)
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        return [_warmup_rows(rows, max(self.warmup, self.n - 1))]
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, value):
+        return self.compute(_hull(value, index)).loc[index[rows]]
+
+
+class MACD(Expr):
+    """
+    MACD 值（indicator.macd_pivot_df），暖機天數預設 EMA_WARMUP_FACTOR * slow。
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9, src: Expr = None, warmup: int = None):
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self.warmup = warmup if warmup is not None else EMA_WARMUP_FACTOR * slow
+        self.children = (src if src is not None else Close(),)
+
+    def params(self) -> tuple:
+        return (self.fast, self.slow, self.signal, self.warmup)
+
+    @property
+    def lookback(self) -> int:
+        return self.children[0].lookback + max(self.warmup, self.fast - 1)
+
+    def indicator_call(self, value):
+        return indicator.macd_pivot_df, (value, self.fast, self.slow, self.signal)
+
+    def compute(self, value):
+        return indicator.macd_pivot_df(value, self.fast, self.slow, self.signal)
+
+    def child_rows(self, rows: np.ndarray) -> list:
+        return [_warmup_rows(rows, max(self.warmup, self.fast - 1))]
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, value):
+        return self.compute(_hull(value, index)).loc[index[rows]]
+
+
+#### 濾網節點（計算沿用 api.filter）
+
+class GoldenAlignment(Expr):
+    """
+    均線多頭排列（filter.golden_alignment_pivot），SMA 節點與其他條件共用。
+    """
+
+    def __init__(self, ma_list: List[int], src: Expr = None):
+        self.ma_list = list(ma_list)
+        self.children = tuple(SMA(n, src) for n in self.ma_list)
+
+    def params(self) -> tuple:
+        return (tuple(self.ma_list),)
+
+    def compute(self, *ma_values):
+        ma_pivots = {f'MA{n}': value for n, value in zip(self.ma_list, ma_values)}
+        return pivot_filter.golden_alignment_pivot(ma_pivots, self.ma_list)
+
+
+class MaEntangled(Expr):
+    """
+    均線糾纏（filter.ma_entangled_pivot），SMA 節點與其他條件共用。
+    """
+
+    def __init__(self, ma_list: List[int], tol: float = 0.01, src: Expr = None):
+        self.ma_list = list(ma_list)
+        self.tol = tol
+        self.children = tuple(SMA(n, src) for n in self.ma_list)
+
+    def params(self) -> tuple:
+        return (tuple(self.ma_list), self.tol)
+
+    def compute(self, *ma_values):
+        ma_pivots = {f'MA{n}': value for n, value in zip(self.ma_list, ma_values)}
+        return pivot_filter.ma_entangled_pivot(ma_pivots, self.ma_list, self.tol)
+
+
+class Fundamental(Expr):
+    """
+    月/季資料依公告日對齊到交易日（alignment.align_periods），可與價格條件直接組合，不會用到未公告的資料。
+
+    參數：
+        value_name (str): 欄位名稱，如 '當月營收'
+        table (str): 資料表，預設 'monthly_revenue'
+        kind (str): 'value' 數值，或成長率 'yoy'、'mom'（月）、'qoq'（季），成長率為比例
+        freq (str): 'M' 月、'Q' 季
+        calendar (Expr): 提供交易日的欄位，預設 Close()
+    範例：
+        Fundamental('當月營收', kind='yoy') > 0.2
+    """
+
+    def __init__(self, value_name: str, table: str = 'monthly_revenue', kind: str = 'value', freq: str = 'M', calendar: Expr = None):
+        if kind != 'value' and kind not in alignment.GROWTH_LAGS.get(freq, {}):
+            raise ValueError(f"freq={freq!r} 不支援 kind={kind!r}")
+        self.kind = kind
+        self.freq = freq
+        self.children = (Field(value_name, table), calendar if calendar is not None else Close())
+
+    def params(self) -> tuple:
+        return (self.kind, self.freq)
+
+    @property
+    def lookback(self) -> int:
+        lag = alignment.GROWTH_LAGS[self.freq].get(self.kind, 0)
+        return max(self.children[1].lookback, alignment.lookback_trading_days(self.freq, lag))
+
+    def _align(self, periodic: pd.DataFrame, trading_index: pd.Index) -> pd.DataFrame:
+        growth = () if self.kind == 'value' else (self.kind,)
+        return alignment.align_periods(periodic, trading_index, self.freq, growth=growth)[self.kind]
+
+    def compute(self, periodic, calendar):
+        return self._align(periodic, calendar.index)
+
+    def compute_at(self, index: pd.Index, rows: np.ndarray, periodic, calendar):
+        return self._align(periodic, index[rows])
+
+
+def Revenue(kind: str = 'value') -> Fundamental:
+    return Fundamental('當月營收', 'monthly_revenue', kind, 'M')
+
+
+#### 求值
+
+def _as_dict(exprs) -> Dict[str, Expr]:
+    if isinstance(exprs, Expr):
+        return {'result': exprs}
+    return {name: _wrap(expr) for name, expr in exprs.items()}
+
+
+def _dedup(roots: Dict[str, Expr]) -> tuple:
+    """
+    以結構 key 去除重複節點，回傳 (依拓撲順序排列的唯一節點 {key: node}, 未去重時的節點總數)。
+    """
+    unique = {}
+    sizes = {}
+    stack = [(root, False) for root in roots.values()]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            unique.setdefault(node.key, node)
+            sizes[node.key] = 1 + sum(sizes[child.key] for child in node.children)
+            continue
+        if node.key in unique:
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in node.children)
+    return unique, sum(sizes[root.key] for root in roots.values())
+
+
+def plan(exprs: Union[Expr, Dict[str, Expr]]) -> dict:
+    """
+    回傳求值計畫：節點總數、去重後節點數、各資料表需要的欄位與最長回看交易日數。
+
+    範例：
+        plan({'a': Close() > SMA(60), 'b': (Close() > SMA(60)) & (Close() > SMA(120))})
+        # {'nodes': 13, 'unique': 6, 'fields': {'price': ['收盤價']}, 'lookback': 119}
+    """
+    roots = _as_dict(exprs)
+    unique, total = _dedup(roots)
+    fields = {}
+    for node in unique.values():
+        if isinstance(node, Field):
+            fields.setdefault((node.table, node.column_name), [])
+            if node.value_name not in fields[(node.table, node.column_name)]:
+                fields[(node.table, node.column_name)].append(node.value_name)
+    return {
+        'nodes': total,
+        'unique': len(unique),
+        'fields': {table if column_name == 'stock_id' else f'{table}/{column_name}': names
+                   for (table, column_name), names in fields.items()},
+        'lookback': max((root.lookback for root in roots.values()), default=0),
+    }
+
+
+def _fetch_range(start_date: str, end_date: str, lookback: int) -> str:
+    """
+    目標區間往前推回看交易日數（換算日曆日加上 CALENDAR_PAD_DAYS），回傳 'YYYY-MM-DD:YYYY-MM-DD'。
+    """
+    extra_days = math.ceil(lookback / 5 * 7) + CALENDAR_PAD_DAYS
+    fetch_start = (datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=extra_days)).strftime('%Y-%m-%d')
+    return f'{fetch_start}:{end_date}'
+
+
+def _fetch_fields(unique: dict, fetch_range: str) -> Dict[tuple, pd.DataFrame]:
+    """
+    每張資料表只查詢一次所需欄位；多張表以 process_df.fetch_many 平行查詢。
+    """
+    groups = {}
+    for node in unique.values():
+        if isinstance(node, Field):
+            names = groups.setdefault((node.table, node.column_name), [])
+            if node.value_name not in names:
+                names.append(node.value_name)
+    specs = {f'{table}/{column_name}': {'loader': 'get_db_pivot_panel', 'table_name': table, 'date_range_str': fetch_range,
+                                        'value_names': names, 'column_name': column_name}
+             for (table, column_name), names in groups.items()}
+    if len(specs) == 1:
+        (name, spec), = specs.items()
+        spec = dict(spec)
+        spec.pop('loader')
+        panels = {name: process_df.get_db_pivot_panel(**spec)}
+    else:
+        panels = process_df.fetch_many(specs)
+    return {(table, column_name, value_name): panels[f'{table}/{column_name}'][value_name]
+            for (table, column_name), names in groups.items() for value_name in names}
+
+
+def _field_value(node: Field, data: dict) -> pd.DataFrame:
+    for key in ((node.table, node.column_name, node.value_name), node.value_name):
+        if key in data:
+            return data[key]
+    raise KeyError(f"data 中沒有欄位 {node.value_name!r}（資料表 {node.table}）")
+
+
+def _evaluate_series(unique: dict, field_values: dict, store) -> dict:
+    """
+    整段序列模式：每個節點以整段資料計算一次。
+    """
+    values = dict(field_values)
+    for key, node in unique.items():
+        if key in values:
+            continue
+        child_values = [values[child.key] for child in node.children]
+        call = node.indicator_call(*child_values) if store is not None else None
+        values[key] = store.compute(call[0], *call[1]) if call else node.compute(*child_values)
+    return values
+
+
+def _evaluate_at(unique: dict, roots: Dict[str, Expr], field_values: dict, index: pd.Index, positions: np.ndarray) -> dict:
+    """
+    指定日模式：由根節點的目標日往子節點推出每個節點需要的日期，每個節點只計算這些日期。
+    """
+    need = {key: np.zeros(len(index), dtype=bool) for key in unique}
+    for root in roots.values():
+        need[root.key][positions] = True
+    # unique 依子節點在前排列，反向即父節點在前
+    for key, node in reversed(list(unique.items())):
+        for child, child_need in zip(node.children, node.child_rows(need[key])):
+            need[child.key] |= child_need
+    values = dict(field_values)
+    for key, node in unique.items():
+        if key not in values:
+            values[key] = node.compute_at(index, need[key], *(values[child.key] for child in node.children))
+    return values
+
+
+@profiling.instrument()
+def evaluate(exprs: Union[Expr, Dict[str, Expr]], date_range_str: str = None, last_only: bool = False, data: dict = None, store=None, dates: list = None):
+    """
+    對一個或多個運算式求值：去除重複子運算式、自動查詢所需欄位與區間、每個節點只計算一次。
+
+    參數：
+        exprs (Expr 或 dict): 單一運算式，或 {名稱: 運算式}（多個條件共用中間結果）
+        date_range_str (str): 目標區間（同 process_df.parse_date_range），回傳此區間的結果；
+                              查詢時自動往前多抓最長回看天數。未指定時為 DEFAULT_TARGET_RANGE（傳入 data 時為全部日期）
+        last_only (bool): True 時只算最後一個交易日，回傳 Series（index 為股票代碼）
+        data (dict): 已取得的 pivot，{欄位名稱 或 (table, column_name, 欄位名稱): pivot_df}，傳入時不查資料庫
+        store (IndicatorStore): 指定時指標節點經 indicator_store 磁碟快取計算（如 indicator_store.get_default_store()）；
+                                指定日模式不使用
+        dates (list): 只計算這些日期（非交易日取之前最近的交易日），回傳 index 為這些交易日的 pivot df
+    回傳：
+        單一運算式：pivot df（last_only 時為 Series）；dict：{名稱: pivot df 或 Series}
+    注意：
+        last_only / dates 為指定日模式：只查詢目標日往前最長回看天數的資料，視窗指標只在需要的日期各取一個視窗計算；
+        所有欄位的日期需相同（同一張表），否則改以整段序列計算後取目標日。
+    範例：
+        above = Close() > SMA(60)
+        result = evaluate({'criteria': above & (Close() > SMA(120)), 'above60': above}, '-30:-0')
+        latest = evaluate(above, last_only=True)
+        month_end = evaluate(above, dates=['2025-01-31', '2025-02-28'])
+    """
+    roots = _as_dict(exprs)
+    unique, total = _dedup(roots)
+    lookback = max((root.lookback for root in roots.values()), default=0)
+    point_mode = last_only or dates is not None
+
+    start_date = end_date = None
+    if dates is not None:
+        target_dates = pd.to_datetime(list(dates)).sort_values()
+        start_date, end_date = target_dates[0].strftime('%Y-%m-%d'), target_dates[-1].strftime('%Y-%m-%d')
+    elif data is None or date_range_str is not None:
+        start_date, end_date = process_df.parse_date_range(date_range_str or DEFAULT_TARGET_RANGE)
+    if data is None:
+        fetch_range = _fetch_range(end_date if last_only else start_date, end_date, lookback)
+        print(get_info_str(__name__), f"節點 {total} 個，去重後 {len(unique)} 個，回看 {lookback} 個交易日，查詢區間 {fetch_range}") if DEBUG_MODE else None
+        data = _fetch_fields(unique, fetch_range)
+
+    field_values = {}
+    for key, node in unique.items():
+        if isinstance(node, Field):
+            value = _field_value(node, data)
+            field_values[key] = value[value.index <= end_date] if end_date is not None else value
+    # 只經 Fundamental 使用的月/季欄位日期不同於交易日，不列入指定日模式的日期檢查
+    periodic_keys = {node.children[0].key for node in unique.values() if isinstance(node, Fundamental)}
+    periodic_keys -= {child.key for node in unique.values() if not isinstance(node, Fundamental) for child in node.children}
+    periodic_keys -= {root.key for root in roots.values()}
+    indexes = [value.index for key, value in field_values.items() if key not in periodic_keys]
+    same_index = bool(indexes) and all(index.equals(indexes[0]) for index in indexes[1:])
+
+    if point_mode and same_index:
+        index = indexes[0]
+        positions = np.array([len(index) - 1]) if dates is None else indicator._target_positions(index, dates)
+        values = _evaluate_at(unique, roots, field_values, index, positions)
+        target_index = index[positions]
+    else:
+        if last_only:
+            # 只需最後一天：輸入只保留回看所需的尾端
+            field_values = {key: value if key in periodic_keys else value.iloc[-(lookback + 1):] for key, value in field_values.items()}
+        values = _evaluate_series(unique, field_values, store)
+        target_index = None
+
+    results = {}
+    for name, root in roots.items():
+        value = values[root.key]
+        if isinstance(value, (pd.DataFrame, pd.Series)) and isinstance(value.index, pd.DatetimeIndex):
+            if dates is not None:
+                value = _take(value, target_index if target_index is not None else value.index[indicator._target_positions(value.index, dates)])
+            elif last_only:
+                value = value.iloc[-1] if len(value) else value.iloc[0:0]
+            elif start_date is not None:
+                value = value[value.index >= start_date]
+        results[name] = value
+    return results['result'] if isinstance(exprs, Expr) else results
+
+
+def select(expr: Expr, date_range_str: str = None, data: dict = None, store=None, dates: list = None):
+    """
+    回傳最後一天符合條件的股票代碼列表（指定日模式，只算最後一個交易日）；
+    指定 dates 時回傳 {交易日: 股票代碼列表}。
+
+    範例：
+        select((Close() > SMA(60)) & (Close() > SMA(120)))
+        select(Close() > SMA(60), dates=['2025-01-31', '2025-02-28'])
+    """
+    if dates is not None:
+        result = evaluate(expr, date_range_str, data=data, store=store, dates=dates)
+        result = result.fillna(False).astype(bool)
+        return {date: row[row].index.tolist() for date, row in result.iterrows()}
+    last = evaluate(expr, date_range_str, last_only=True, data=data, store=store)
+    return last[last.fillna(False).astype(bool)].index.tolist()
@@ -1,3 +1,6 @@
+import numpy as np
+import pandas as pd
+
 
 
 
@@ -20,6 +23,41 @@ def to_ad(roc_str):
     y, m, d = roc_str.split('-')
     ad_y = str(int(y)+1911) if len(y) <= 3 else y
     return f"{ad_y}-{m}-{d}"
+
+def to_ad_vec(dates) -> np.ndarray:
+    # 向量化 to_ad：民國/西元日期陣列（字串或 date）轉為 YYYY-MM-DD 字串陣列，年份 <= 3 碼視為民國年
+    # 相同日期只轉換一次（長格式資料每天有上千筆重複日期）
+    codes, uniques = pd.factorize(pd.Index(dates, dtype=object), use_na_sentinel=True)
+    if len(uniques) == 0:
+        return np.full(len(codes), None, dtype=object)
+    text = pd.Series(uniques, dtype=object).astype(str).str.split(' ', n=1).str[0]
+    parts = text.str.split('-', n=1, expand=True)
+    year = parts[0].astype(int)
+    year = year.where(parts[0].str.len() > 3, year + 1911)
+    ad_uniques = (year.astype(str) + '-' + parts[1]).to_numpy(dtype=object)
+    result = ad_uniques.take(np.where(codes >= 0, codes, 0))
+    result[codes < 0] = None
+    return result
+
+def to_ad_index(dates, name: str = 'date') -> pd.DatetimeIndex:
+    # 向量化：民國/西元日期陣列轉為 DatetimeIndex（取代逐筆 [to_ad(d) for d in index]）
+    codes, uniques = pd.factorize(pd.Index(dates, dtype=object), use_na_sentinel=True)
+    if len(uniques) == 0:
+        return pd.DatetimeIndex(np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]'), name=name)
+    parsed = pd.to_datetime(to_ad_vec(uniques), format='%Y-%m-%d').to_numpy()
+    values = parsed.take(np.where(codes >= 0, codes, 0))
+    values[codes < 0] = np.datetime64('NaT')
+    return pd.DatetimeIndex(values, name=name)
+
+def to_roc_vec(dates) -> np.ndarray:
+    # 向量化 to_roc：西元日期陣列（字串、date 或 DatetimeIndex）轉為 YYY-MM-DD 民國字串陣列
+    codes, uniques = pd.factorize(pd.DatetimeIndex(pd.to_datetime(pd.Index(dates))), use_na_sentinel=True)
+    if len(uniques) == 0:
+        return np.full(len(codes), None, dtype=object)
+    roc_uniques = ((uniques.year - 1911).astype(str) + uniques.strftime('-%m-%d')).to_numpy(dtype=object)
+    result = roc_uniques.take(np.where(codes >= 0, codes, 0))
+    result[codes < 0] = None
+    return result
     
 def check_date_format(try_parse_date):
     try_parse_date = str(try_parse_date)
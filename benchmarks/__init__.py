@@ -0,0 +1,16 @@
+"""
+benchmarks - 不需正式 MariaDB 的效能基準測試
+
+核心理念：
+- synthetic：以固定亂數種子產生可重現的合成行情（價格 OHLCV、券商分點、月營收），可設定股票數 x 交易日數、
+  停牌缺值、新上市股票與民國年日期。
+- sqlite_db：把合成資料寫入 SQLite 檔案，替換 db_lib 連線池的建立連線函式，process_df 的查詢路徑
+  （SelectQuery / AggregateQuery、民國年偵測、欄位統一、pivot）完全照正式流程執行。
+- cases：以 @case 註冊基準項目，準備資料與被量測的呼叫分開，只量測呼叫本身。
+- runner：每個項目在多個規模下量測耗時（多次取最小/中位數）與峰值記憶體（tracemalloc），
+  輸出 JSON/CSV，並可與基準檔比較找出退化。
+
+範例：
+    python -m benchmarks --scale small medium --output bench.json
+    python -m benchmarks --scale small --compare bench.json --threshold 0.2
+"""
@@ -0,0 +1,58 @@
+"""
+python -m benchmarks：命令列執行基準測試
+
+範例：
+    python -m benchmarks --scale small medium --output bench.json
+    python -m benchmarks --group indicator backtest -k sma --repeat 10
+    python -m benchmarks --scale small --compare bench.json --threshold 0.2   # 有退化時結束碼為 1
+"""
+import argparse
+import sys
+from benchmarks.cases import CASES
+from benchmarks.runner import SCALES, compare, load_report, run_benchmarks, save_report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='以合成行情量測 api 各函式的耗時與峰值記憶體')
+    parser.add_argument('--scale', nargs='+', default=['small'], choices=list(SCALES), help='資料規模，可多選')
+    parser.add_argument('--group', nargs='+', default=None, choices=sorted({item.group for item in CASES}), help='只執行這些分組')
+    parser.add_argument('-k', dest='pattern', default=None, help='只執行名稱（group.case）符合此正規表示式的項目')
+    parser.add_argument('--repeat', type=int, default=5, help='每個項目的重複次數')
+    parser.add_argument('--seed', type=int, default=0, help='合成資料亂數種子')
+    parser.add_argument('--no-memory', action='store_true', help='不量測峰值記憶體')
+    parser.add_argument('--no-db', action='store_true', help='略過需要替身資料庫的 loader 項目')
+    parser.add_argument('--roc', nargs='*', default=[], metavar='TABLE', help='替身資料庫中使用民國年日期的資料表，如 --roc price dealer')
+    parser.add_argument('--output', default=None, help='報告路徑（.json 或 .csv）')
+    parser.add_argument('--compare', default=None, metavar='BASELINE', help='與基準報告比較，有退化時結束碼為 1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='退化門檻（比例），預設 0.2')
+    parser.add_argument('--list', action='store_true', help='列出所有項目後結束')
+    parser.add_argument('--verbose', action='store_true', help='保留 api 的查詢與警告輸出')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for item in CASES:
+            print(f"{item.full_name}{'  (db)' if item.db else ''}")
+        return 0
+
+    results = run_benchmarks(scales=args.scale, groups=args.group, pattern=args.pattern, repeat=args.repeat, seed=args.seed,
+                             memory=not args.no_memory, db=not args.no_db, roc_tables=args.roc, verbose=args.verbose)
+    if args.output:
+        save_report(results, args.output)
+        print(f"報告已儲存：{args.output}")
+    failed = results[results['error'] != '']
+    if not failed.empty:
+        print(f"{len(failed)} 個項目失敗：{list(failed['group'] + '.' + failed['case'])}")
+    if args.compare:
+        report = compare(results, load_report(args.compare), threshold=args.threshold)
+        regressions = report[report['regression']]
+        print(f"與 {args.compare} 比較：{len(report)} 個共同項目，{len(regressions)} 個退化（門檻 {args.threshold:.0%}）")
+        for _, row in regressions.iterrows():
+            print(f"  [{row['scale']}] {row['group']}.{row['case']}: {row['median_ms_base']:.2f} -> {row['median_ms']:.2f} ms "
+                  f"(x{row['time_ratio']:.2f})，{row['peak_mb_base']:.2f} -> {row['peak_mb']:.2f} MB (x{row['memory_ratio']:.2f})")
+        if not regressions.empty:
+            return 1
+    return 1 if not failed.empty else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
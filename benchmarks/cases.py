@@ -0,0 +1,241 @@
+"""
+cases.py - 基準測試項目
+
+每個項目以 @case(group) 註冊，函式接收 SyntheticMarket，在量測外完成資料準備後，回傳被量測的無參數呼叫：
+
+    @case('indicator')
+    def sma_60(market):
+        close = market.pivot('收盤價')
+        return lambda: indicator.sma_pivot_df(close, 60)
+
+db=True 的項目經 process_df 查詢 SQLite 替身資料庫（由 runner 在 SQLiteStandIn.install() 內執行）。
+"""
+import re
+from typing import Callable, List, Sequence
+from api import alignment, backtest, dashboard, filter as pivot_filter, indicator, process_df, screen
+from api.dealer import DealerRollup
+
+MA_LIST = [5, 10, 20, 60, 120, 240]
+
+
+class Case:
+    """
+    一個基準項目。
+
+    參數：
+        group (str): 分組（loader、indicator、dashboard、filter、screen、alignment、dealer、backtest）
+        name (str): 項目名稱
+        setup (Callable): setup(market) 回傳被量測的無參數呼叫
+        db (bool): 是否需要替身資料庫
+    """
+
+    def __init__(self, group: str, name: str, setup: Callable, db: bool = False):
+        self.group = group
+        self.name = name
+        self.setup = setup
+        self.db = db
+
+    @property
+    def full_name(self) -> str:
+        return f'{self.group}.{self.name}'
+
+    def __repr__(self) -> str:
+        return f'Case({self.full_name!r})'
+
+
+CASES: List[Case] = []
+
+
+def case(group: str, name: str = None, db: bool = False):
+    """
+    註冊基準項目的 decorator，name 預設為函式名稱。
+    """
+    def decorator(setup: Callable) -> Callable:
+        CASES.append(Case(group, name or setup.__name__, setup, db))
+        return setup
+    return decorator
+
+
+def select_cases(groups: Sequence[str] = None, pattern: str = None, db: bool = True) -> List[Case]:
+    """
+    依分組、名稱正規表示式篩選項目；db=False 時排除需要資料庫的項目。
+    """
+    regex = re.compile(pattern) if pattern else None
+    return [item for item in CASES
+            if (not groups or item.group in groups)
+            and (regex is None or regex.search(item.full_name))
+            and (db or not item.db)]
+
+
+### loader：process_df 經 SQLite 替身的完整查詢路徑
+@case('loader', db=True)
+def get_db_pivot_panel_ohlcv(market):
+    date_range_str = market.date_range_str()
+    return lambda: process_df.get_db_pivot_panel('price', date_range_str, value_names=['開盤價', '最高價', '最低價', '收盤價', '成交股數'])
+
+
+@case('loader', db=True)
+def get_db_pivot_df_close(market):
+    date_range_str = market.date_range_str()
+    return lambda: process_df.get_db_pivot_df('price', date_range_str, value_name='收盤價')
+
+
+@case('loader', db=True)
+def get_branch_data(market):
+    date_range_str = market.date_range_str('dealer')
+    return lambda: process_df.get_branch_data(date_range_str, stock_col='stock_id', categorical=True)
+
+
+@case('loader', db=True)
+def get_branch_agg_data_top3(market):
+    date_range_str = market.date_range_str('dealer')
+    return lambda: process_df.get_branch_agg_data(date_range_str, top_per=['stock_id'], top_k=3)
+
+
+@case('loader', db=True)
+def get_monthly_revenue_data(market):
+    date_range_str = market.date_range_str('monthly_revenue')
+    return lambda: process_df.get_monthly_revenue_data(date_range_str)
+
+
+@case('loader', db=True)
+def dealer_rollup_from_db(market):
+    date_range_str = market.date_range_str('dealer')
+    return lambda: DealerRollup.from_db(date_range_str, chunk_size=50_000)
+
+
+### indicator
+@case('indicator')
+def sma_60(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.sma_pivot_df(close, 60)
+
+
+@case('indicator')
+def ema_60(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.ema_pivot_df(close, 60)
+
+
+@case('indicator')
+def wma_20(market):
+    close, volume = market.pivot('收盤價'), market.pivot('成交股數')
+    return lambda: indicator.wma_pivot_df(close, volume, 20)
+
+
+@case('indicator')
+def n_day_high_60(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.n_day_high_pivot_df(close, 60)
+
+
+@case('indicator')
+def multi_sma(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.multi_sma_pivot_df(close, MA_LIST)
+
+
+@case('indicator')
+def multi_n_day_high(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.multi_n_day_high_pivot_df(close, MA_LIST)
+
+
+@case('indicator')
+def k_9(market):
+    close, low, high = market.pivot('收盤價'), market.pivot('最低價'), market.pivot('最高價')
+    return lambda: indicator.k_pivot_df(close, low, high, 9)
+
+
+@case('indicator')
+def macd(market):
+    close = market.pivot('收盤價')
+    return lambda: indicator.macd_pivot_df(close)
+
+
+@case('indicator')
+def sma_60_last_day(market):
+    close = market.pivot('收盤價')
+    dates = [close.index[-1]]
+    return lambda: indicator.sma_at_dates(close, 60, dates)
+
+
+### dashboard
+@case('dashboard')
+def market_breadth(market):
+    close, volume = market.pivot('收盤價'), market.pivot('成交股數')
+    return lambda: dashboard.market_breadth(close, volume, windows=(5, 20, 60))
+
+
+### filter
+@case('filter')
+def golden_alignment(market):
+    ma_pivots = indicator.multi_sma_pivot_df(market.pivot('收盤價'), MA_LIST[:5])
+    return lambda: pivot_filter.golden_alignment_pivot(ma_pivots, MA_LIST[:5])
+
+
+@case('filter')
+def ma_entangled(market):
+    ma_pivots = indicator.multi_sma_pivot_df(market.pivot('收盤價'), MA_LIST[:3])
+    return lambda: pivot_filter.ma_entangled_pivot(ma_pivots, MA_LIST[:3])
+
+
+### screen：以 data 傳入 pivot，只量測運算圖求值
+def _screen_exprs() -> dict:
+    above60 = screen.Close() > screen.SMA(60)
+    criteria = (screen.Volume() > 0.5 * screen.Median(screen.Volume(), 100)) & above60 & (screen.Close() > screen.SMA(120))
+    return {'criteria': criteria, 'above60': above60}
+
+
+def _screen_data(market) -> dict:
+    return {name: market.pivot(name) for name in ('收盤價', '成交股數')}
+
+
+@case('screen')
+def evaluate_series(market):
+    exprs, data = _screen_exprs(), _screen_data(market)
+    return lambda: screen.evaluate(exprs, data=data)
+
+
+@case('screen')
+def evaluate_last_only(market):
+    exprs, data = _screen_exprs(), _screen_data(market)
+    return lambda: screen.evaluate(exprs, data=data, last_only=True)
+
+
+### alignment
+@case('alignment')
+def align_periods_revenue(market):
+    revenue, trading_index = market.pivot('當月營收', 'monthly_revenue'), market.trading_index
+    return lambda: alignment.align_periods(revenue, trading_index, 'M', growth=('yoy', 'mom'))
+
+
+### dealer
+@case('dealer')
+def rollup_top_brokers(market):
+    branch_df = market.branch_df()
+    return lambda: DealerRollup.from_df(branch_df).top_brokers_all(n=5, k=3)
+
+
+### backtest
+def _ma_signal(market):
+    close = market.pivot('收盤價')
+    return (close > indicator.sma_pivot_df(close, 20)).astype(int), close
+
+
+@case('backtest')
+def run_backtest(market):
+    signal, close = _ma_signal(market)
+    return lambda: backtest.run_backtest(signal, close, stop_loss=0.1, take_profit=0.2)
+
+
+@case('backtest')
+def run_backtest_grid_serial(market):
+    signal, close = _ma_signal(market)
+    return lambda: backtest.run_backtest_grid(signal, close, stop_loss_list=[0.05, 0.1, None], take_profit_list=[0.1, 0.2, None], max_workers=1)
+
+
+@case('backtest')
+def run_portfolio_backtest(market):
+    signal, close = _ma_signal(market)
+    return lambda: backtest.run_portfolio_backtest(signal, close, max_holdings=20)
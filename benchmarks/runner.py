@@ -0,0 +1,175 @@
+"""
+runner.py - 執行基準項目、輸出報告、與基準檔比較
+
+- 耗時：先暖機（numba JIT、快取）再重複 repeat 次，以 perf_counter 記錄最小值與中位數
+- 峰值記憶體：另外執行一次並以 tracemalloc 追蹤（numpy / pandas 的配置皆會被記錄），不影響耗時量測
+- 報告：.json（含環境資訊）或 .csv；compare() 以中位數耗時與峰值記憶體找出超過門檻的退化
+
+範例：
+    results = run_benchmarks(scales=('small',), groups=('indicator',))
+    save_report(results, 'bench.json')
+    regressions = compare(results, load_report('baseline.json'), threshold=0.2)
+"""
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import tracemalloc
+import warnings
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Sequence
+import numpy as np
+import pandas as pd
+from benchmarks import cases as bench_cases
+from benchmarks.sqlite_db import SQLiteStandIn
+from benchmarks.synthetic import generate_market
+
+# 規模設定：股票數 x 交易日數，分點資料只取最後 dealer_days 個交易日（每檔每天 10 個分點）
+SCALES = {
+    'small': {'n_stocks': 200, 'n_days': 250, 'dealer_days': 20},
+    'medium': {'n_stocks': 1000, 'n_days': 500, 'dealer_days': 40},
+    'large': {'n_stocks': 2000, 'n_days': 1000, 'dealer_days': 60},
+}
+# 報告欄位
+RESULT_COLUMNS = ['scale', 'n_stocks', 'n_days', 'group', 'case', 'repeat', 'min_ms', 'median_ms', 'peak_mb', 'error']
+MB = 1024 * 1024
+
+
+def measure(func: Callable, repeat: int = 5, warmup: int = 1, memory: bool = True) -> dict:
+    """
+    量測無參數呼叫的耗時與峰值記憶體。
+
+    回傳：
+        dict: {'repeat', 'min_ms', 'median_ms', 'peak_mb'}，memory=False 時 peak_mb 為 NaN
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append((perf_counter() - start) * 1000)
+
+    peak_mb = np.nan
+    if memory:
+        gc.collect()
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+        peak_mb = (peak - base) / MB
+    return {'repeat': repeat, 'min_ms': min(times), 'median_ms': statistics.median(times), 'peak_mb': peak_mb}
+
+
+def run_benchmarks(scales: Sequence[str] = ('small',), groups: Sequence[str] = None, pattern: str = None, repeat: int = 5,
+                   seed: int = 0, memory: bool = True, db: bool = True, roc_tables: Sequence[str] = (), verbose: bool = False) -> pd.DataFrame:
+    """
+    在各規模的合成行情上執行基準項目。
+
+    參數：
+        scales (Sequence[str]): SCALES 的名稱
+        groups (Sequence[str]): 只執行這些分組，預設全部
+        pattern (str): 只執行名稱（group.case）符合此正規表示式的項目
+        repeat (int): 每個項目的重複次數
+        seed (int): 合成資料亂數種子
+        memory (bool): 是否量測峰值記憶體
+        db (bool): 是否執行需要替身資料庫的 loader 項目
+        roc_tables (Sequence[str]): 替身資料庫中使用民國年日期的資料表
+        verbose (bool): True 時保留 api 的查詢/警告輸出
+    回傳：
+        pd.DataFrame: 欄位見 RESULT_COLUMNS，項目失敗時 error 欄記錄例外
+    """
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        raise ValueError(f"未知的規模 {unknown}，可用 {list(SCALES)}")
+    selected = bench_cases.select_cases(groups, pattern, db)
+    rows = []
+    for scale in scales:
+        market = generate_market(seed=seed, **SCALES[scale])
+        n_stocks, n_days, _ = market.shape
+        print(f"[{scale}] {n_stocks} 檔 x {n_days} 日，{len(selected)} 個項目")
+        with ExitStack() as stack:
+            if any(item.db for item in selected):
+                standin = stack.enter_context(SQLiteStandIn(market.db_tables(roc_tables)))
+                stack.enter_context(standin.install())
+            for item in selected:
+                row = {'scale': scale, 'n_stocks': n_stocks, 'n_days': n_days, 'group': item.group, 'case': item.name,
+                       'repeat': 0, 'min_ms': np.nan, 'median_ms': np.nan, 'peak_mb': np.nan, 'error': ''}
+                try:
+                    with ExitStack() as quiet:
+                        if not verbose:
+                            quiet.enter_context(redirect_stdout(io.StringIO()))
+                            quiet.enter_context(warnings.catch_warnings())
+                            warnings.simplefilter('ignore')
+                        func = item.setup(market)
+                        row.update(measure(func, repeat=repeat, memory=memory))
+                except Exception as e:
+                    row['error'] = f'{type(e).__name__}: {e}'
+                rows.append(row)
+                status = row['error'] or f"{row['median_ms']:10.2f} ms  {row['peak_mb']:8.2f} MB"
+                print(f"  {item.full_name:<45} {status}")
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def environment_info() -> dict:
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def save_report(results: pd.DataFrame, path: str) -> None:
+    """
+    儲存報告：副檔名 .csv 存成 CSV，其餘存成 JSON（{'environment': ..., 'results': [...]}）。
+    """
+    if path.endswith('.csv'):
+        results.to_csv(path, index=False, encoding='utf-8-sig')
+        return
+    records = json.loads(results.to_json(orient='records', force_ascii=False))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment_info(), 'results': records}, f, ensure_ascii=False, indent=2)
+
+
+def load_report(path: str) -> pd.DataFrame:
+    """
+    讀取 save_report 產生的 JSON 或 CSV 報告。
+    """
+    if path.endswith('.csv'):
+        results = pd.read_csv(path, encoding='utf-8-sig')
+    else:
+        with open(path, encoding='utf-8') as f:
+            results = pd.DataFrame(json.load(f)['results'], columns=RESULT_COLUMNS)
+    results['error'] = results['error'].fillna('').astype(str)
+    return results
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame, threshold: float = 0.2, min_delta_ms: float = 2.0,
+            min_delta_mb: float = 1.0) -> pd.DataFrame:
+    """
+    與基準報告比較，依 scale + group + case 對齊。
+    中位數耗時增加超過 threshold 比例且超過 min_delta_ms，或峰值記憶體增加超過 threshold 比例且超過 min_delta_mb 時視為退化
+    （絕對門檻避免毫秒級項目的量測雜訊被判為退化）。
+
+    回傳：
+        pd.DataFrame: 每個共同項目一列，含 time_ratio、memory_ratio 與 regression（bool）
+    """
+    keys = ['scale', 'group', 'case']
+    merged = results[keys + ['median_ms', 'peak_mb']].merge(baseline[keys + ['median_ms', 'peak_mb']], on=keys, suffixes=('', '_base'))
+    merged['time_ratio'] = merged['median_ms'] / merged['median_ms_base']
+    merged['memory_ratio'] = merged['peak_mb'] / merged['peak_mb_base']
+    slower = (merged['time_ratio'] > 1 + threshold) & (merged['median_ms'] - merged['median_ms_base'] > min_delta_ms)
+    larger = (merged['memory_ratio'] > 1 + threshold) & (merged['peak_mb'] - merged['peak_mb_base'] > min_delta_mb)
+    merged['regression'] = slower | larger
+    return merged
@@ -0,0 +1,205 @@
+"""
+sqlite_db.py - 以 SQLite 檔案模擬 MariaDB，讓 process_df 的查詢路徑不需正式資料庫即可量測
+
+SQLiteStandIn 提供與 pymysql 相容的最小連線介面（cursor / execute / fetchall / fetchmany / ping / close），
+透過 db_lib.configure_pool(connect_func=...) 接到連線池，process_df 照正式流程組 SQL、偵測民國年、統一欄位名稱與 pivot。
+- %s 佔位符轉為 ?；SHOW TABLES、SHOW COLUMNS FROM 改查 sqlite_master / pragma_table_info
+- 註冊 SUBSTRING_INDEX（月份分組使用）；ROW_NUMBER() OVER 由 SQLite 3.25+ 原生支援
+- SSCursor 串流查詢直接以 SQLite 游標 fetchmany，不會先載入全部結果
+- decimal=True 時浮點欄位以 Decimal 回傳，模擬 MariaDB DECIMAL 欄位在 decimal_to_float 的轉換成本
+
+範例：
+    market = synthetic.generate_market(200, 250)
+    with SQLiteStandIn(market.db_tables()).install():
+        close_pivot = process_df.get_db_pivot_df('price', market.date_range_str(), value_name='收盤價')
+"""
+import io
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from decimal import Decimal
+from typing import Dict, Sequence
+import pandas as pd
+import pymysql
+from api import db_lib, process_df
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 各資料表建立的索引欄位（對應正式資料庫的查詢型態：日期區間、個股 + 日期）
+DEFAULT_INDEXES = {
+    'price': [('date',), ('stock_id', 'date')],
+    'dealer': [('date',), ('股票代號', 'date')],
+    'monthly_revenue': [('date',), ('stock_id', 'date')],
+}
+
+_SHOW_COLUMNS_PATTERN = re.compile(r'^SHOW\s+COLUMNS\s+FROM\s+`(?P<table>[^`]+)`$', re.IGNORECASE)
+
+
+def _substring_index(value, delim, count):
+    # MySQL SUBSTRING_INDEX：count > 0 取前 count 段，count < 0 取後 |count| 段
+    if value is None:
+        return None
+    parts = str(value).split(delim)
+    return delim.join(parts[:count] if count > 0 else parts[count:])
+
+
+class _Cursor:
+    """
+    pymysql cursor 的最小相容版本（一般與 SSCursor 共用，皆直接由 SQLite 游標讀取）。
+    """
+
+    def __init__(self, conn: '_Connection'):
+        self._conn = conn
+        self._cursor = None
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _translate(self, query: str, params) -> tuple:
+        stripped = query.strip()
+        if stripped.upper() == 'SHOW TABLES':
+            return "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name", ()
+        match = _SHOW_COLUMNS_PATTERN.match(stripped)
+        if match:
+            return "SELECT name FROM pragma_table_info(?)", (match.group('table'),)
+        return query.replace('%s', '?'), tuple(params or ())
+
+    def execute(self, query: str, params=None) -> int:
+        sql, args = self._translate(query, params)
+        self._cursor = self._conn.db.execute(sql, args)
+        self.description = self._cursor.description
+        return -1
+
+    def _convert(self, rows: list) -> list:
+        if not self._conn.decimal:
+            return rows
+        return [tuple(Decimal(repr(value)) if isinstance(value, float) else value for value in row) for row in rows]
+
+    def fetchall(self) -> list:
+        return self._convert(self._cursor.fetchall()) if self._cursor is not None else []
+
+    def fetchmany(self, size: int = 1) -> list:
+        return self._convert(self._cursor.fetchmany(size)) if self._cursor is not None else []
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self) -> None:
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+
+
+class _Connection:
+    """
+    pymysql connection 的最小相容版本，每條連線各自開啟 SQLite 檔案（連線池可跨執行緒借用）。
+    """
+
+    def __init__(self, path: str, decimal: bool = False):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.create_function('SUBSTRING_INDEX', 3, _substring_index, deterministic=True)
+        self.decimal = decimal
+        self.open = True
+
+    def cursor(self, cursor_class=None) -> _Cursor:
+        return _Cursor(self)
+
+    def ping(self, reconnect: bool = False) -> None:
+        if not self.open:
+            raise pymysql.err.InterfaceError('連線已關閉')
+
+    def close(self) -> None:
+        if self.open:
+            self.db.close()
+            self.open = False
+
+
+class SQLiteStandIn:
+    """
+    把資料表寫入暫存 SQLite 檔，作為 db_lib 連線池的替身資料庫。
+
+    參數：
+        tables (Dict[str, pd.DataFrame]): {資料表名稱: 長格式 df}，日期欄位需已轉為字串（見 SyntheticMarket.db_tables）
+        path (str): SQLite 檔案路徑，預設建立在暫存目錄，close() 時刪除
+        decimal (bool): 浮點欄位是否以 Decimal 回傳
+        indexes (dict): {資料表: [索引欄位 tuple]}，預設 DEFAULT_INDEXES
+    範例：
+        standin = SQLiteStandIn(market.db_tables(roc_tables=('dealer',)))
+        with standin.install():
+            branch_df = process_df.get_branch_data(market.date_range_str('dealer'), stock_col='stock_id')
+        standin.close()
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], path: str = None, decimal: bool = False,
+                 indexes: Dict[str, Sequence[tuple]] = None):
+        self._tmp_dir = None if path else tempfile.mkdtemp(prefix='bench_db_')
+        self.path = path or os.path.join(self._tmp_dir, 'market.sqlite')
+        self.decimal = decimal
+        indexes = DEFAULT_INDEXES if indexes is None else indexes
+        with sqlite3.connect(self.path) as db:
+            for name, df in tables.items():
+                df.to_sql(name, db, if_exists='replace', index=False)
+                for i, columns in enumerate(indexes.get(name, ())):
+                    column_sql = ', '.join(f'`{column}`' for column in columns)
+                    db.execute(f'CREATE INDEX `idx_{name}_{i}` ON `{name}` ({column_sql})')
+        self.row_counts = {name: len(df) for name, df in tables.items()}
+
+    def connect(self, **connect_kwargs) -> _Connection:
+        """
+        與 pymysql.connect 相同的呼叫方式（連線參數忽略），供 db_lib.configure_pool(connect_func=...) 使用。
+        """
+        return _Connection(self.path, self.decimal)
+
+    @contextmanager
+    def install(self, workdir: str = None):
+        """
+        在 with 區塊內讓 db_lib / process_df 連到此替身資料庫：
+        - 連線池改用 self.connect 建立連線，結束後恢復 pymysql.connect
+        - 工作目錄切到暫存目錄（放入 common/table_common_col_rule.txt），產生欄位對照 json，不覆寫專案內的 json/
+        - 清除資料表結構與日期格式快取，進出時皆不沿用另一個資料庫的偵測結果
+        """
+        old_cwd = os.getcwd()
+        old_connect = db_lib.get_pool().connect_func
+        own_workdir = workdir is None
+        workdir = workdir or tempfile.mkdtemp(prefix='bench_wd_')
+        os.makedirs(os.path.join(workdir, 'common'), exist_ok=True)
+        shutil.copy(os.path.join(REPO_ROOT, db_lib.RULE_PATH), os.path.join(workdir, db_lib.RULE_PATH))
+        os.chdir(workdir)
+        db_lib.configure_pool(connect_func=self.connect)
+        db_lib.invalidate_schema_cache()
+        process_df.invalidate_date_format_cache()
+        try:
+            with redirect_stdout(io.StringIO()):
+                db_lib.save_column_hash()
+            yield self
+        finally:
+            os.chdir(old_cwd)
+            db_lib.configure_pool(connect_func=old_connect or pymysql.connect)
+            db_lib.invalidate_schema_cache()
+            process_df.invalidate_date_format_cache()
+            if own_workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def close(self) -> None:
+        """
+        刪除暫存的 SQLite 檔（指定 path 時保留）。
+        """
+        if self._tmp_dir:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
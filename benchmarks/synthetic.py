@@ -0,0 +1,251 @@
+"""
+synthetic.py - 可重現的合成行情資料
+
+以固定亂數種子產生與正式資料庫相同欄位的長格式資料表：
+- price：stock_id, date, 開盤價, 最高價, 最低價, 收盤價, 成交股數（幾何隨機漫步，單日漲跌幅限制 10%）
+- dealer：股票代號, 股票名稱, date, 分點名稱, 買進張數, 賣出張數, 買進金額, 賣出金額（只產生最後 dealer_days 個交易日）
+- monthly_revenue：stock_id, date（營收月份月初）, 當月營收（含季節性與成長趨勢）
+停牌日、缺漏月份以刪除資料列表示（與正式資料庫相同，pivot 後才成為 NaN），部分股票在區間中途才上市。
+
+範例：
+    market = generate_market(n_stocks=200, n_days=250, seed=0)
+    close_pivot = market.pivot('收盤價')
+    tables = market.db_tables(roc_tables=('dealer',))  # 日期轉成字串，dealer 使用民國年
+"""
+from datetime import date
+from typing import Dict, Sequence
+import numpy as np
+import pandas as pd
+
+# 價格表欄位
+PRICE_COLUMNS = ['開盤價', '最高價', '最低價', '收盤價', '成交股數']
+# 每日漲跌幅上限
+PRICE_LIMIT = 0.1
+# 營收往交易區間前多產生的月數（YoY 需要前 12 個月）
+REVENUE_LEAD_MONTHS = 14
+
+
+def trading_dates(n_days: int, end_date=None) -> pd.DatetimeIndex:
+    """
+    以工作日作為交易日，最後一天為 end_date（預設今天）以前最近的工作日，
+    讓 '-N:-0' 這類相對區間能查到合成資料。
+    """
+    end_date = pd.Timestamp(end_date if end_date is not None else date.today()).normalize()
+    return pd.bdate_range(end=end_date, periods=n_days, name='date')
+
+
+def stock_ids(n_stocks: int) -> list:
+    return [str(1101 + i) for i in range(n_stocks)]
+
+
+def _presence_mask(rng: np.random.Generator, n_days: int, n_stocks: int, nan_ratio: float, listing_ratio: float) -> np.ndarray:
+    # 停牌：隨機刪除 nan_ratio 比例的資料列；新上市：listing_ratio 比例的股票從區間中途開始有資料
+    present = rng.random((n_days, n_stocks)) >= nan_ratio
+    listed = rng.random(n_stocks) < listing_ratio
+    first_day = np.where(listed, rng.integers(0, max(n_days // 2, 1), n_stocks), 0)
+    present &= np.arange(n_days)[:, None] >= first_day
+    return present
+
+
+def generate_price(n_stocks: int = 200, n_days: int = 250, seed: int = 0, nan_ratio: float = 0.01,
+                   listing_ratio: float = 0.05, end_date=None) -> pd.DataFrame:
+    """
+    產生價格長格式資料（price 資料表欄位），date 為 Timestamp。
+
+    參數：
+        n_stocks (int): 股票數
+        n_days (int): 交易日數
+        seed (int): 亂數種子，相同參數產生相同資料
+        nan_ratio (float): 停牌（資料列缺漏）比例
+        listing_ratio (float): 區間中途上市的股票比例
+        end_date: 最後一個交易日的上限，預設今天
+    """
+    rng = np.random.default_rng(seed)
+    dates = trading_dates(n_days, end_date)
+    shape = (n_days, n_stocks)
+    returns = np.clip(rng.normal(0.0003, 0.02, shape), -PRICE_LIMIT, PRICE_LIMIT)
+    base = rng.lognormal(np.log(50), 0.8, n_stocks)
+    close = base * np.exp(np.cumsum(returns, axis=0))
+    prev_close = np.vstack([base[None, :], close[:-1]])
+    open_ = prev_close * (1 + np.clip(rng.normal(0, 0.005, shape), -PRICE_LIMIT, PRICE_LIMIT))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, shape)))
+    volume = np.round(rng.lognormal(np.log(2e6), 1.0, shape) / 1000) * 1000
+    present = _presence_mask(rng, n_days, n_stocks, nan_ratio, listing_ratio)
+
+    day_pos, stock_pos = np.nonzero(present)
+    values = {name: np.round(arr[day_pos, stock_pos], 2)
+              for name, arr in zip(PRICE_COLUMNS, (open_, high, low, close, volume))}
+    return pd.DataFrame({
+        'stock_id': np.asarray(stock_ids(n_stocks), dtype=object)[stock_pos],
+        'date': dates[day_pos],
+        **values,
+    })
+
+
+def generate_dealer(price_df: pd.DataFrame, dealer_days: int = 20, n_branches: int = 300,
+                    brokers_per_day: int = 10, seed: int = 0) -> pd.DataFrame:
+    """
+    依價格資料產生券商分點長格式資料（dealer 資料表欄位），只涵蓋最後 dealer_days 個交易日、有價格的股票日。
+    每檔股票每天有 brokers_per_day 個不重複分點，分點從該股票固定的分點排列中連續取出（模擬主力分點集中）。
+
+    參數：
+        price_df (pd.DataFrame): generate_price 的結果
+        dealer_days (int): 分點資料的交易日數
+        n_branches (int): 全市場分點數
+        brokers_per_day (int): 每檔股票每天的分點數
+        seed (int): 亂數種子
+    """
+    rng = np.random.default_rng(seed + 1)
+    brokers_per_day = min(brokers_per_day, n_branches)
+    days = np.sort(price_df['date'].unique())[-dealer_days:]
+    rows = price_df[price_df['date'].isin(days)]
+    stock_codes, stock_uniques = pd.factorize(rows['stock_id'], sort=True)
+    branch_names = np.array([f'券商{i:04d}' for i in range(n_branches)], dtype=object)
+    # 每檔股票一組固定的分點排列，每天從隨機位置連續取 brokers_per_day 個
+    permutations = np.argsort(rng.random((len(stock_uniques), n_branches)), axis=1)
+    offsets = rng.integers(0, n_branches, len(rows))
+    branch_pos = (offsets[:, None] + np.arange(brokers_per_day)) % n_branches
+    branches = permutations[stock_codes[:, None], branch_pos].ravel()
+
+    n_rows = len(rows) * brokers_per_day
+    repeat = np.repeat(np.arange(len(rows)), brokers_per_day)
+    close = rows['收盤價'].to_numpy()[repeat]
+    buy_lots = rng.integers(0, 200, n_rows).astype(float)
+    sell_lots = rng.integers(0, 200, n_rows).astype(float)
+    stock = rows['stock_id'].to_numpy(dtype=object)[repeat]
+    return pd.DataFrame({
+        '股票代號': stock,
+        '股票名稱': np.char.add('股票', stock.astype(str)).astype(object),
+        'date': rows['date'].to_numpy()[repeat],
+        '分點名稱': branch_names[branches],
+        '買進張數': buy_lots,
+        '賣出張數': sell_lots,
+        '買進金額': np.round(buy_lots * close * 1000),
+        '賣出金額': np.round(sell_lots * close * 1000),
+    })
+
+
+def generate_monthly_revenue(n_stocks: int = 200, n_days: int = 250, seed: int = 0, nan_ratio: float = 0.01,
+                             end_date=None) -> pd.DataFrame:
+    """
+    產生月營收長格式資料（monthly_revenue 資料表欄位），涵蓋交易區間前 REVENUE_LEAD_MONTHS 個月到最後一個完整月份。
+    date 為營收月份的月初；缺漏月份以刪除資料列表示。
+    """
+    rng = np.random.default_rng(seed + 2)
+    dates = trading_dates(n_days, end_date)
+    months = pd.date_range(dates[0] - pd.DateOffset(months=REVENUE_LEAD_MONTHS), dates[-1], freq='MS')[:-1]
+    n_months = len(months)
+    base = rng.lognormal(np.log(5e5), 1.2, n_stocks)
+    trend = np.cumsum(rng.normal(0.005, 0.05, (n_months, n_stocks)), axis=0)
+    season = 0.1 * np.sin(2 * np.pi * (months.month.to_numpy() - 1) / 12)[:, None]
+    revenue = np.round(base * np.exp(trend + season))
+    present = rng.random((n_months, n_stocks)) >= nan_ratio
+    month_pos, stock_pos = np.nonzero(present)
+    return pd.DataFrame({
+        'stock_id': np.asarray(stock_ids(n_stocks), dtype=object)[stock_pos],
+        'date': months[month_pos],
+        '當月營收': revenue[month_pos, stock_pos],
+    })
+
+
+def format_dates(dates, roc: bool = False) -> np.ndarray:
+    """
+    Timestamp 轉成資料庫日期字串：西元 YYYY-MM-DD，roc=True 時為民國 YYY-MM-DD。
+    只對不重複的日期格式化一次。
+    """
+    codes, uniques = pd.factorize(pd.DatetimeIndex(dates))
+    uniques = pd.DatetimeIndex(uniques)
+    if roc:
+        labels = [f'{d.year - 1911:03d}-{d.month:02d}-{d.day:02d}' for d in uniques]
+    else:
+        labels = list(uniques.strftime('%Y-%m-%d'))
+    return np.asarray(labels, dtype=object)[codes]
+
+
+class SyntheticMarket:
+    """
+    一組合成行情資料：長格式資料表與 pivot（同 process_df 的輸出格式）。
+
+    參數：
+        price / dealer / monthly_revenue (pd.DataFrame): 長格式資料表，date 為 Timestamp
+        seed (int): 產生時使用的亂數種子
+    """
+
+    def __init__(self, price: pd.DataFrame, dealer: pd.DataFrame, monthly_revenue: pd.DataFrame, seed: int = 0):
+        self.tables = {'price': price, 'dealer': dealer, 'monthly_revenue': monthly_revenue}
+        self.seed = seed
+        self._pivots = {}
+
+    @property
+    def trading_index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(np.sort(self.tables['price']['date'].unique()), name='date')
+
+    @property
+    def shape(self) -> tuple:
+        """
+        (股票數, 交易日數, 分點資料日數)
+        """
+        price, dealer = self.tables['price'], self.tables['dealer']
+        return price['stock_id'].nunique(), price['date'].nunique(), dealer['date'].nunique()
+
+    def pivot(self, value_name: str, table: str = 'price') -> pd.DataFrame:
+        """
+        index 為日期（DatetimeIndex）、columns 為 stock_id 的 pivot df，同 process_df.get_db_pivot_df。
+        """
+        key = (table, value_name)
+        if key not in self._pivots:
+            pivot_df = self.tables[table].pivot(index='date', columns='stock_id', values=value_name)
+            pivot_df.index = pd.DatetimeIndex(pivot_df.index, name='date')
+            self._pivots[key] = pivot_df.astype(float)
+        return self._pivots[key]
+
+    def branch_df(self, value: str = '金額') -> pd.DataFrame:
+        """
+        分點資料，格式同 process_df.get_branch_data(stock_col='stock_id')：index 為日期，
+        欄位 stock_id, 分點名稱, 買進{value}, 賣出{value}。
+        """
+        dealer = self.tables['dealer']
+        branch_df = dealer[['股票代號', '分點名稱', f'買進{value}', f'賣出{value}']].rename(columns={'股票代號': 'stock_id'})
+        branch_df.index = pd.DatetimeIndex(dealer['date'], name='date')
+        return branch_df
+
+    def date_range_str(self, table: str = 'price') -> str:
+        """
+        涵蓋資料表全部日期的相對區間字串（'-N:-0'），供 process_df 的 date_range_str 使用。
+        """
+        first_day = pd.Timestamp(self.tables[table]['date'].min()).date()
+        return f'-{(date.today() - first_day).days}:-0'
+
+    def db_tables(self, roc_tables: Sequence[str] = ()) -> Dict[str, pd.DataFrame]:
+        """
+        轉成寫入資料庫的格式：date 轉為日期字串，roc_tables 中的資料表使用民國年。
+        """
+        result = {}
+        for name, df in self.tables.items():
+            df = df.copy()
+            df['date'] = format_dates(df['date'], roc=name in roc_tables)
+            result[name] = df
+        return result
+
+
+def generate_market(n_stocks: int = 200, n_days: int = 250, seed: int = 0, nan_ratio: float = 0.01,
+                    listing_ratio: float = 0.05, dealer_days: int = 20, n_branches: int = 300,
+                    brokers_per_day: int = 10, end_date=None) -> SyntheticMarket:
+    """
+    產生一組完整合成行情（價格、分點、月營收），相同參數與種子產生相同資料。
+
+    參數：
+        n_stocks / n_days: 股票數 x 交易日數
+        seed (int): 亂數種子
+        nan_ratio (float): 停牌/缺漏比例
+        listing_ratio (float): 區間中途上市的股票比例
+        dealer_days / n_branches / brokers_per_day: 分點資料日數、全市場分點數、每檔每天分點數
+        end_date: 最後一個交易日的上限，預設今天
+    範例：
+        market = generate_market(1000, 500, seed=42, nan_ratio=0.02)
+    """
+    price = generate_price(n_stocks, n_days, seed, nan_ratio, listing_ratio, end_date)
+    dealer = generate_dealer(price, dealer_days, n_branches, brokers_per_day, seed)
+    revenue = generate_monthly_revenue(n_stocks, n_days, seed, nan_ratio, end_date)
+    return SyntheticMarket(price, dealer, revenue, seed)
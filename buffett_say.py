@@ -1,53 +1,60 @@
 import pandas as pd
-from api import process_df
-from api.indicator import sma_pivot_df
+from api.screen import Close, Volume, SMA, evaluate
+from api.indicator_store import get_default_store
 
 # 參數
+# 目標區間：輸出此區間每天的篩選結果，成交量中位數也以此區間計算；均線所需的回看資料由 screen 自動往前多抓
 trace_last = int(120/5*7)+100
 # trace_last = 3000
 DATE_RANGE_STR = f'-{trace_last}:-0'  # 可依需求調整
 
-# 1. 取得所需 pivot df
-close_pivot = process_df.get_db_pivot_df('price', DATE_RANGE_STR, 'stock_id', '收盤價')
-volume_pivot = process_df.get_db_pivot_df('price', DATE_RANGE_STR, 'stock_id', '成交股數')
-# pe_pivot = process_df.get_db_pivot_df('fundamental', DATE_RANGE_STR, 'stock_id', '本益比')
-# pb_pivot = process_df.get_db_pivot_df('fundamental', DATE_RANGE_STR, 'stock_id', '股價淨值比')
-# yield_pivot = process_df.get_db_pivot_df('fundamental', DATE_RANGE_STR, 'stock_id', '殖利率')
-# eps_pivot = process_df.get_db_pivot_df('fundamental', DATE_RANGE_STR, 'stock_id', 'EPS')
-# mo_revenue_pivot = process_df.get_db_pivot_df('monthly_revenue', DATE_RANGE_STR, 'stock_id', '當月營收')
+# 1. 條件運算式（只建立運算圖，evaluate 時才查詢與計算）
+# pe = Field('本益比', 'fundamental')
+# pb = Field('股價淨值比', 'fundamental')
+# dividend_yield = Field('殖利率', 'fundamental')
+# eps = Field('EPS', 'fundamental')
+# mo_revenue_yoy = Revenue('yoy')  # 月營收年增率，依公告日（次月 10 日）對齊到交易日
 
 # 2. 均線
-sma60  = sma_pivot_df(close_pivot, 60)
-sma120 = sma_pivot_df(close_pivot, 120)
+above_sma60 = Close() > SMA(60)
+above_sma120 = Close() > SMA(120)
 
-# 3. 成交量大於50%（以每檔股票近100日中位數為基準）
-volume_median = volume_pivot.median(axis=0)
-volume_50pct = volume_pivot > (volume_median * 0.5)
+# 3. 成交量大於50%（以每檔股票在整個 DATE_RANGE_STR 區間的中位數為基準，求值後以 pandas 計算）
+volume = Volume()
 
 # 4. EPS > 前季EPS（假設季資料為橫向，若為直向請調整 axis）
-# eps_prev = eps_pivot.shift(1)
-# eps_up = eps_pivot > eps_prev
+# eps_up = eps > eps.shift(1)
 
-# 5. 月營收 > 前年同月（月營收資料 index 為日期，columns 為股票）
-# mo_revenue_prev_year = mo_revenue_pivot.shift(12)
-# mo_revenue_up = mo_revenue_pivot > mo_revenue_prev_year
+# 5. 月營收 > 前年同月（以期別找前年同月，只用已公告的月份）
+# mo_revenue_up = mo_revenue_yoy > 0
+
+# 一次求值：相同的子條件（如 Close() > SMA(60)）只計算一次，所需欄位只查詢一次，均線經磁碟快取
+result = evaluate({
+    'volume': volume,
+    'above_sma60': above_sma60,
+    'above_sma120': above_sma120,
+}, DATE_RANGE_STR, store=get_default_store())
+volume_pivot = result['volume']
+volume_50pct = volume_pivot > (volume_pivot.median(axis=0) * 0.5)
+above_sma60 = result['above_sma60']
+above_sma120 = result['above_sma120']
 
 # 6. 條件篩選
 criteria = (
-    # (pe_pivot < 15) &
-    # (pb_pivot < 2) &
-    # (yield_pivot > 4) &
+    # (pe < 15) &
+    # (pb < 2) &
+    # (dividend_yield > 4) &
     volume_50pct &
-    (close_pivot > sma60) &
-    (close_pivot > sma120) #&
+    above_sma60 &
+    above_sma120 #&
     # eps_up &
     # mo_revenue_up
 )
 
 # Debug: 各條件每天有多少股票符合
 print("volume_50pct 每天家數:", volume_50pct.sum(axis=1).tail())
-print("close_pivot > sma60 每天家數:", (close_pivot > sma60).sum(axis=1).tail())
-print("close_pivot > sma120 每天家數:", (close_pivot > sma120).sum(axis=1).tail())
+print("close_pivot > sma60 每天家數:", above_sma60.sum(axis=1).tail())
+print("close_pivot > sma120 每天家數:", above_sma120.sum(axis=1).tail())
 # print("mo_revenue_up 每天家數:", mo_revenue_up.sum(axis=1).tail())
 
 # 7. 挑選結果
@@ -61,8 +68,8 @@ print(selected_stocks[selected_stocks].index.tolist())
 
 # Debug: 最後一天各條件分別符合的股票
 print("\n最後一天 volume_50pct:", volume_50pct.loc[latest_date][volume_50pct.loc[latest_date]].index.tolist())
-print("最後一天 close_pivot > sma60:", (close_pivot > sma60).loc[latest_date][(close_pivot > sma60).loc[latest_date]].index.tolist())
-print("最後一天 close_pivot > sma120:", (close_pivot > sma120).loc[latest_date][(close_pivot > sma120).loc[latest_date]].index.tolist())
+print("最後一天 close_pivot > sma60:", above_sma60.loc[latest_date][above_sma60.loc[latest_date]].index.tolist())
+print("最後一天 close_pivot > sma120:", above_sma120.loc[latest_date][above_sma120.loc[latest_date]].index.tolist())
 # print("最後一天 mo_revenue_up:", mo_revenue_up.loc[latest_date][mo_revenue_up.loc[latest_date]].index.tolist())
 
 # 若需完整篩選表，請取消以下註解
@@ -16,10 +16,12 @@ def example_strategy():
     """
     
     
-    close_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='收盤價')
-    volume_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='成交股數')/1000
-    high_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='最高價')
-    low_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='最低價')
+    # 一次查詢取回同一張表的多個欄位
+    panel = process_df.get_db_pivot_panel(table_name='price', date_range_str=DATE_RANGE_STR, value_names=['收盤價', '成交股數', '最高價', '最低價'])
+    close_pivot = panel['收盤價']
+    volume_pivot = panel['成交股數']/1000
+    high_pivot = panel['最高價']
+    low_pivot = panel['最低價']
 
     # 1. SMA
     sma5 = sma_pivot_df(close_pivot, 5)
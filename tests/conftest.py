@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 讓 tests/ 下的測試可直接 import api、benchmarks（不需安裝成套件）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from api import alignment
+
+
+def test_align_periods_fills_value_but_not_growth():
+    months = pd.date_range('2023-01-01', periods=15, freq='MS')
+    revenue = pd.DataFrame({'2330': np.arange(100.0, 115.0), '2317': np.arange(200.0, 215.0)}, index=months)
+    # 2317 最後一期（2024-03）未公告營收
+    revenue.loc[months[-1], '2317'] = np.nan
+    trading_index = pd.bdate_range('2024-01-02', '2024-05-31')
+    aligned = alignment.align_periods(revenue, trading_index, 'M', growth=('yoy', 'mom'))
+
+    # 2024-03 營收於 2024-04-10 公告，隔一個交易日可用
+    after = trading_index[trading_index > '2024-04-10']
+    assert (aligned['value'].loc[after, '2330'] == 114.0).all()
+    # 數值沿用前一期（2024-02）
+    assert (aligned['value'].loc[after, '2317'] == 213.0).all()
+    # 成長率不補值：2024-03 缺值，不沿用 2024-02 的 yoy / mom
+    assert aligned['yoy'].loc[after, '2317'].isna().all()
+    assert aligned['mom'].loc[after, '2317'].isna().all()
+    np.testing.assert_allclose(aligned['yoy'].loc[after, '2330'], (114.0 - 102.0) / 102.0)
+
+    before = trading_index[(trading_index > '2024-03-11') & (trading_index <= '2024-04-10')]
+    np.testing.assert_allclose(aligned['yoy'].loc[before, '2317'], (213.0 - 201.0) / 201.0)
+    np.testing.assert_allclose(aligned['mom'].loc[before, '2317'], (213.0 - 212.0) / 212.0)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from api import async_process_df, db_lib, process_df, query_builder
+from api.async_process_df import ThreadBackend
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _SQLiteConnection:
+    # get_connection 替身：pymysql 風格的 %s 佔位符轉為 SQLite 的 ?，close 只歸還不關閉資料庫
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.description = None
+
+    def cursor(self, *args):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=None):
+        self._cursor = self.db.execute(query.replace('%s', '?'), tuple(params or ()))
+        self.description = self._cursor.description
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        pass
+
+
+def price_rows(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2025-03-03', periods=15)]
+    stocks = ['2330', '2317', '2454', '1101']
+    rows = [(sid, d, float(np.round(rng.uniform(50, 900), 2)), float(rng.integers(1_000, 90_000))) for d in dates for sid in stocks]
+    return pd.DataFrame(rows, columns=['stock_id', 'date', '收盤價', '成交股數'])
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    price_rows().to_sql('price', db, index=False)
+    # 欄位規則與對照 json 放在暫存工作目錄，不覆寫專案內的 json/
+    (tmp_path / 'common').mkdir()
+    shutil.copy(os.path.join(REPO_ROOT, db_lib.RULE_PATH), tmp_path / db_lib.RULE_PATH)
+    (tmp_path / db_lib.JSON_DIR).mkdir()
+    (tmp_path / db_lib.COMMON_HASH_PATH).write_text(json.dumps({'stock_id': ['stock_id', '股票代號']}), encoding='utf-8')
+    (tmp_path / db_lib.RAW_HASH_PATH).write_text(json.dumps({'price': {col: col for col in price_rows().columns}}), encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    catalog = db_lib.SchemaCatalog(ttl=3600)
+    catalog.load_snapshot()
+    monkeypatch.setattr(db_lib, 'schema_catalog', catalog)
+    monkeypatch.setattr(query_builder, 'schema_catalog', catalog)
+    for module in (process_df, async_process_df):
+        monkeypatch.setattr(module, 'get_connection', lambda: _SQLiteConnection(db))
+    query_builder.clear_sql_cache()
+    process_df.invalidate_date_format_cache()
+    yield db
+    query_builder.clear_sql_cache()
+    process_df.invalidate_date_format_cache()
+    db.close()
+
+
+@pytest.mark.parametrize('constraint_str, filters', [
+    ('', None),
+    ('stock_id in 2330,2317', None),
+    ('收盤價 between 100 and 600', [('stock_id', '!=', '1101')]),
+])
+def test_async_get_db_df_matches_sync(sqlite_db, constraint_str, filters):
+    kwargs = dict(table_name='price', date_range_str='2025-03-05:2025-03-18', column_str='stock_id, 收盤價, 成交股數',
+                  constraint_str=constraint_str, filters=filters)
+    expected = process_df.get_db_df(**kwargs)
+    result = asyncio.run(async_process_df.get_db_df(**kwargs, backend=ThreadBackend()))
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_async_pivot_panel_matches_sync(sqlite_db):
+    kwargs = dict(table_name='price', date_range_str='2025-03-03:2025-03-21', value_names=['收盤價', '成交股數'])
+    expected = process_df.get_db_pivot_panel(**kwargs)
+    backend = ThreadBackend()
+
+    async def gather():
+        return await asyncio.gather(
+            async_process_df.get_db_pivot_panel(**kwargs, backend=backend),
+            async_process_df.get_db_pivot_df('price', '2025-03-03:2025-03-21', value_name='收盤價', backend=backend),
+        )
+
+    panel, close_pivot = asyncio.run(gather())
+    assert list(panel) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(panel[name], expected[name])
+    pd.testing.assert_frame_equal(close_pivot, process_df.get_db_pivot_df('price', '2025-03-03:2025-03-21', value_name='收盤價'))
+
+
+def test_thread_backend_reports_missing_connection(monkeypatch):
+    # 連線池取不到連線時 get_connection 回傳 None，應得到明確的錯誤而非 AttributeError
+    monkeypatch.setattr(async_process_df, 'get_connection', lambda: None)
+    with pytest.raises(ConnectionError, match='資料庫連線'):
+        asyncio.run(ThreadBackend().fetch('SELECT 1', ()))
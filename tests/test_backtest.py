@@ -0,0 +1,176 @@
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pytest
+from api import backtest
+
+PARAMS = [
+    dict(stop_loss=None, take_profit=None, trailing_stop=None),
+    dict(stop_loss=0.05, take_profit=None, trailing_stop=None),
+    dict(stop_loss=None, take_profit=0.1, trailing_stop=None),
+    dict(stop_loss=None, take_profit=None, trailing_stop=0.08),
+    dict(stop_loss=0.05, take_profit=0.1, trailing_stop=0.08),
+]
+
+
+def _kernels():
+    kernels = [pytest.param(backtest._backtest_kernel_numpy, id='numpy')]
+    if backtest.numba is not None:
+        kernels.append(pytest.param(backtest.numba.njit(backtest._backtest_kernel_loop), id='numba'))
+    else:
+        kernels.append(pytest.param(None, id='numba', marks=pytest.mark.skip(reason='未安裝 numba')))
+    return kernels
+
+
+def synthetic_inputs(n_dates: int = 150, n_stocks: int = 20, seed: int = 0):
+    # 隨機收盤價（含 NaN 缺漏）與買進訊號（含 NaN）
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_dates, freq='B')
+    stocks = [str(1000 + i) for i in range(n_stocks)]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_stocks)), axis=0))
+    close[rng.random((n_dates, n_stocks)) < 0.03] = np.nan
+    signal = (rng.random((n_dates, n_stocks)) < 0.7).astype(float)
+    signal[rng.random((n_dates, n_stocks)) < 0.02] = np.nan
+    return pd.DataFrame(signal, index=dates, columns=stocks), pd.DataFrame(close, index=dates, columns=stocks)
+
+
+def assert_same(left, right):
+    if isinstance(left, pd.Series):
+        pd.testing.assert_series_equal(left, right)
+    else:
+        pd.testing.assert_frame_equal(left, right)
+
+
+@pytest.mark.parametrize('kernel', _kernels())
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('params', PARAMS, ids=lambda p: ','.join(f'{k}={v}' for k, v in p.items() if v is not None) or 'none')
+def test_array_engine_matches_loop(monkeypatch, kernel, seed, params):
+    buy_signal, close_pivot = synthetic_inputs(seed=seed)
+    monkeypatch.setattr(backtest, '_run_kernel', kernel)
+    perf_a, returns_a, exit_a = backtest.run_backtest(buy_signal, close_pivot, engine='array', **params)
+    perf_l, returns_l, exit_l = backtest.run_backtest(buy_signal, close_pivot, engine='loop', **params)
+    for result_array, result_loop in zip((perf_a, returns_a, exit_a), (perf_l, returns_l, exit_l)):
+        assert_same(result_array, result_loop)
+
+
+def _summary_from_run_backtest(returns: pd.DataFrame) -> dict:
+    # 由 run_backtest 的每筆出場報酬計算與 run_backtest_grid 相同的摘要
+    trade_returns = returns.to_numpy()[returns.notna().to_numpy()]
+    return {
+        'n_trades': trade_returns.size,
+        'win_rate': (trade_returns > 0).mean(),
+        'mean_return': trade_returns.mean(),
+        'median_return': np.median(trade_returns),
+        'max_return': trade_returns.max(),
+        'min_return': trade_returns.min(),
+        'mean_perf': returns.max(skipna=True).dropna().mean(),
+    }
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_grid_matches_run_backtest(monkeypatch, max_workers):
+    signal, close = synthetic_inputs(n_dates=80, n_stocks=8, seed=6)
+    created = []
+    to_shared = backtest._to_shared
+
+    def recording(array):
+        shm, spec = to_shared(array)
+        created.append(shm.name)
+        return shm, spec
+
+    monkeypatch.setattr(backtest, '_to_shared', recording)
+    result = backtest.run_backtest_grid(signal, close, stop_loss_list=[None, 0.05], take_profit_list=[None, 0.1],
+                                        trailing_stop_list=[None, 0.08], max_workers=max_workers, chunk_size=3)
+    assert len(result) == 8
+    for row in result.itertuples(index=False):
+        row = row._asdict()
+        _, returns, _ = backtest.run_backtest(signal, close, row['stop_loss'], row['take_profit'], row['trailing_stop'])
+        expected = _summary_from_run_backtest(returns)
+        assert expected['n_trades'] > 0
+        for key, value in expected.items():
+            assert row[key] == pytest.approx(value, rel=1e-12), (key, row)
+
+    # 多進程時收盤價與訊號各放一塊共享記憶體，結束後皆已釋放
+    assert len(created) == (2 if max_workers > 1 else 0)
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_grid_unlinks_shared_memory_on_error(monkeypatch):
+    signal, close = synthetic_inputs(n_dates=30, n_stocks=4, seed=7)
+    created = []
+    to_shared = backtest._to_shared
+
+    def recording(array):
+        shm, spec = to_shared(array)
+        created.append(shm.name)
+        return shm, spec
+
+    class FailingExecutor:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError('worker 啟動失敗')
+
+    monkeypatch.setattr(backtest, '_to_shared', recording)
+    monkeypatch.setattr(backtest, 'ProcessPoolExecutor', FailingExecutor)
+    with pytest.raises(RuntimeError):
+        backtest.run_backtest_grid(signal, close, stop_loss_list=[0.05, 0.1], max_workers=2)
+    assert len(created) == 2
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_portfolio_single_stock_buy_and_hold():
+    # 單一股票每天持有：報酬等於買進持有報酬扣除第一天的買進手續費
+    _, close = synthetic_inputs(n_dates=120, n_stocks=1, seed=3)
+    close = close.ffill().bfill()
+    signal = pd.DataFrame(1, index=close.index, columns=close.columns)
+    portfolio_df, weights, summary = backtest.run_portfolio_backtest(signal, close, max_holdings=1, fee_rate=0.001425, tax_rate=0.003)
+    price = close.iloc[:, 0]
+    expected = (1 - 0.001425) * price.iloc[-1] / price.iloc[0] - 1
+    assert summary['total_return'] == pytest.approx(expected, rel=1e-12)
+    assert (weights.iloc[:, 0] == 1).all()
+    assert portfolio_df['turnover'].iloc[0] == pytest.approx(1.0)
+    assert portfolio_df['turnover'].iloc[1:].abs().max() < 1e-12
+    np.testing.assert_allclose(portfolio_df['equity'].iloc[1:] / portfolio_df['equity'].iloc[0],
+                               (price / price.iloc[0]).iloc[1:], rtol=1e-12)
+
+
+@pytest.mark.parametrize('fully_invested', [False, True])
+@pytest.mark.parametrize('use_score', [False, True])
+def test_portfolio_max_holdings_caps_positions(fully_invested, use_score):
+    signal, close = synthetic_inputs(seed=4)
+    score = close.pct_change(5) if use_score else None
+    portfolio_df, weights, _ = backtest.run_portfolio_backtest(signal, close, max_holdings=3, score_pivot=score, fully_invested=fully_invested)
+    assert portfolio_df['n_holdings'].max() == 3
+    assert ((weights > 0).sum(axis=1) == portfolio_df['n_holdings']).all()
+    assert (weights.sum(axis=1) <= 1 + 1e-12).all()
+    # 只會持有當天有訊號且有收盤價的股票
+    assert not ((weights > 0) & ~((signal.fillna(0) > 0) & close.notna())).any().any()
+    if use_score:
+        # 入選的股票 score 皆不低於未入選但有訊號的股票
+        eligible = (signal.fillna(0) > 0) & close.notna() & score.notna()
+        chosen_min = score.where(weights > 0).min(axis=1)
+        skipped_max = score.where(eligible & (weights == 0)).max(axis=1)
+        assert (chosen_min.dropna() >= skipped_max.reindex(chosen_min.dropna().index).fillna(-np.inf)).all()
+
+
+def test_portfolio_fee_and_tax_on_turnover():
+    # 價格不變，第 5 天由 A 換到 B：買進收手續費，賣出收手續費 + 證交稅
+    dates = pd.bdate_range('2024-01-01', periods=10)
+    close = pd.DataFrame(100.0, index=dates, columns=['A', 'B'])
+    signal = pd.DataFrame({'A': [1] * 5 + [0] * 5, 'B': [0] * 5 + [1] * 5}, index=dates)
+    fee, tax = 0.001, 0.003
+    portfolio_df, _, summary = backtest.run_portfolio_backtest(signal, close, max_holdings=1, fee_rate=fee, tax_rate=tax)
+    np.testing.assert_allclose(portfolio_df['turnover'], [1, 0, 0, 0, 0, 2, 0, 0, 0, 0])
+    np.testing.assert_allclose(portfolio_df['cost'], [fee, 0, 0, 0, 0, fee + fee + tax, 0, 0, 0, 0])
+    assert summary['total_return'] == pytest.approx((1 - fee) * (1 - 2 * fee - tax) - 1)
+
+
+def test_portfolio_sharpe_uses_mean_daily_return():
+    signal, close = synthetic_inputs(seed=5)
+    portfolio_df, _, summary = backtest.run_portfolio_backtest(signal, close, max_holdings=5)
+    daily = portfolio_df['daily_return']
+    assert summary['annual_volatility'] == pytest.approx(daily.std(ddof=1) * np.sqrt(252))
+    assert summary['sharpe'] == pytest.approx(daily.mean() * 252 / summary['annual_volatility'])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from api import dashboard
+
+WINDOWS = [1, 5, 20]
+
+
+def synthetic_breadth_inputs(n_dates: int = 120, n_stocks: int = 15, seed: int = 0):
+    # 價格取到 0.5 元檔位，讓持平、同創新高/新低的情況經常出現；含 NaN 缺漏與整段停牌
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_dates, freq='B')
+    stocks = [str(3000 + i) for i in range(n_stocks)]
+    close = np.round(2 * 50 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_dates, n_stocks)), axis=0))) / 2
+    close[rng.random(close.shape) < 0.04] = np.nan
+    close[30:45, 0] = np.nan
+    volume = rng.integers(1, 5_000, close.shape).astype(float)
+    volume[rng.random(volume.shape) < 0.02] = np.nan
+    return (pd.DataFrame(close, index=dates, columns=stocks),
+            pd.DataFrame(volume, index=dates, columns=stocks))
+
+
+def assert_count_equal(left: pd.Series, right: pd.Series):
+    pd.testing.assert_series_equal(left.astype(float), right.astype(float), check_names=False)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_market_breadth_matches_individual_functions(seed):
+    close, volume = synthetic_breadth_inputs(seed=seed)
+    breadth = dashboard.market_breadth(close, volume, windows=WINDOWS, ma_types=['sma', 'ema', 'wma'])
+    assert_count_equal(breadth['總家數'], dashboard.get_total_count_per_date(close))
+    assert_count_equal(breadth['上漲家數'], dashboard.get_close_above_count(close))
+    assert_count_equal(breadth['下跌家數'], dashboard.get_close_below_count(close))
+    assert_count_equal(breadth['持平家數'], dashboard.get_close_flat_count(close))
+    for n in WINDOWS:
+        assert_count_equal(breadth[f'{n}日新高家數'], dashboard.count_n_day_high(close, n))
+        assert_count_equal(breadth[f'{n}日新低家數'], dashboard.count_n_day_low(close, n))
+        # tool_dashboard.py 原本逐一呼叫 count_above_ma 的三種均線
+        for ma_type in ('sma', 'ema', 'wma'):
+            assert_count_equal(breadth[f'站上{n}日{ma_type.upper()}家數'], dashboard.count_above_ma(close, volume, n, ma_type=ma_type))
+    assert breadth['持平家數'].iloc[1:].sum() > 0 and breadth['20日新高家數'].iloc[19:].sum() > 0
+
+
+def test_market_breadth_aligns_volume_to_close():
+    close, volume = synthetic_breadth_inputs(seed=2)
+    # 成交量欄位順序不同、多一檔股票、少最後兩天
+    misaligned = volume[close.columns[::-1]].iloc[:-2].assign(**{'9999': 1.0})
+    breadth = dashboard.market_breadth(close, misaligned, windows=[5], ma_types=['wma'])
+    aligned_volume = misaligned.reindex_like(close)
+    expected = dashboard.market_breadth(close, aligned_volume, windows=[5], ma_types=['wma'])
+    pd.testing.assert_frame_equal(breadth, expected)
+    assert breadth.index.equals(close.index)
+    assert_count_equal(breadth['站上5日WMA家數'], dashboard.count_above_ma(close, aligned_volume, 5, ma_type='wma'))
+    # 缺成交量的最後兩天 WMA 仍以視窗內有成交量的日期計算
+    assert breadth['站上5日WMA家數'].iloc[-2:].notna().all()
+
+
+def test_market_breadth_requires_volume_for_wma():
+    close, _ = synthetic_breadth_inputs()
+    with pytest.raises(ValueError):
+        dashboard.market_breadth(close, windows=[5], ma_types=['wma'])
+    with pytest.raises(ValueError):
+        dashboard.market_breadth(close, windows=[5], ma_types=['vwap'])
@@ -0,0 +1,54 @@
+import gc
+from api.db_lib import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+def make_pool(max_size=2):
+    created = []
+
+    def connect(**kwargs):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+    return ConnectionPool(max_size=max_size, acquire_timeout=0.1, connect_func=connect), created
+
+
+def test_unclosed_connection_releases_slot_when_collected():
+    pool, created = make_pool(max_size=1)
+    conn = pool.acquire()
+    del conn
+    gc.collect()
+    # 名額已歸還，可再借出；被回收的連線直接關閉，不放回閒置清單
+    pool.acquire().close()
+    assert not created[0].open
+    assert pool.stats()['created'] == 2
+
+
+def test_closed_pool_closes_returned_connections():
+    pool, created = make_pool()
+    idle_conn = pool.acquire()
+    borrowed = pool.acquire()
+    idle_conn.close()
+    pool.close()
+    assert not created[0].open
+    borrowed.close()
+    assert not created[1].open
+    assert pool.stats()['idle'] == 0
+
+
+def test_release_reuses_idle_connection():
+    pool, created = make_pool()
+    pool.acquire().close()
+    pool.acquire().close()
+    assert len(created) == 1
+    assert created[0].open
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+from api.dealer import BROKER_COL, DealerRollup
+
+NET_COL = '買賣超金額'
+
+
+def branch_rows(n_dates: int = 12, n_stocks: int = 6, n_brokers: int = 15, per_day: int = 5, seed: int = 0) -> pd.DataFrame:
+    # 隨機分點資料：每檔每天 per_day 筆，含同日重複的股票 x 分點、缺值與中途才出現的股票
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2025-03-03', periods=n_dates, name='date')
+    stocks = [str(2300 + i) for i in range(n_stocks)]
+    brokers = [f'分點{i:02d}' for i in range(n_brokers)]
+    rows = []
+    for d_i, d in enumerate(dates):
+        for s_i, sid in enumerate(stocks):
+            if s_i == n_stocks - 1 and d_i < n_dates // 2:
+                continue
+            for broker in rng.choice(brokers, per_day):
+                rows.append((d, sid, broker, rng.uniform(0, 1000), rng.uniform(0, 1000)))
+    df = pd.DataFrame(rows, columns=['date', 'stock_id', BROKER_COL, '買進金額', '賣出金額']).set_index('date')
+    df.iloc[rng.choice(len(df), len(df) // 50, replace=False), df.columns.get_loc('買進金額')] = np.nan
+    return df
+
+
+def expected_totals(branch_df: pd.DataFrame, n: int = None) -> pd.Series:
+    # pandas groupby 版本：近 n 個（有資料的）交易日各股票 x 分點的累積買賣超
+    df = branch_df.assign(**{NET_COL: branch_df['買進金額'] - branch_df['賣出金額']}).dropna(subset=[NET_COL])
+    if n is not None:
+        dates = df.index.unique().sort_values()
+        df = df[df.index >= dates[max(len(dates) - n, 0)]]
+    return df.groupby(['stock_id', BROKER_COL])[NET_COL].sum()
+
+
+def rollup_totals(rollup: DealerRollup, n: int = None) -> pd.Series:
+    index = pd.MultiIndex.from_arrays([rollup.stocks.to_numpy()[rollup.pair_stock], rollup.brokers.to_numpy()[rollup.pair_broker]],
+                                      names=['stock_id', BROKER_COL])
+    return pd.Series(rollup.rolling_net(n), index=index, name=NET_COL)
+
+
+def chunks(df: pd.DataFrame, cuts: list) -> list:
+    bounds = [0] + cuts + [len(df)]
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def assert_ranked(result: pd.Series, ref: pd.Series, k: int, ascending: bool = False) -> None:
+    # 名次內的數值依序相同，且每個名稱的數值正確（同值並列時名稱順序不限）
+    top = ref.sort_values(ascending=ascending, kind='stable').head(k)
+    np.testing.assert_allclose(result.to_numpy(), top.to_numpy(), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(ref.loc[result.index].to_numpy(), result.to_numpy(), rtol=1e-9, atol=1e-6)
+    assert result.index.is_unique
+
+
+def check_queries(rollup: DealerRollup, seen: pd.DataFrame, n_list=(None, 1, 3, 5), k: int = 3) -> None:
+    for n in n_list:
+        # 未在視窗內出現的組合累積值為 0
+        expected = expected_totals(seen, n)
+        totals = rollup_totals(rollup, n)
+        assert set(expected.index) <= set(totals.index)
+        expected = expected.reindex(totals.index, fill_value=0.0)
+        np.testing.assert_allclose(totals.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-6)
+
+        for stock_id in rollup.stocks:
+            ref = expected.xs(stock_id, level='stock_id')
+            for largest in (True, False):
+                top = rollup.top_brokers(stock_id, n=n, k=k, largest=largest)
+                assert_ranked(top.set_index(BROKER_COL)[NET_COL], ref, k, ascending=not largest)
+
+        by_broker = expected.groupby(level=BROKER_COL)
+        ref = pd.DataFrame({NET_COL: by_broker.sum(), '買超檔數': by_broker.apply(lambda s: int((s > 0).sum())),
+                            '賣超檔數': by_broker.apply(lambda s: int((s < 0).sum()))})
+        result = rollup.accumulating_brokers(n=n, k=5)
+        assert_ranked(result[NET_COL], ref[NET_COL], 5)
+        pd.testing.assert_frame_equal(result[['買超檔數', '賣超檔數']], ref.loc[result.index, ['買超檔數', '賣超檔數']])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_incremental_appends_match_groupby(seed):
+    df = branch_rows(seed=seed)
+    day_sizes = df.groupby(level='date').size().cumsum().tolist()
+    # 切點包含整天邊界與同一天中間（分批讀取跨批）
+    cuts = sorted({day_sizes[0], day_sizes[2] + 7, day_sizes[3] + 1, day_sizes[5], day_sizes[8] - 3, day_sizes[9] + 11})
+    rollup = DealerRollup()
+    seen = df.iloc[:0]
+    for chunk in chunks(df, cuts):
+        rollup.append(chunk)
+        seen = df.iloc[:len(seen) + len(chunk)]
+        check_queries(rollup, seen)
+    assert len(rollup.dates) == df.index.nunique()
+
+
+def test_from_df_matches_incremental():
+    df = branch_rows(seed=3)
+    incremental = DealerRollup()
+    for chunk in chunks(df, [40, 41, 150, 333]):
+        incremental.append(chunk)
+        incremental.rolling_net(3)
+    whole = DealerRollup.from_df(df)
+    pd.testing.assert_series_equal(rollup_totals(incremental, 3).sort_index(), rollup_totals(whole, 3).sort_index(), rtol=1e-9)
+
+
+def test_append_rejects_earlier_dates():
+    df = branch_rows(seed=4)
+    rollup = DealerRollup.from_df(df[df.index >= df.index[100]])
+    with pytest.raises(ValueError):
+        rollup.append(df.iloc[:10])
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from api import filter as pivot_filter, indicator
+
+
+def synthetic_ohlcv(n_dates: int = 80, n_stocks: int = 12, seed: int = 0, nan_ratio: float = 0.05):
+    # 隨機 OHLCV pivot，含隨機 NaN 缺漏與整段停牌
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=n_dates, freq='B')
+    columns = [str(1101 + i) for i in range(n_stocks)]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_stocks)), axis=0))
+    high = close * (1 + rng.random((n_dates, n_stocks)) * 0.02)
+    low = close * (1 - rng.random((n_dates, n_stocks)) * 0.02)
+    volume = rng.integers(1000, 10000, (n_dates, n_stocks)).astype(float)
+    gaps = rng.random((n_dates, n_stocks)) < nan_ratio
+    gaps[20:26, 0] = True
+    frames = {}
+    for name, values in (('close', close), ('high', high), ('low', low), ('volume', volume)):
+        values = values.copy()
+        values[gaps] = np.nan
+        frames[name] = pd.DataFrame(values, index=index, columns=columns)
+    return frames
+
+
+CASES = {
+    'sma': (lambda d: indicator.IncrementalSMA, {'n': 10}, ('close',), lambda d: indicator.sma_pivot_df(d['close'], 10)),
+    'ema': (lambda d: indicator.IncrementalEMA, {'n': 10}, ('close',), lambda d: indicator.ema_pivot_df(d['close'], 10)),
+    'wma': (lambda d: indicator.IncrementalWMA, {'n': 10}, ('close', 'volume'), lambda d: indicator.wma_pivot_df(d['close'], d['volume'], 10)),
+    'high': (lambda d: indicator.IncrementalNDayHigh, {'n': 10}, ('close',), lambda d: indicator.n_day_high_pivot_df(d['close'], 10)),
+    'low': (lambda d: indicator.IncrementalNDayLow, {'n': 10}, ('close',), lambda d: indicator.n_day_low_pivot_df(d['close'], 10)),
+    'k': (lambda d: indicator.IncrementalK, {'n': 9}, ('close', 'low', 'high'), lambda d: indicator.k_pivot_df(d['close'], d['low'], d['high'], 9)),
+    'williams': (lambda d: indicator.IncrementalWilliams, {'n': 14}, ('close', 'low', 'high'),
+                 lambda d: indicator.williams_pivot_df(d['close'], d['low'], d['high'], 14)),
+    'macd': (lambda d: indicator.IncrementalMACD, {}, ('close',), lambda d: indicator.macd_pivot_df(d['close'])),
+}
+
+
+@pytest.mark.parametrize('name', list(CASES))
+@pytest.mark.parametrize('warmup', [1, 3, 30])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_incremental_matches_batch(name, warmup, seed):
+    # warmup 小於視窗長度時，前幾次 update 仍需為 NaN，之後與批次結果一致
+    data = synthetic_ohlcv(seed=seed)
+    get_cls, params, inputs, batch = CASES[name]
+    expected = batch(data)
+    history = [data[key].iloc[:warmup] for key in inputs]
+    ind = get_cls(data).from_history(*history, **params)
+    rows = [ind.update(*(data[key].iloc[i] for key in inputs)) for i in range(warmup, len(expected))]
+    result = pd.DataFrame(rows)
+    result.index = expected.index[warmup:]
+    result.index.name = expected.index.name
+    result.columns.name = expected.columns.name
+    pd.testing.assert_frame_equal(result, expected.iloc[warmup:].astype(float), check_freq=False, rtol=1e-9, atol=1e-9)
+
+
+def test_incremental_d_from_k():
+    data = synthetic_ohlcv(seed=2)
+    k_batch = indicator.k_pivot_df(data['close'], data['low'], data['high'], 9)
+    expected = indicator.d_pivot_df(k_batch, 3)
+    k_ind = indicator.IncrementalK.from_history(data['close'].iloc[:5], data['low'].iloc[:5], data['high'].iloc[:5], n=9)
+    d_ind = indicator.IncrementalSMA.from_history(k_batch.iloc[:5], n=3)
+    rows = []
+    for i in range(5, len(data['close'])):
+        k_row = k_ind.update(data['close'].iloc[i], data['low'].iloc[i], data['high'].iloc[i])
+        rows.append(d_ind.update(k_row))
+    result = pd.DataFrame(rows, index=expected.index[5:])
+    np.testing.assert_allclose(result.to_numpy(), expected.iloc[5:].to_numpy(dtype=float), rtol=1e-9, atol=1e-9)
+
+
+def flat_tail_pivot(n_dates: int = 400, flat_days: int = 250, seed: int = 0) -> pd.DataFrame:
+    # 前段隨機漲跌，最後 flat_days 天平盤（收盤價不變）
+    rng = np.random.default_rng(seed)
+    columns = ['2330', '2317', '0050']
+    values = np.round(33.35 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, len(columns))), axis=0)), 2)
+    values[-flat_days:] = values[-flat_days - 1]
+    values[5, 1] = np.nan
+    return pd.DataFrame(values, index=pd.date_range('2023-01-02', periods=n_dates, freq='B'), columns=columns)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_multi_sma_flat_window_is_exact(seed):
+    close = flat_tail_pivot(seed=seed)
+    ma_list = [5, 10, 20, 60, 120]
+    tail = close.index[-130:]
+    for mask_head, ma_pivots in ((False, indicator.add_ma_pivots(close, ma_list)), (True, indicator.multi_sma_pivot_df(close, ma_list))):
+        for n in ma_list:
+            expected = close.rolling(n, min_periods=1).mean()
+            if mask_head:
+                expected.iloc[:n-1] = np.nan
+            pd.testing.assert_frame_equal(ma_pivots[f'MA{n}'], expected, check_freq=False, rtol=1e-9)
+            # 平盤期間均線必須與收盤價完全相等，不可有浮點誤差
+            assert (ma_pivots[f'MA{n}'].loc[tail] == close.loc[tail]).all().all()
+        assert pivot_filter.golden_alignment_pivot(ma_pivots, ma_list).loc[tail].all().all()
@@ -0,0 +1,116 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from api import indicator
+
+pytest.importorskip('pyarrow')
+from api.indicator_store import IndicatorStore  # noqa: E402
+
+
+def synthetic_ohlcv(n_dates: int = 300, n_stocks: int = 15, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2023-01-02', periods=n_dates, name='date')
+    columns = pd.Index([str(1101 + i) for i in range(n_stocks)], name='stock_id')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_stocks)), axis=0))
+    close[rng.random(close.shape) < 0.03] = np.nan
+    frames = {
+        'close': close,
+        'high': close * (1 + rng.random(close.shape) * 0.02),
+        'low': close * (1 - rng.random(close.shape) * 0.02),
+        'volume': rng.integers(1000, 10000, close.shape).astype(float),
+    }
+    return {name: pd.DataFrame(values, index=index, columns=columns) for name, values in frames.items()}
+
+
+# (函式, 輸入欄位, 參數)；EMA / MACD 為遞迴指標（lookback=None）
+INDICATORS = {
+    'sma': (indicator.sma_pivot_df, ('close',), {'n': 20}),
+    'wma': (indicator.wma_pivot_df, ('close', 'volume'), {'n': 10}),
+    'high': (indicator.n_day_high_pivot_df, ('close',), {'n': 20}),
+    'k': (indicator.k_pivot_df, ('close', 'low', 'high'), {'n': 9}),
+    'ema': (indicator.ema_pivot_df, ('close',), {'n': 10}),
+    'macd': (indicator.macd_pivot_df, ('close',), {}),
+}
+FIRST = (50, 250)
+# 第二次請求的區間：相同、內縮、同起點內縮、往前/往後/兩端延伸、平移、不重疊
+SECOND = {
+    'same': (50, 250),
+    'shrunk': (100, 200),
+    'shrunk_same_start': (50, 200),
+    'prefix': (20, 250),
+    'suffix': (50, 290),
+    'both': (0, 300),
+    'shifted': (80, 280),
+    'disjoint': (260, 300),
+}
+
+
+def compute(store, name, data, start, stop):
+    func, inputs, params = INDICATORS[name]
+    return store.compute(func, *(data[key].iloc[start:stop] for key in inputs), **params)
+
+
+def direct(name, data, start, stop):
+    func, inputs, params = INDICATORS[name]
+    return func(*(data[key].iloc[start:stop] for key in inputs), **params)
+
+
+@pytest.mark.parametrize('second', list(SECOND))
+@pytest.mark.parametrize('name', list(INDICATORS))
+def test_extended_range_matches_direct(tmp_path, name, second):
+    data = synthetic_ohlcv()
+    store = IndicatorStore(str(tmp_path))
+    pd.testing.assert_frame_equal(compute(store, name, data, *FIRST), direct(name, data, *FIRST))
+    result = compute(store, name, data, *SECOND[second])
+    pd.testing.assert_frame_equal(result, direct(name, data, *SECOND[second]), rtol=1e-12)
+    # 第三次以同區間請求，結果不變
+    pd.testing.assert_frame_equal(compute(store, name, data, *SECOND[second]), result)
+
+
+@pytest.mark.parametrize('name, second, status', [
+    # 內縮但起點不同時，前 n-1 天需以區段外的輸入重算（直接計算時為 NaN），故為 partial
+    ('sma', 'same', 'hit'), ('sma', 'shrunk_same_start', 'hit'), ('sma', 'shrunk', 'partial'), ('sma', 'suffix', 'partial'), ('sma', 'prefix', 'partial'),
+    ('sma', 'both', 'partial'), ('sma', 'disjoint', 'miss'),
+    ('ema', 'shrunk_same_start', 'hit'), ('ema', 'shrunk', 'miss'), ('ema', 'suffix', 'miss'),
+])
+def test_reuse_status(tmp_path, name, second, status):
+    data = synthetic_ohlcv()
+    store = IndicatorStore(str(tmp_path))
+    compute(store, name, data, *FIRST)
+    before = dict(store.stats)
+    compute(store, name, data, *SECOND[second])
+    assert store.stats[status] == before[status] + 1
+
+
+@pytest.mark.parametrize('name', ['sma', 'k', 'ema'])
+def test_revised_input_rows_recomputed(tmp_path, name):
+    # 已存區間中間的輸入被修正時，只沿用修正前的區段，結果仍與直接計算相同
+    data = synthetic_ohlcv()
+    store = IndicatorStore(str(tmp_path))
+    compute(store, name, data, *FIRST)
+    revised = {key: frame.copy() for key, frame in data.items()}
+    revised['close'].iloc[150, 3] *= 1.1
+    pd.testing.assert_frame_equal(compute(store, name, revised, *FIRST), direct(name, revised, *FIRST), rtol=1e-12)
+
+
+def test_lru_eviction(tmp_path):
+    data = synthetic_ohlcv()
+    store = IndicatorStore(str(tmp_path))
+    compute(store, 'sma', data, *FIRST)
+    time.sleep(0.01)
+    compute(store, 'high', data, *FIRST)
+    index = store._read_index()
+    sizes = {entry['func']: entry['bytes'] for entry in index.values()}
+    # 容量只夠放兩個項目
+    store.max_bytes = sum(sizes.values()) + max(sizes.values()) // 2
+    time.sleep(0.01)
+    compute(store, 'sma', data, *FIRST)  # 命中，更新 sma 的最近使用時間
+    time.sleep(0.01)
+    compute(store, 'ema', data, *FIRST)
+
+    index = store._read_index()
+    assert sorted(entry['func'] for entry in index.values()) == ['ema_pivot_df', 'sma_pivot_df']
+    assert sum(entry['bytes'] for entry in index.values()) <= store.max_bytes
+    files = {f for f in (tmp_path).iterdir() if f.name != '_index.json'}
+    assert files == {tmp_path / f'{key}{suffix}' for key in index for suffix in ('.feather', '.hash.npy')}
@@ -0,0 +1,35 @@
+import sqlite3
+import pandas as pd
+import pytest
+from benchmarks.sqlite_db import SQLiteStandIn
+
+pytest.importorskip('pyarrow')
+from api.local_cache import LocalTableCache  # noqa: E402
+
+
+def price_rows(dates, stock_ids):
+    return pd.DataFrame([{'stock_id': sid, 'date': d, '收盤價': 100.0} for d in dates for sid in stock_ids])
+
+
+@pytest.fixture
+def standin():
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=6)]
+    # 最後一天只載入了一部分股票（模擬同步時資料庫仍在寫入）
+    df = pd.concat([price_rows(dates[:-1], ['1101', '2330']), price_rows(dates[-1:], ['1101'])], ignore_index=True)
+    with SQLiteStandIn({'price': df}) as db, db.install():
+        yield db, dates
+
+
+def test_sync_refetches_partially_loaded_last_day(standin, tmp_path):
+    db, dates = standin
+    cache = LocalTableCache(cache_dir=str(tmp_path), stale_after=0)
+    assert cache.sync('price', dates[0]) == 11
+
+    with sqlite3.connect(db.path) as conn:
+        conn.execute("INSERT INTO price VALUES ('2330', ?, 101.0)", (dates[-1],))
+    # 最大日期當天重新抓取並取代，只多出補上的那一筆，不會重複
+    assert cache.sync('price', dates[0]) == 1
+    df = cache.read('price', dates[0], dates[-1])
+    assert len(df) == 12
+    assert not df.duplicated(['date', 'stock_id']).any()
+    assert set(df.loc[df['date'] == dates[-1], 'stock_id']) == {'1101', '2330'}
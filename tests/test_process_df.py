@@ -0,0 +1,193 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from api import db_lib, process_df
+from benchmarks.sqlite_db import SQLiteStandIn
+
+
+@pytest.mark.parametrize('constraint, expected', [
+    ('stock_id = 2330', ('stock_id', '=', '2330')),
+    ("stock_id = '2330'", ('stock_id', '=', '2330')),
+    ('收盤價 >= 100', ('收盤價', '>=', '100')),
+    ('收盤價<100.5', ('收盤價', '<', '100.5')),
+    ('stock_id != 2330', ('stock_id', '!=', '2330')),
+    ('stock_id <> 2330', ('stock_id', '!=', '2330')),
+    ('stock_id in 2330,2317,2454', ('stock_id', 'IN', ['2330', '2317', '2454'])),
+    ("stock_id IN ('2330', '2317')", ('stock_id', 'IN', ['2330', '2317'])),
+    ('stock_id not in (2330)', ('stock_id', 'NOT IN', ['2330'])),
+    ('收盤價 between 100 and 200', ('收盤價', 'BETWEEN', ('100', '200'))),
+    ('收盤價 BETWEEN 100~200', ('收盤價', 'BETWEEN', ('100', '200'))),
+    ('分點名稱 like 凱基%', ('分點名稱', 'LIKE', '凱基%')),
+    ("分點名稱 NOT LIKE '%台北'", ('分點名稱', 'NOT LIKE', '%台北')),
+])
+def test_parse_one_constraint(constraint, expected):
+    assert process_df._parse_one_constraint(constraint) == expected
+
+
+@pytest.mark.parametrize('constraint', ['stock_id 2330', '收盤價 between 100', ''])
+def test_parse_one_constraint_rejects_malformed(constraint):
+    with pytest.raises(ValueError):
+        process_df._parse_one_constraint(constraint)
+
+
+def dealer_rows(seed: int = 0, n_dates: int = 10) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range('2025-03-03', periods=n_dates)]
+    stocks = ['2330', '2317', '2454', '1101']
+    branches = ['凱基台北', '凱基信義', '元大台北', '富邦建國']
+    rows = [(sid, d, branch, float(rng.integers(0, 500)), float(rng.integers(0, 500)))
+            for d in dates for sid in stocks for branch in branches]
+    return pd.DataFrame(rows, columns=['股票代號', 'date', '分點名稱', '買進金額', '賣出金額'])
+
+
+@pytest.fixture
+def standin():
+    df = dealer_rows()
+    with SQLiteStandIn({'dealer': df}) as db, db.install():
+        yield db, df
+
+
+def test_parse_constraint_str_maps_familiar_names(standin):
+    constraints = process_df._parse_constraint_str(
+        'dealer', 'stock_id in 2330,2317:買進金額 between 100 and 300',
+        filters=[('stock_id', 'not in', [1101]), ('分點名稱', 'like', '凱基%'), ('賣出金額', '<>', 0)])
+    assert constraints == [
+        ('股票代號', 'IN', ['2330', '2317']),
+        ('買進金額', 'BETWEEN', ('100', '300')),
+        ('股票代號', 'NOT IN', ['1101']),
+        ('分點名稱', 'LIKE', '凱基%'),
+        ('賣出金額', '!=', 0),
+    ]
+
+
+def test_db_df_query_sql_and_params(standin):
+    constraints = process_df._parse_constraint_str('dealer', 'stock_id in 2330,2317:分點名稱 like 凱基%:買進金額 > 100')
+    sql, params = process_df._db_df_query('dealer', 'date', ['股票代號', '買進金額'], constraints, '2025-03-03', '2025-03-07')
+    assert sql == ("SELECT `股票代號`, `買進金額`, `date` FROM `dealer` WHERE `date` BETWEEN %s AND %s "
+                   "AND `股票代號` IN (%s, %s) AND `分點名稱` LIKE %s AND `買進金額` > %s ORDER BY `date`")
+    assert params == ('2025-03-03', '2025-03-07', '2330', '2317', '凱基%', '100')
+
+
+@pytest.mark.parametrize('constraint_str, filters', [
+    ('stock_id = 2330', None),
+    ('stock_id != 2330:買進金額 >= 250', None),
+    ('stock_id in 2330,2454:賣出金額 < 100', None),
+    ('stock_id not in (2330, 1101)', [('買進金額', 'between', (100, 300))]),
+    ('分點名稱 like 凱基%', [('賣出金額', '>', 400)]),
+    ('分點名稱 not like %台北', [('stock_id', 'in', ['2317'])]),
+    ('買進金額 between 120.5~130', None),
+])
+def test_local_filter_matches_sql(standin, constraint_str, filters):
+    # 本地快取路徑的 pandas 遮罩須與資料庫 WHERE 的結果相同
+    db, df = standin
+    constraints = process_df._parse_constraint_str('dealer', constraint_str, filters)
+    select_cols = ['股票代號', '分點名稱', '買進金額', '賣出金額']
+    sql, params = process_df._db_df_query('dealer', 'date', select_cols, constraints, '2025-03-04', '2025-03-12')
+    with sqlite3.connect(db.path) as conn:
+        expected = pd.read_sql_query(sql.replace('%s', '?'), conn, params=params)
+
+    local = df[(df['date'] >= '2025-03-04') & (df['date'] <= '2025-03-12')]
+    result = process_df._filter_constraints(local, constraints)[select_cols + ['date']]
+    assert len(expected) > 0
+    order = ['date', '股票代號', '分點名稱']
+    pd.testing.assert_frame_equal(result.sort_values(order).reset_index(drop=True),
+                                  expected.sort_values(order).reset_index(drop=True), check_dtype=False)
+
+
+def test_fetch_many_workers_follow_configured_pool(monkeypatch):
+    created = []
+
+    class RecordingExecutor(process_df.ThreadPoolExecutor):
+        def __init__(self, max_workers=None, **kwargs):
+            created.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(process_df, 'ThreadPoolExecutor', RecordingExecutor)
+    old_size = db_lib.get_pool().max_size
+    db_lib.configure_pool(max_size=2)
+    try:
+        specs = [{'name': str(i), 'loader': lambda i=i: i} for i in range(5)]
+        assert process_df.fetch_many(specs) == {str(i): i for i in range(5)}
+    finally:
+        db_lib.configure_pool(max_size=old_size)
+    assert created == [2]
+
+
+@pytest.mark.parametrize('date_bucket', ['month', 'day'])
+def test_local_aggregate_matches_sql(tmp_path, date_bucket):
+    # 本地快取的 pandas 彙總須與資料庫 GROUP BY 的結果相同（日期分組不可影響以日期為對象的彙總）
+    pytest.importorskip('pyarrow')
+    aggregates = {'買超金額': ('sum', '買進金額'), '天數': ('count_distinct', 'date'), '筆數': ('count', '*'),
+                  '最大賣出': ('max', '賣出金額'), '買賣超': ('sum', ('-', '買進金額', '賣出金額'))}
+    kwargs = dict(date_range_str='2025-03-10:2025-04-20', group_by=['stock_id'], aggregates=aggregates,
+                  date_bucket=date_bucket, filters=[('分點名稱', 'like', '凱基%')])
+    with SQLiteStandIn({'dealer': dealer_rows(n_dates=40)}) as db, db.install():
+        expected = process_df.get_db_agg_df('dealer', **kwargs)
+        process_df.enable_local_cache(tables=['dealer'], cache_dir=str(tmp_path))
+        try:
+            result = process_df.get_db_agg_df('dealer', **kwargs)
+        finally:
+            process_df.disable_local_cache()
+    if date_bucket == 'month':
+        assert sorted(expected['天數'].unique()) == [14, 16]
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+class _RocConnection:
+    # 非串流路徑的替身連線：fetchall 依 SQL 字串排序回傳全部資料
+    def __init__(self, rows, columns):
+        self.rows, self.description = rows, [(column,) for column in columns]
+
+    def cursor(self, *args):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def roc_rows(monkeypatch):
+    # 民國 99 -> 100 年跨年資料，SQL ORDER BY date 為字串排序：'100-01-04' 在 '99-12-30' 之前
+    dates = ['100-01-04', '100-01-05', '99-12-30', '99-12-31']
+    rows = [(sid, d, price) for price, d in enumerate(dates) for sid in ('1101', '2330')]
+    columns = ['stock_id', 'date', '收盤價']
+    monkeypatch.setattr(process_df, 'get_connection', lambda: _RocConnection(rows, columns))
+    monkeypatch.setattr(process_df, '_is_roc_table', lambda conn, table_name: True)
+    monkeypatch.setattr(process_df, '_db_df_query', lambda *args: ('SELECT ...', ()))
+    monkeypatch.setattr(process_df, 'reverse_column_mapping', lambda table_name, column: column)
+    monkeypatch.setattr(process_df, 'rename_df_columns', lambda df, table_name: df)
+    monkeypatch.setattr(process_df, '_stream_query', lambda conn, query, params, chunk_size: (
+        pd.DataFrame(rows[i:i + chunk_size], columns=columns) for i in range(0, len(rows), chunk_size)))
+    return rows
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 4, 100])
+def test_chunked_get_db_df_sorted_like_single_query(roc_rows, chunk_size):
+    expected = process_df.get_db_df('price', '2010-12-01:2011-01-31', float_dtype='float64')
+    result = process_df.get_db_df('price', '2010-12-01:2011-01-31', float_dtype='float64', chunk_size=chunk_size)
+    assert result.index.is_monotonic_increasing
+    assert result.index[0] == pd.Timestamp('2010-12-30')
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_chunked_get_db_df_empty_keeps_columns(monkeypatch, roc_rows):
+    monkeypatch.setattr(process_df, '_stream_query', lambda conn, query, params, chunk_size: iter(()))
+    monkeypatch.setattr(process_df, 'get_connection', lambda: _RocConnection([], ['stock_id', 'date', '收盤價']))
+    expected = process_df.get_db_df('price', '2010-12-01:2011-01-31')
+    result = process_df.get_db_df('price', '2010-12-01:2011-01-31', chunk_size=10)
+    assert list(result.columns) == ['stock_id', '收盤價']
+    assert isinstance(result.index, pd.DatetimeIndex) and result.index.name == 'date'
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
@@ -0,0 +1,85 @@
+import time
+import pandas as pd
+import pytest
+from api import profiling
+
+
+def chunk(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame({'stock_id': ['2330'] * n_rows, '收盤價': [600.0] * n_rows})
+
+
+@profiling.instrument(name='test.inner')
+def inner(n_rows: int) -> int:
+    time.sleep(0.01)
+    profiling.record_fetch(chunk(n_rows))
+    return n_rows
+
+
+@profiling.instrument(name='test.outer')
+def outer() -> int:
+    time.sleep(0.01)
+    return inner(3) + inner(4)
+
+
+@profiling.instrument(name='test.stream')
+def stream(n_chunks: int):
+    for _ in range(n_chunks):
+        time.sleep(0.005)
+        profiling.record_fetch(chunk(2))
+        yield chunk(2)
+
+
+@profiling.instrument(name='test.consumer')
+def consumer() -> int:
+    total = 0
+    for df in stream(3):
+        # 呼叫端處理每批資料的時間不算在產生器內
+        time.sleep(0.01)
+        total += len(df)
+    return total
+
+
+def test_nested_calls_propagate_rows_and_split_self_time():
+    with profiling.profile() as prof:
+        assert outer() == 7
+    stats = prof.stats(sort_by=None)
+    expected_bytes = int(chunk(3).memory_usage(index=False, deep=True).sum() + chunk(4).memory_usage(index=False, deep=True).sum())
+    # 列數與大小同時累加到內層與外層
+    assert stats.loc['test.inner', 'rows'] == 7 and stats.loc['test.outer', 'rows'] == 7
+    assert stats.loc['test.inner', 'bytes'] == expected_bytes and stats.loc['test.outer', 'bytes'] == expected_bytes
+    assert stats.loc['test.inner', 'calls'] == 2 and stats.loc['test.outer', 'calls'] == 1
+    for name in ('test.inner', 'test.outer'):
+        assert 0 <= stats.loc[name, 'self_s'] <= stats.loc[name, 'total_s']
+    # 外層自身耗時 = 外層總耗時 - 內層總耗時
+    outer_row, inner_row = stats.loc['test.outer'], stats.loc['test.inner']
+    assert outer_row['self_s'] == pytest.approx(outer_row['total_s'] - inner_row['total_s'], abs=1e-9)
+    assert inner_row['self_s'] == pytest.approx(inner_row['total_s'], abs=1e-9)
+    assert outer_row['self_s'] >= 0.009 and inner_row['total_s'] >= 0.019
+
+    outer_record = next(record for record in prof.calls() if record['name'] == 'test.outer')
+    assert outer_record['rows'] == 7
+    assert 0 <= outer_record['self_s'] <= outer_record['wall_s']
+    assert [record['rows'] for record in prof.calls() if record['name'] == 'test.inner'] == [3, 4]
+
+
+def test_generator_counts_only_time_inside_generator():
+    with profiling.profile() as prof:
+        assert consumer() == 6
+    stats = prof.stats(sort_by=None)
+    assert stats.loc['test.stream', 'rows'] == 6 and stats.loc['test.consumer', 'rows'] == 6
+    assert stats.loc['test.stream', 'calls'] == 1
+    # 產生器約 3 * 5ms，呼叫端另外處理約 3 * 10ms
+    assert stats.loc['test.stream', 'total_s'] < stats.loc['test.consumer', 'total_s'] - 0.025
+    for name in ('test.stream', 'test.consumer'):
+        assert 0 <= stats.loc[name, 'self_s'] <= stats.loc[name, 'total_s']
+
+
+def test_disabled_records_nothing():
+    was_enabled = profiling.is_enabled()
+    profiling.disable()
+    profiling.reset()
+    try:
+        assert outer() == 7
+        assert profiling.calls() == [] and profiling.stats().empty
+    finally:
+        profiling.enable() if was_enabled else None
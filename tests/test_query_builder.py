@@ -0,0 +1,138 @@
+import pytest
+from api import query_builder
+from api.query_builder import AggregateQuery, SelectQuery
+
+
+class FakeCatalog:
+    # schema_catalog 替身：只認得這些資料表與欄位
+    schema = {
+        'price': ['stock_id', 'date', '收盤價', '成交股數'],
+        'dealer': ['股票代號', 'date', '分點名稱', '買進金額', '賣出金額', 'bad`col'],
+    }
+
+    def tables(self):
+        return list(self.schema)
+
+    def columns(self, table):
+        return self.schema[table]
+
+
+@pytest.fixture(autouse=True)
+def catalog(monkeypatch):
+    monkeypatch.setattr(query_builder, 'schema_catalog', FakeCatalog())
+    query_builder.clear_sql_cache()
+    yield
+    query_builder.clear_sql_cache()
+
+
+def test_in_and_not_in_expand_one_placeholder_per_value():
+    sql, params = (SelectQuery('price', ['stock_id', 'date', '收盤價'])
+                   .where('stock_id', 'in', ['2330', '2317', '2454'])
+                   .where('date', 'NOT IN', ('2025-01-01',))
+                   .build())
+    assert sql == "SELECT `stock_id`, `date`, `收盤價` FROM `price` WHERE `stock_id` IN (%s, %s, %s) AND `date` NOT IN (%s)"
+    assert params == ('2330', '2317', '2454', '2025-01-01')
+
+
+def test_between_and_compare():
+    sql, params = (SelectQuery('price', ['stock_id', '收盤價'], distinct=True)
+                   .where('date', 'BETWEEN', ('2025-01-01', '2025-05-01'))
+                   .where('收盤價', '>=', 100)
+                   .where('stock_id', 'like', '23%')
+                   .order_by('stock_id').order_by('date', desc=True)
+                   .limit(10)
+                   .build())
+    assert sql == ("SELECT DISTINCT `stock_id`, `收盤價` FROM `price` WHERE `date` BETWEEN %s AND %s AND `收盤價` >= %s "
+                   "AND `stock_id` LIKE %s ORDER BY `stock_id`, `date` DESC LIMIT %s")
+    assert params == ('2025-01-01', '2025-05-01', 100, '23%', 10)
+
+
+def test_values_never_reach_sql_text():
+    injection = "2330' OR '1'='1"
+    sql, params = SelectQuery('price', ['stock_id']).where('stock_id', '=', injection).build()
+    assert injection not in sql
+    assert params == (injection,)
+
+
+@pytest.mark.parametrize('op', ['IN', 'NOT IN'])
+def test_empty_list_rejected(op):
+    with pytest.raises(ValueError):
+        SelectQuery('price', ['stock_id']).where('stock_id', op, [])
+
+
+def test_unknown_operator_rejected():
+    with pytest.raises(ValueError):
+        SelectQuery('price', ['stock_id']).where('stock_id', '= 1 OR 1 =', 1)
+
+
+@pytest.mark.parametrize('table, columns, where_col', [
+    ('price', ['stock_id`; DROP TABLE price; --'], None),
+    ('price', ['stock_id'], 'date` = 1 OR `date'),
+    ('dealer', ['bad`col'], None),
+    ('price`', ['stock_id'], None),
+    ('no_such_table', ['stock_id'], None),
+    ('price', ['no_such_column'], None),
+])
+def test_invalid_identifiers_rejected(table, columns, where_col):
+    query = SelectQuery(table, columns)
+    if where_col:
+        query.where(where_col, '=', 1)
+    with pytest.raises(ValueError):
+        query.build()
+
+
+def test_backtick_rejected_without_schema_validation():
+    assert SelectQuery('anything', ['col'], validate=False).build()[0] == "SELECT `col` FROM `anything`"
+    with pytest.raises(ValueError):
+        SelectQuery('anything', ['a`b'], validate=False).build()
+
+
+def test_aggregate_tail_params_order():
+    # 參數順序：WHERE -> HAVING -> 每組前 k 名 -> LIMIT
+    query = (AggregateQuery('dealer', ['股票代號', '分點名稱', ('date', 'month')],
+                            {'net': ('sum', ('-', '買進金額', '賣出金額')), 'days': ('count distinct', 'date')})
+             .where('date', 'BETWEEN', ('2025-01-01', '2025-03-31'))
+             .where('股票代號', 'IN', ['2330', '2317'])
+             .having('net', '>', 1e6)
+             .having('days', '>=', 3)
+             .top_per(['股票代號'], 5, 'net')
+             .order_by('股票代號', '_rank')
+             .limit(50))
+    sql, params = query.build()
+    assert sql == (
+        "SELECT * FROM (SELECT `股票代號` AS `股票代號`, `分點名稱` AS `分點名稱`, SUBSTRING_INDEX(`date`, '-', 2) AS `date`, "
+        "SUM(`買進金額` - `賣出金額`) AS `net`, COUNT(DISTINCT `date`) AS `days`, "
+        "ROW_NUMBER() OVER (PARTITION BY `股票代號` ORDER BY SUM(`買進金額` - `賣出金額`) DESC, `分點名稱`, SUBSTRING_INDEX(`date`, '-', 2)) AS `_rank` "
+        "FROM `dealer` WHERE `date` BETWEEN %s AND %s AND `股票代號` IN (%s, %s) "
+        "GROUP BY `股票代號`, `分點名稱`, SUBSTRING_INDEX(`date`, '-', 2) HAVING `net` > %s AND `days` >= %s) AS `ranked` "
+        "WHERE `_rank` <= %s ORDER BY `股票代號`, `_rank` LIMIT %s")
+    assert params == ('2025-01-01', '2025-03-31', '2330', '2317', 1e6, 3, 5, 50)
+
+
+def test_aggregate_rejects_bad_definitions():
+    with pytest.raises(ValueError):
+        AggregateQuery('dealer', ['股票代號'], {'x': ('median', '買進金額')})
+    with pytest.raises(ValueError):
+        AggregateQuery('dealer', [('date', 'week')], {'x': ('sum', '買進金額')})
+    with pytest.raises(ValueError):
+        AggregateQuery('dealer', ['股票代號'], {'x': ('sum', '買進金額')}).having('y', '>', 0)
+    with pytest.raises(ValueError):
+        AggregateQuery('dealer', ['股票代號'], {'x': ('sum', '買進金額')}).top_per(['分點名稱'], 3, 'x')
+
+
+def test_same_shape_shares_sql_text():
+    def build(stock_ids, start, end):
+        return (SelectQuery('price', ['stock_id', 'date', '收盤價'])
+                .where('date', 'BETWEEN', (start, end))
+                .where('stock_id', 'IN', stock_ids)
+                .order_by('date')
+                .build())
+
+    sql_a, params_a = build(['2330', '2317'], '2025-01-01', '2025-02-01')
+    sql_b, params_b = build(['1101', '2454'], '2024-01-01', '2024-12-31')
+    assert sql_a is sql_b
+    assert params_a == ('2025-01-01', '2025-02-01', '2330', '2317')
+    assert params_b == ('2024-01-01', '2024-12-31', '1101', '2454')
+    # 值的個數不同即為不同形狀
+    sql_c, _ = build(['2330'], '2025-01-01', '2025-02-01')
+    assert sql_c != sql_a
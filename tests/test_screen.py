@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+import pytest
+from api import indicator, process_df, screen
+from api.indicator import sma_pivot_df
+from api.screen import (Close, Const, D, EMA, Fundamental, GoldenAlignment, High, K, Low, MACD, MaEntangled, Median, NDayHigh, NDayLow,
+                        Revenue, SMA, Volume, Williams, WMA, evaluate, plan, select)
+
+
+def synthetic_panel(n_dates: int = 300, n_stocks: int = 12, seed: int = 0) -> dict:
+    # 隨機 OHLCV pivot（含零星 NaN、一段整段停牌與較晚上市的股票）
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_dates, freq='B')
+    stocks = [str(2000 + i) for i in range(n_stocks)]
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, (n_dates, n_stocks)), axis=0))
+    high = close * (1 + rng.uniform(0, 0.03, close.shape))
+    low = close * (1 - rng.uniform(0, 0.03, close.shape))
+    volume = rng.integers(1_000, 100_000, close.shape).astype(float)
+    gaps = rng.random(close.shape) < 0.03
+    gaps[100:130, 1] = True
+    gaps[:200, 2] = True
+    panel = {}
+    for name, values in (('收盤價', close), ('最高價', high), ('最低價', low), ('成交股數', volume)):
+        values = values.copy()
+        values[gaps] = np.nan
+        panel[name] = pd.DataFrame(values, index=dates, columns=stocks)
+    return panel
+
+
+def test_plan_dedups_shared_subexpressions():
+    # 同一個 Close() > SMA(60) 出現兩次只算一個節點（未去重 13 個節點，去重後 6 個）
+    info = plan({'a': Close() > SMA(60), 'b': (Close() > SMA(60)) & (Close() > SMA(120))})
+    assert info == {'nodes': 13, 'unique': 6, 'fields': {'price': ['收盤價']}, 'lookback': 119}
+    assert SMA(60).key == SMA(60, Close()).key
+    assert SMA(60).key != SMA(60, Volume()).key
+
+
+def test_evaluate_computes_shared_sma_once(monkeypatch):
+    panel = synthetic_panel()
+    calls = []
+    sma_func = screen.SMA.func
+
+    def counting(pivot_df, n):
+        calls.append(n)
+        return sma_func(pivot_df, n)
+
+    monkeypatch.setattr(screen.SMA, 'func', staticmethod(counting))
+    above60 = Close() > SMA(60)
+    result = evaluate({
+        'criteria': above60 & (Close() > SMA(120)),
+        'above60': Close() > SMA(60, Close()),
+        'sma60': SMA(60),
+    }, data=panel)
+    assert sorted(calls) == [60, 120]
+    close = panel['收盤價']
+    pd.testing.assert_frame_equal(result['above60'], close > sma_pivot_df(close, 60))
+    pd.testing.assert_frame_equal(result['criteria'], result['above60'] & (close > sma_pivot_df(close, 120)))
+
+
+def test_evaluate_fetches_each_table_once(monkeypatch):
+    panel = synthetic_panel()
+    calls = []
+
+    def fake_panel(table_name, date_range_str, value_names, column_name='stock_id'):
+        calls.append((table_name, tuple(value_names), column_name))
+        start, end = date_range_str.split(':')
+        return {name: panel[name].loc[start:end] for name in value_names}
+
+    monkeypatch.setattr(process_df, 'get_db_pivot_panel', fake_panel)
+    criteria = (Volume() > Const(1_000)) & (Close() > SMA(60)) & (Close() > SMA(120)) & (Close() > SMA(60))
+    result = evaluate(criteria, '2025-01-01:2025-02-28')
+    assert len(calls) == 1
+    assert calls[0][0] == 'price' and sorted(calls[0][1]) == sorted(['收盤價', '成交股數'])
+    assert result.index.min() >= pd.Timestamp('2025-01-01')
+    # 查詢區間往前多抓回看天數：目標區間第一天的 SMA(120) 已有值
+    close = panel['收盤價']
+    expected = (panel['成交股數'] > 1_000) & (close > sma_pivot_df(close, 60)) & (close > sma_pivot_df(close, 120))
+    pd.testing.assert_frame_equal(result, expected.loc['2025-01-01':'2025-02-28'])
+
+
+def test_select_matches_pandas_buffett_screen():
+    # buffett_say.py 改用 screen 之前的 pandas 寫法
+    panel = synthetic_panel(seed=1)
+    close_pivot, volume_pivot = panel['收盤價'], panel['成交股數']
+    sma60 = sma_pivot_df(close_pivot, 60)
+    sma120 = sma_pivot_df(close_pivot, 120)
+    volume_median = volume_pivot.median(axis=0)
+    volume_50pct = volume_pivot > (volume_median * 0.5)
+    criteria = volume_50pct & (close_pivot > sma60) & (close_pivot > sma120)
+    selected = criteria & criteria.notna()
+    latest = selected.iloc[-1]
+
+    expr = (Volume() > 0.5 * Const(volume_median)) & (Close() > SMA(60)) & (Close() > SMA(120))
+    data = {'收盤價': close_pivot, '成交股數': volume_pivot}
+    assert select(expr, data=data) == latest[latest].index.tolist()
+    assert len(latest[latest]) > 0
+    pd.testing.assert_frame_equal(evaluate(expr, data=data).fillna(False).astype(bool), selected)
+
+
+def point_exprs() -> dict:
+    # 涵蓋各種節點：視窗指標、多輸入指標、巢狀視窗、平移、中位數、濾網、邏輯運算與遞迴指標
+    return {
+        'above_sma': Close() > SMA(20),
+        'wma': WMA(10),
+        'breakout': Close() >= NDayHigh(20, High()).shift(1),
+        'range': NDayHigh(20) - NDayLow(20, Low()),
+        'kd': (K(9) > D(3)) & ~(Williams(14) < -80),
+        'sma_of_sma': SMA(5, SMA(10)),
+        'change': Close() / Close().shift(3) - 1,
+        'volume_up': Volume() > 0.5 * Median(Volume(), 20),
+        'golden': GoldenAlignment([5, 10, 20]) | MaEntangled([5, 10, 20], 0.02),
+        'ema': EMA(10),
+        'macd': MACD(),
+        'macd_of_sma': MACD(src=SMA(5)),
+    }
+
+
+# 遞迴指標只以 4n 暖機，與整段計算有 e^-8 級的差異
+RECURSIVE = {'ema', 'macd', 'macd_of_sma'}
+
+
+def assert_point_equal(point, full, name):
+    if name in RECURSIVE:
+        np.testing.assert_allclose(point.to_numpy(dtype=float), full.to_numpy(dtype=float), rtol=1e-3, atol=1e-2)
+        pd.testing.assert_frame_equal(point.isna(), full.isna()) if isinstance(point, pd.DataFrame) else None
+    elif isinstance(point, pd.DataFrame):
+        pd.testing.assert_frame_equal(point, full, check_freq=False, rtol=1e-9)
+    else:
+        pd.testing.assert_series_equal(point, full, check_names=False, rtol=1e-9)
+
+
+def test_point_mode_dates_match_full_series():
+    panel = synthetic_panel(seed=2)
+    index = panel['收盤價'].index
+    # 非交易日（週六）取之前最近的交易日（週五）；第 10 天回看不足，結果同整段序列的 NaN
+    friday = np.flatnonzero(index.weekday == 4)[50]
+    targets = [index[9], index[140], index[141], index[friday] + pd.Timedelta(days=1), index[-1]]
+    full = evaluate(point_exprs(), data=panel)
+    point = evaluate(point_exprs(), data=panel, dates=targets)
+    expected_index = index[[9, 140, 141, friday, len(index) - 1]]
+    for name, value in point.items():
+        assert value.index.equals(expected_index), name
+        assert_point_equal(value, full[name].loc[expected_index], name)
+
+
+def test_point_mode_last_only_matches_full_series():
+    panel = synthetic_panel(seed=3)
+    full = evaluate(point_exprs(), data=panel)
+    last = evaluate(point_exprs(), data=panel, last_only=True)
+    for name, value in last.items():
+        assert isinstance(value, pd.Series), name
+        assert_point_equal(value, full[name].iloc[-1], name)
+
+
+def test_point_mode_recursive_warmup():
+    panel = synthetic_panel(seed=4)
+    close = panel['收盤價']
+    index = close.index
+    # MACD 預設暖機 4 * slow 天；暖機涵蓋全部歷史時與整段計算完全相同
+    assert MACD().warmup == 4 * 26 and MACD().lookback == 104
+    full = evaluate(MACD(), data=panel)
+    whole = evaluate(MACD(warmup=len(index)), data=panel, dates=index[[50, 200, -1]])
+    pd.testing.assert_frame_equal(whole, full.iloc[[50, 200, -1]], check_freq=False)
+    # 子節點只算需要的日期：MACD 從目標日往前 4n 天起算，與整段計算只差 e^-8 級
+    point = evaluate(MACD(src=SMA(5)), data=panel, last_only=True)
+    sma5 = sma_pivot_df(close, 5)
+    tail = indicator.macd_pivot_df(sma5.iloc[-(104 + 1):], 12, 26, 9).iloc[-1]
+    pd.testing.assert_series_equal(point, tail, check_names=False)
+    np.testing.assert_allclose(point, indicator.macd_pivot_df(sma5, 12, 26, 9).iloc[-1], atol=1e-2)
+
+
+def test_point_mode_computes_only_target_windows(monkeypatch):
+    panel = synthetic_panel()
+    calls = []
+    sma_func, at_dates_func = screen.SMA.func, screen.SMA.at_dates_func
+
+    def counting_series(pivot_df, n):
+        calls.append(('series', n))
+        return sma_func(pivot_df, n)
+
+    def counting_at_dates(pivot_df, n, dates):
+        calls.append(('at_dates', n, len(dates)))
+        return at_dates_func(pivot_df, n, dates)
+
+    monkeypatch.setattr(screen.SMA, 'func', staticmethod(counting_series))
+    monkeypatch.setattr(screen.SMA, 'at_dates_func', staticmethod(counting_at_dates))
+    above60 = Close() > SMA(60)
+    select(above60 & (Close() > SMA(120)) & above60, data=panel)
+    assert sorted(calls) == [('at_dates', 60, 1), ('at_dates', 120, 1)]
+
+
+def test_select_dates_matches_pandas_screen():
+    panel = synthetic_panel(seed=1)
+    close_pivot, volume_pivot = panel['收盤價'], panel['成交股數']
+    volume_median = volume_pivot.median(axis=0)
+    selected = (volume_pivot > volume_median * 0.5) & (close_pivot > sma_pivot_df(close_pivot, 60)) & (close_pivot > sma_pivot_df(close_pivot, 120))
+    expr = (Volume() > 0.5 * Const(volume_median)) & (Close() > SMA(60)) & (Close() > SMA(120))
+    targets = close_pivot.index[[150, 220, -1]]
+    by_date = select(expr, data={'收盤價': close_pivot, '成交股數': volume_pivot}, dates=targets)
+    assert by_date == {date: selected.loc[date][selected.loc[date]].index.tolist() for date in targets}
+
+
+def periodic_panel(stocks, seed: int = 0) -> dict:
+    # 月營收與季 EPS（含缺期），期別早於交易日起始日以便計算年增率
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2022-06-01', '2025-02-01', freq='MS')
+    quarters = pd.date_range('2022-03-31', '2024-12-31', freq='QE')
+    revenue = pd.DataFrame(rng.uniform(50, 150, (len(months), len(stocks))), index=months, columns=stocks)
+    revenue[rng.random(revenue.shape) < 0.05] = np.nan
+    eps = pd.DataFrame(rng.normal(2, 1, (len(quarters), len(stocks))), index=quarters, columns=stocks)
+    eps.iloc[-3, 0] = np.nan
+    return {('monthly_revenue', 'stock_id', '當月營收'): revenue, ('financial', 'stock_id', 'EPS'): eps}
+
+
+def test_point_mode_fundamental_matches_full_series():
+    panel = synthetic_panel(seed=5)
+    data = {**panel, **periodic_panel(panel['收盤價'].columns)}
+    exprs = {
+        'revenue': Revenue(),
+        'revenue_up': Revenue('yoy') > 0.1,
+        'mom': Fundamental('當月營收', kind='mom'),
+        'eps_qoq': Fundamental('EPS', 'financial', kind='qoq', freq='Q'),
+        'combo': (Revenue('yoy') > 0) & (Close() > SMA(20)) & (Fundamental('EPS', 'financial', freq='Q') > 1.5),
+    }
+    full = evaluate(exprs, data=data)
+    index = panel['收盤價'].index
+    targets = index[[30, 120, 121, 250, len(index) - 1]]
+    point = evaluate(exprs, data=data, dates=targets)
+    last = evaluate(exprs, data=data, last_only=True)
+    for name in exprs:
+        assert point[name].index.equals(targets), name
+        pd.testing.assert_frame_equal(point[name], full[name].loc[targets], check_freq=False)
+        pd.testing.assert_series_equal(last[name], full[name].iloc[-1], check_names=False)
+    assert full['revenue'].notna().any().any() and full['eps_qoq'].notna().any().any()
@@ -2,17 +2,15 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from api import process_df
-from api.dashboard import (
-    count_n_day_high, count_n_day_low, count_above_ma, get_total_count_per_date,
-    get_close_flat_count, get_close_above_count, get_close_below_count
-)
+from api.dashboard import market_breadth
 
 
 parse_date = '-20:-0'
 
 # 取得近 100 日多股收盤價、成交量 pivot df
-close_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=parse_date, column_name='stock_id', value_name='收盤價')
-volume_pivot = process_df.get_db_pivot_df(table_name='price', date_range_str=parse_date, column_name='stock_id', value_name='成交股數') / 1000
+price_panel = process_df.get_db_pivot_panel(table_name='price', date_range_str=parse_date, value_names=['收盤價', '成交股數'])
+close_pivot = price_panel['收盤價']
+volume_pivot = price_panel['成交股數'] / 1000
 
 
 # %%
@@ -27,22 +25,25 @@ print(volume_pivot['2330'])
 
 n = 5
 
+# 所有家數序列一次計算（共用前一日收盤、滾動高低點與價量乘積）
+breadth = market_breadth(close_pivot, volume_pivot, windows=[n], ma_types=['sma', 'ema', 'wma'])
+
 # 1. 5日創新高家數
-high_count = count_n_day_high(close_pivot, n)
+high_count = breadth[f'{n}日新高家數']
 # 2. 5日創新低家數
-low_count = count_n_day_low(close_pivot, n)
+low_count = breadth[f'{n}日新低家數']
 # 3. 5日 SMA 站上家數
-above_sma_count = count_above_ma(close_pivot, volume_pivot, n, ma_type='sma')
+above_sma_count = breadth[f'站上{n}日SMA家數']
 # 4. 5日 EMA 站上家數
-above_ema_count = count_above_ma(close_pivot, volume_pivot, n, ma_type='ema')
+above_ema_count = breadth[f'站上{n}日EMA家數']
 # 5. 5日 WMA 站上家數
-above_wma_count = count_above_ma(close_pivot, volume_pivot, n, ma_type='wma')
+above_wma_count = breadth[f'站上{n}日WMA家數']
 
 # 總家數與持平家數（以 SMA 為例）
-total_count = get_total_count_per_date(close_pivot)
-flat_count = get_close_flat_count(close_pivot)
-above_count = get_close_above_count(close_pivot)
-below_count = get_close_below_count(close_pivot)
+total_count = breadth['總家數']
+flat_count = breadth['持平家數']
+above_count = breadth['上漲家數']
+below_count = breadth['下跌家數']
 
 # %%
 
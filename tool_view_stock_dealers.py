@@ -7,6 +7,7 @@ from api import process_df
 from api import indicator
 from api import plot
 from api import filter
+from api.dealer import DealerRollup
 import tkinter as tk
 from tkinter import ttk
 import pandas as pd
@@ -33,11 +34,12 @@ def load_stock_data() -> None:
     本範例會自動取得近 100 天的所有股票價格資料。
     """
     global volume_df, open_df, close_df, high_df, low_df
-    close_df  = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='close').astype(float)
-    open_df   = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='open').astype(float)
-    high_df   = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='high').astype(float)
-    low_df    = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='low').astype(float)
-    volume_df = process_df.get_db_pivot_df(table_name='price', date_range_str=DATE_RANGE_STR, column_name='stock_id', value_name='成交股數').astype(float) / 1000
+    panel = process_df.get_db_pivot_panel(table_name='price', date_range_str=DATE_RANGE_STR, value_names=['close', 'open', 'high', 'low', '成交股數'])
+    close_df  = panel['close']
+    open_df   = panel['open']
+    high_df   = panel['high']
+    low_df    = panel['low']
+    volume_df = panel['成交股數'] / 1000
 
 def plot_combined_chart(stock_id: str, stock_df: pd.DataFrame, branch_df: pd.DataFrame, top_brokers: list) -> None:
     """
@@ -156,12 +158,9 @@ def main() -> None:
     branch_df = process_df.get_branch_data(date_range_str=DATE_RANGE_STR, stock_col='stock_id', view_dealer_col=f'買進{VIEW_DEALER_COL}, 賣出{VIEW_DEALER_COL}', constraint_str=f"stock_id = {stock_id}")
     branch_df['買賣超金額'] = branch_df['買進金額'] - branch_df['賣出金額']
     branch_df.index = pd.to_datetime(branch_df.index)
-    # 找出累積買賣超金額最大的前 N 大券商
-    top_brokers = branch_df.copy()
-    top_brokers["買賣超金額"] = pd.to_numeric(top_brokers["買賣超金額"], errors="coerce")
-    top_brokers = top_brokers.dropna(subset=["買賣超金額"])
-    broker_summary = top_brokers.groupby(["分點名稱"]).agg({'買賣超金額': 'sum'})
-    top_brokers_list = broker_summary.nlargest(TOP_BROKERS_RANK, "買賣超金額").reset_index()['分點名稱'].values
+    # 找出累積買賣超金額最大的前 N 大券商（DealerRollup 以 bincount 分組加總）
+    rollup = DealerRollup.from_df(branch_df, value=VIEW_DEALER_COL, stock_col='stock_id')
+    top_brokers_list = rollup.top_brokers(stock_id, k=TOP_BROKERS_RANK)['分點名稱'].values
     print(f"前 {TOP_BROKERS_RANK} 大累積買賣金額的券商：")
     print(top_brokers_list)
     # 畫出綜合圖表